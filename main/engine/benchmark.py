@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import time
+import inspect
+import platform
+import subprocess
+import numpy as np
+
+from main.engine import compression
+from main.engine.build import IndexBuilder, peak_rss
+from main.engine.index import InvertedIndexReader, postings_cache, evict_metadata
+from main.engine.util import get_stop_words
+
+# suku kata untuk membentuk kata sintetis; kata ke-i adalah representasi
+# i dalam basis len(SYLLABLES), sehingga setiap kata dijamin unik
+SYLLABLES = [consonant + vowel for consonant in "bcdfghklmnprstvz" for vowel in "aeiou"]
+
+PERCENTILES = (50, 90, 95, 99)
+
+class SyntheticCorpus:
+    """
+    Generator collection sintetis yang menyerupai MEDLINE, dengan layout yang
+    sama dengan collection asli: <data_dir>/<block>/<id>.txt, baris-baris
+    judul diikuti isi yang setiap barisnya diawali dua spasi.
+
+    Frekuensi term mengikuti distribusi Zipf (term dengan rank r muncul
+    dengan probabilitas sebanding 1 / r^zipf_exponent), panjang dokumen
+    mengikuti distribusi log-normal, dan jika tidak ditentukan, ukuran
+    vocabulary mengikuti hukum Heaps terhadap total token. Semua sampling
+    memakai seed, sehingga corpus yang sama bisa dibangkitkan ulang untuk
+    membandingkan hasil benchmark.
+
+    Attributes
+    ----------
+    data_dir(str): Directory collection yang dibangkitkan
+    num_docs(int): Banyaknya dokumen
+    docs_per_block(int): Banyaknya dokumen per block (sub-directory)
+    vocabulary_size(int): Banyaknya kata berbeda
+    zipf_exponent(float): Eksponen distribusi Zipf
+    mean_length(int): Rata-rata banyaknya kata per dokumen
+    seed(int): Seed untuk numpy random generator
+    """
+
+    # konstanta hukum Heaps: V = HEAPS_K * T^HEAPS_BETA
+    HEAPS_K = 40
+    HEAPS_BETA = 0.5
+
+    def __init__(self, data_dir, num_docs, docs_per_block = 1000, vocabulary_size = None, \
+                 zipf_exponent = 1.0, mean_length = 120, seed = 0):
+        self.data_dir = data_dir
+        self.num_docs = num_docs
+        self.docs_per_block = docs_per_block
+        self.zipf_exponent = zipf_exponent
+        self.mean_length = mean_length
+        self.seed = seed
+        if vocabulary_size is None:
+            vocabulary_size = int(self.HEAPS_K * (num_docs * mean_length) ** self.HEAPS_BETA)
+        self.vocabulary_size = max(vocabulary_size, 100)
+        self.words = self.vocabulary(self.vocabulary_size)
+
+        ranks = np.arange(1, self.vocabulary_size + 1, dtype=np.float64)
+        weights = ranks ** -zipf_exponent
+        self.cdf = np.cumsum(weights / weights.sum())
+
+    @staticmethod
+    def vocabulary(size):
+        """size kata sintetis yang berbeda (tanpa stopword), minimal dua suku kata"""
+        stop_words = get_stop_words()
+        base = len(SYLLABLES)
+        words = []
+        number = base
+        while len(words) < size:
+            syllables = []
+            n = number
+            while n:
+                n, digit = divmod(n, base)
+                syllables.append(SYLLABLES[digit])
+            word = "".join(syllables)
+            if word not in stop_words:
+                words.append(word)
+            number += 1
+        return words
+
+    def config(self):
+        return {
+            "num_docs": self.num_docs,
+            "docs_per_block": self.docs_per_block,
+            "vocabulary_size": self.vocabulary_size,
+            "zipf_exponent": self.zipf_exponent,
+            "mean_length": self.mean_length,
+            "seed": self.seed,
+        }
+
+    def sample_ranks(self, rng, size):
+        """size rank term (0-based) sesuai distribusi Zipf"""
+        return np.minimum(np.searchsorted(self.cdf, rng.random(size)), self.vocabulary_size - 1)
+
+    def document_lengths(self, rng, size):
+        sigma = 0.5
+        mu = np.log(self.mean_length) - sigma * sigma / 2
+        return np.maximum(rng.lognormal(mu, sigma, size).astype(np.int64), 5)
+
+    def render(self, words):
+        """Teks sebuah dokumen: judul, lalu isi per baris (diawali dua spasi) dengan kalimat ~15 kata"""
+        title_length = min(len(words) // 4 + 1, 12)
+        lines = [" ".join(words[:title_length]) + " ."]
+        body = words[title_length:]
+        sentences = [" ".join(body[i:i + 15]) + " ." for i in range(0, len(body), 15)]
+        line = ""
+        for sentence in sentences:
+            if line and len(line) + len(sentence) > 72:
+                lines.append("  " + line)
+                line = ""
+            line = (line + " " + sentence).strip()
+        if line:
+            lines.append("  " + line)
+        return "\n".join(lines) + "\n"
+
+    def generate(self, progress = None):
+        """
+        Menulis seluruh corpus ke data_dir, block demi block. Sampling dilakukan
+        per block sekaligus (vectorized), sehingga memori yang dipakai hanya
+        sebesar satu block.
+
+        Returns
+        -------
+        dict
+            Ringkasan corpus: banyaknya dokumen, block, token, bytes, dan waktu
+        """
+        rng = np.random.default_rng(self.seed)
+        words = np.array(self.words, dtype=object)
+        start = time.perf_counter()
+        total_tokens, total_bytes = 0, 0
+        num_blocks = (self.num_docs + self.docs_per_block - 1) // self.docs_per_block
+        for block in range(num_blocks):
+            first = block * self.docs_per_block
+            count = min(self.docs_per_block, self.num_docs - first)
+            lengths = self.document_lengths(rng, count)
+            tokens = words[self.sample_ranks(rng, int(lengths.sum()))]
+            block_dir = os.path.join(self.data_dir, str(block + 1))
+            os.makedirs(block_dir, exist_ok=True)
+            offset = 0
+            for i, length in enumerate(lengths):
+                text = self.render(tokens[offset:offset + length].tolist())
+                offset += length
+                with open(os.path.join(block_dir, f"{first + i + 1}.txt"), 'w') as f:
+                    f.write(text)
+                total_bytes += len(text)
+            total_tokens += int(offset)
+            if progress is not None:
+                progress(f"Generated block {block + 1}/{num_blocks}")
+
+        seconds = time.perf_counter() - start
+        return {
+            "docs": self.num_docs,
+            "blocks": num_blocks,
+            "tokens": total_tokens,
+            "bytes": total_bytes,
+            "seconds": seconds,
+        }
+
+    def queries(self, num_queries, seed = None):
+        """Query sintetis, lihat sample_queries"""
+        return sample_queries(self.words, num_queries, self.seed + 1 if seed is None else seed)
+
+def sample_queries(words, num_queries, seed = 0, min_terms = 1, max_terms = 4, skip = 0.01):
+    """
+    Query sintetis dari words (terurut dari df terbesar). Term query diambil
+    dengan distribusi Zipf atas rank, namun fraksi skip term paling sering
+    dilewati karena term seperti itu (mirip stopword) jarang dipakai di query.
+    """
+    rng = np.random.default_rng(seed)
+    first = min(int(len(words) * skip), len(words) - 1)
+    candidates = words[first:]
+    ranks = np.arange(1, len(candidates) + 1, dtype=np.float64)
+    p = 1 / ranks
+    p /= p.sum()
+    lengths = rng.integers(min_terms, max_terms + 1, num_queries)
+    return [" ".join(candidates[i] for i in rng.choice(len(candidates), size=length, p=p)) \
+            for length in lengths]
+
+def index_words(bsbi_index):
+    """
+    Kata-kata index, terurut dari df terbesar, untuk sample_queries. Diambil
+    dari suggest index (surface form); jika belum ada, dari term (stem) di
+    main index.
+    """
+    suggest = bsbi_index.suggest_index
+    if suggest.terms:
+        return [word for _, word in sorted(zip(suggest.term_weights, suggest.terms), key = lambda item: -item[0])]
+    with InvertedIndexReader(bsbi_index.index_name, bsbi_index.postings_encoding, \
+                             directory = bsbi_index.output_dir) as reader:
+        terms = sorted(reader.postings_dict, key = lambda term: -reader.postings_dict[term][1])
+    return [bsbi_index.term_id_map[term] for term in terms]
+
+def codecs():
+    """Semua postings encoding di compression.py"""
+    return [cls for _, cls in inspect.getmembers(compression, inspect.isclass) \
+            if cls.__module__ == compression.__name__ and \
+               all(hasattr(cls, name) for name in ('encode', 'decode', 'encode_tf', 'decode_tf'))]
+
+def percentiles(latencies):
+    """Ringkasan latency (dalam milidetik)"""
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {}
+    summary = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    summary.update(mean = float(values.mean()), max = float(values.max()))
+    return summary
+
+def index_size(bsbi_index):
+    """Ukuran (bytes) setiap file index di output directory, beserta totalnya"""
+    sizes = {}
+    for filename in sorted(os.listdir(bsbi_index.output_dir)):
+        path = os.path.join(bsbi_index.output_dir, filename)
+        if os.path.isfile(path) and not filename.startswith(('intermediate_index_', 'merge_', 'build_manifest')):
+            sizes[filename] = os.path.getsize(path)
+    return {"files": sizes, "total": sum(sizes.values())}
+
+def benchmark_indexing(bsbi_index, fan_in = 16, progress = None):
+    """Build dari awal dengan IndexBuilder; laporan throughput per fase dan ukuran index"""
+    report = IndexBuilder(bsbi_index, fan_in = fan_in, progress = progress).run(restart = True)
+    report["size"] = index_size(bsbi_index)
+    return report
+
+def benchmark_codecs(bsbi_index, max_postings = 2000000, repeat = 3):
+    """
+    Kecepatan encode/decode setiap codec di compression.py atas postings list
+    dari main index (sampai max_postings posting, dari term dengan df
+    terbesar). Waktu terbaik dari repeat kali pengukuran yang dilaporkan.
+    """
+    lists = []
+    with InvertedIndexReader(bsbi_index.index_name, bsbi_index.postings_encoding, \
+                             directory = bsbi_index.output_dir) as reader:
+        terms = sorted(reader.postings_dict, key = lambda term: -reader.postings_dict[term][1])
+        total = 0
+        for term in terms:
+            if total >= max_postings:
+                break
+            postings, tfs = reader.get_postings_list(term)
+            postings = reader.postings_codec(term).decode(postings)
+            lists.append((postings, reader.postings_encoding.decode_tf(tfs)))
+            total += len(postings)
+
+    report = {"lists": len(lists), "postings": total}
+    for codec in codecs():
+        encode_time = decode_time = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encoded = [(codec.encode(postings), codec.encode_tf(tfs)) for postings, tfs in lists]
+            encode_time = min(encode_time, time.perf_counter() - start)
+            start = time.perf_counter()
+            for postings, tfs in encoded:
+                codec.decode(postings)
+                codec.decode_tf(tfs)
+            decode_time = min(decode_time, time.perf_counter() - start)
+        postings_bytes = sum(len(postings) for postings, _ in encoded)
+        tf_bytes = sum(len(tfs) for _, tfs in encoded)
+        report[codec.__name__] = {
+            "postings_bytes": postings_bytes,
+            "tf_bytes": tf_bytes,
+            "bits_per_posting": 8 * postings_bytes / total if total else 0.0,
+            "encode_seconds": encode_time,
+            "decode_seconds": decode_time,
+            "encode_postings_per_second": total / encode_time if encode_time else 0.0,
+            "decode_postings_per_second": total / decode_time if decode_time else 0.0,
+        }
+    return report
+
+def clear_caches(bsbi_index):
+    postings_cache.clear()
+    evict_metadata(bsbi_index.output_dir)
+    bsbi_index.term_weights_cache.clear()
+
+def benchmark_queries(bsbi_index, queries, k = 10, models = ('bm25', 'tfidf')):
+    """
+    Latency retrieve_bm25 dan retrieve_tfidf untuk setiap query. Setiap model
+    dijalankan dua kali: cold (semua cache dikosongkan terlebih dahulu) dan
+    warm (cache sudah terisi oleh putaran cold).
+    """
+    retrieve = {"bm25": bsbi_index.retrieve_bm25, "tfidf": bsbi_index.retrieve_tfidf}
+    report = {"queries": len(queries), "k": k}
+    for model in models:
+        clear_caches(bsbi_index)
+        report[model] = {}
+        for run in ("cold", "warm"):
+            latencies = []
+            start = time.perf_counter()
+            for query in queries:
+                query_start = time.perf_counter()
+                retrieve[model](query, k = k)
+                latencies.append(time.perf_counter() - query_start)
+            seconds = time.perf_counter() - start
+            summary = percentiles(latencies)
+            summary["qps"] = len(queries) / seconds if seconds else 0.0
+            report[model][run] = summary
+    report["peak_rss"] = peak_rss()
+    return report
+
+def environment():
+    """Informasi mesin dan kode, agar hasil benchmark dari run berbeda bisa dibandingkan"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output = True, text = True, \
+                                cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+def flatten(report, prefix = ""):
+    """Mapping "a.b.c" -> nilai numerik dari laporan benchmark yang bersarang"""
+    result = {}
+    for key, value in report.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            result.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            result[name] = value
+    return result
+
+def compare(report, baseline):
+    """
+    List of (metric, baseline, sekarang, rasio) untuk setiap metric numerik
+    yang ada di kedua laporan, misal untuk mendeteksi regresi performa.
+    """
+    current, before = flatten(report), flatten(baseline)
+    return [(name, before[name], current[name], current[name] / before[name] if before[name] else None) \
+            for name in sorted(current.keys() & before.keys()) if not name.startswith("environment.")]
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+
+    import tempfile
+    from main.engine.bsbi import BSBIIndex
+    from main.engine.compression import VBEPostings
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus = SyntheticCorpus(os.path.join(work_dir, "collection"), num_docs = 1000, docs_per_block = 100)
+        print(corpus.generate())
+        os.makedirs(os.path.join(work_dir, "index"))
+        BSBI_instance = BSBIIndex(data_dir = corpus.data_dir, \
+                                  postings_encoding = VBEPostings, \
+                                  output_dir = os.path.join(work_dir, "index"))
+        report = {"indexing": benchmark_indexing(BSBI_instance), \
+                  "codecs": benchmark_codecs(BSBI_instance), \
+                  "queries": benchmark_queries(BSBI_instance, corpus.queries(100))}
+        print(json.dumps(report, indent=2))
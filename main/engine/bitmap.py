@@ -0,0 +1,141 @@
+import functools
+import numpy as np
+
+# satu container mencakup 2^16 docID yang 16 bit teratasnya (key) sama
+CONTAINER_BITS = 16
+LOW_MASK = (1 << CONTAINER_BITS) - 1
+
+# banyaknya bit yang menyala untuk setiap nilai byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype = np.uint8)
+
+def popcount(words):
+    return int(POPCOUNT[words.view(np.uint8)].sum())
+
+def is_array(container):
+    """True untuk container array (uint16), False untuk container bitmap (uint64)"""
+    return container.dtype.itemsize == 2
+
+def to_words(container, num_words):
+    """Container (array atau bitmap) sebagai bitmap tepat num_words word uint64"""
+    if is_array(container):
+        bits = np.zeros(num_words * 64, dtype = np.uint8)
+        bits[container[container < num_words * 64]] = 1
+        return np.packbits(bits, bitorder = 'little').view('<u8')
+    words = np.zeros(num_words, dtype = '<u8')
+    size = min(num_words, len(container))
+    words[:size] = container[:size]
+    return words
+
+class RoaringBitmap:
+    """
+    Himpunan docID dalam bentuk Roaring bitmap. DocID dikelompokkan berdasarkan
+    16 bit teratasnya (key), dan setiap kelompok (container) disimpan dalam
+    bentuk yang lebih kecil di antara:
+
+    - array: sorted uint16 berisi 16 bit terbawah setiap docID (2 bytes per docID)
+    - bitmap: array uint64, bit ke-i menyala jika docID key * 2^16 + i ada di
+      himpunan. Berbeda dengan Roaring yang selalu memakai 2^16 bit, bitmap
+      dipotong setelah word terakhir yang tidak nol, sehingga juga ringkas
+      untuk koleksi yang kecil.
+
+    Union dan intersection dikerjakan per container: container array dengan
+    operasi himpunan atas sorted array, dan bitmap dengan OR/AND per word
+    64-bit, tanpa men-decode docID satu per satu.
+
+    Format bytes: banyaknya container (uint32), lalu untuk setiap container
+    (key, cardinality - 1, banyaknya word; 0 untuk container array) sebagai
+    uint16, lalu isi semua container berurutan (little-endian).
+
+    Attributes
+    ----------
+    containers: List of (key, cardinality, np.ndarray uint16 atau uint64), terurut berdasarkan key
+    """
+
+    def __init__(self, containers = ()):
+        self.containers = list(containers)
+
+    @classmethod
+    def from_sorted(cls, doc_ids):
+        """RoaringBitmap dari list docID yang sudah terurut naik (tanpa duplikat)"""
+        doc_ids = np.asarray(doc_ids, dtype = np.uint32)
+        containers = []
+        if len(doc_ids):
+            bounds = np.flatnonzero(np.diff(doc_ids >> CONTAINER_BITS)) + 1
+            for chunk in np.split(doc_ids, bounds):
+                low = (chunk & LOW_MASK).astype('<u2')
+                num_words = int(low[-1]) // 64 + 1
+                container = to_words(low, num_words) if 8 * num_words < 2 * len(low) else low
+                containers.append((int(chunk[0]) >> CONTAINER_BITS, len(low), container))
+        return cls(containers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Kebalikan dari to_bytes; isi container tidak di-copy (np.frombuffer)"""
+        num_containers = int(np.frombuffer(data, dtype = '<u4', count = 1)[0])
+        header = np.frombuffer(data, dtype = '<u2', count = 3 * num_containers, offset = 4).reshape(-1, 3).tolist()
+        offset = 4 + 6 * num_containers
+        containers = []
+        for key, cardinality, num_words in header:
+            cardinality += 1
+            if num_words:
+                container = np.frombuffer(data, dtype = '<u8', count = num_words, offset = offset)
+                offset += 8 * num_words
+            else:
+                container = np.frombuffer(data, dtype = '<u2', count = cardinality, offset = offset)
+                offset += 2 * cardinality
+            containers.append((key, cardinality, container))
+        return cls(containers)
+
+    def to_bytes(self):
+        header = [(key, cardinality - 1, 0 if is_array(container) else len(container)) \
+                  for key, cardinality, container in self.containers]
+        return np.array([len(self.containers)], dtype = '<u4').tobytes() + \
+               np.array(header, dtype = '<u2').tobytes() + \
+               b''.join(container.tobytes() for _, _, container in self.containers)
+
+    def to_array(self):
+        """Semua docID sebagai np.ndarray uint32 yang terurut naik"""
+        parts = []
+        for key, _, container in self.containers:
+            if is_array(container):
+                low = container.astype(np.uint32)
+            else:
+                low = np.flatnonzero(np.unpackbits(container.view(np.uint8), bitorder = 'little')).astype(np.uint32)
+            parts.append(low + np.uint32(key << CONTAINER_BITS))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype = np.uint32)
+
+    def __len__(self):
+        return sum(cardinality for _, cardinality, _ in self.containers)
+
+    def __or__(self, other):
+        return RoaringBitmap.combine([self, other])
+
+    def __and__(self, other):
+        return RoaringBitmap.combine([self, other], conjunctive = True)
+
+    @staticmethod
+    def combine(bitmaps, conjunctive = False):
+        """Union (atau intersection jika conjunctive) dari beberapa RoaringBitmap"""
+        by_key = {}
+        for bitmap in bitmaps:
+            for key, _, container in bitmap.containers:
+                by_key.setdefault(key, []).append(container)
+
+        containers = []
+        for key in sorted(by_key):
+            group = by_key[key]
+            if conjunctive and len(group) < len(bitmaps):
+                continue
+            if all(is_array(container) for container in group):
+                result = functools.reduce(np.intersect1d if conjunctive else np.union1d, group).astype('<u2')
+                cardinality = len(result)
+            else:
+                sizes = [int(container[-1]) // 64 + 1 if is_array(container) else len(container) \
+                         for container in group]
+                num_words = min(sizes) if conjunctive else max(sizes)
+                result = functools.reduce(np.bitwise_and if conjunctive else np.bitwise_or, \
+                                          [to_words(container, num_words) for container in group])
+                cardinality = popcount(result)
+            if cardinality:
+                containers.append((key, cardinality, result))
+        return RoaringBitmap(containers)
@@ -1,12 +1,25 @@
 import os
+import time
 import dill as pickle
 import contextlib
 import heapq
 import math
-
-from main.engine.index import InvertedIndexReader, InvertedIndexWriter
-from main.engine.util import IdMap, sorted_merge_posts_and_tfs, process_text
+import array
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from main.engine.index import InvertedIndexReader, InvertedIndexWriter, PostingsCache
+from main.engine.metrics import record, count, record_terms
+from main.engine.util import IdMap, sorted_merge_posts_and_tfs, process_text, tokenize_surface, STEMMER
 from main.engine.compression import VBEPostings
+from main.engine.snippet import SnippetIndex
+from main.engine.tier import TierIndex
+from main.engine.similar import SimilarDocuments
+from main.engine.rerank import LsiReranker
+from main.engine.suggest import SuggestIndex
+from main.engine.spell import SpellIndex
+from main.engine.hitcount import HitCounter
 from tqdm import tqdm
 
 class BSBIIndex:
@@ -21,49 +34,203 @@ class BSBIIndex:
     postings_encoding: Lihat di compression.py, kandidatnya adalah StandardPostings,
                     VBEPostings, dsb.
     index_name(str): Nama dari file yang berisi inverted index
+    snippet_index(SnippetIndex): Struktur kalimat per dokumen untuk membuat
+                    query-biased snippets (lihat snippet.py)
+    tier_index(TierIndex): Tier satu hasil static index pruning, atau None
+                    jika belum dibangun (lihat tier.py)
+    similar_docs(SimilarDocuments): Daftar dokumen yang mirip untuk setiap
+                    dokumen, atau None jika belum dibangun (lihat similar.py)
+    reranker(LsiReranker): Reranker LSI untuk tahap kedua retrieval, atau
+                    None jika belum dibangun (lihat rerank.py)
+    suggest_index(SuggestIndex): Index prefix untuk autocomplete (lihat suggest.py)
+    spell_index(SpellIndex): Index symmetric delete untuk koreksi ejaan (lihat spell.py)
+    hit_counter(HitCounter): Sketch KMV untuk menghitung banyaknya dokumen yang
+                    cocok dengan query (lihat hitcount.py)
+    surface_df(Counter): df setiap surface form, dihitung saat parse_block
     """
 
-    __instance = None
-
-    @staticmethod
-    def get_instance():
-        if BSBIIndex.__instance == None:
-            BSBIIndex(data_dir = 'collection', \
-            postings_encoding = VBEPostings, \
-            output_dir = 'index')
-        return BSBIIndex.__instance
+    # batas ukuran (bytes) postings dan bobot BM25 yang disimpan di term_weights_cache
+    TERM_WEIGHTS_CACHE_BYTES = 32 * 1024 * 1024
 
     def __init__(self, data_dir, output_dir, postings_encoding, index_name = "main_index"):
-        if BSBIIndex.__instance != None:
-            raise Exception('BSBIIndex is a Singleton class.')
         self.term_id_map = IdMap()
         self.doc_id_map = IdMap()
         self.data_dir = data_dir
         self.output_dir = output_dir
         self.index_name = index_name
         self.postings_encoding = postings_encoding
+        self.snippet_index = SnippetIndex(os.path.join(output_dir, 'snippets.dict'))
+        self.tier_index = None
+        self.similar_docs = None
+        self.reranker = None
+        self.suggest_index = SuggestIndex(os.path.join(output_dir, 'suggest.dict'))
+        self.spell_index = SpellIndex(os.path.join(output_dir, 'spell.dict'))
+        self.hit_counter = HitCounter(os.path.join(output_dir, index_name + '.sketch'))
+        self.surface_df = Counter()
 
         # Untuk menyimpan nama-nama file dari semua intermediate inverted index
         self.intermediate_indices = []
-        self.load()
 
-        BSBIIndex.__instance = self
+        # (versi index, termID, k1, b) -> (postings_list, array bobot BM25 per posting)
+        self.term_weights_cache = PostingsCache(self.TERM_WEIGHTS_CACHE_BYTES)
+        self.load()
 
     def save(self):
-        """Menyimpan doc_id_map and term_id_map ke output directory via pickle"""
+        """Menyimpan doc_id_map, term_id_map, dan snippet_index ke output directory via pickle"""
 
         with open(os.path.join(self.output_dir, 'terms.dict'), 'wb') as f:
             pickle.dump(self.term_id_map, f)
         with open(os.path.join(self.output_dir, 'docs.dict'), 'wb') as f:
             pickle.dump(self.doc_id_map, f)
+        self.snippet_index.save()
 
     def load(self):
-        """Memuat doc_id_map and term_id_map dari output directory"""
+        """
+        Memuat doc_id_map, term_id_map, dan snippet_index dari output directory.
+        File yang belum ada (misal index belum pernah dibangun) dilewati.
+        """
+        terms_path = os.path.join(self.output_dir, 'terms.dict')
+        if os.path.exists(terms_path):
+            with open(terms_path, 'rb') as f:
+                self.term_id_map = pickle.load(f)
+        docs_path = os.path.join(self.output_dir, 'docs.dict')
+        if os.path.exists(docs_path):
+            with open(docs_path, 'rb') as f:
+                self.doc_id_map = pickle.load(f)
+        self.snippet_index.load()
+        self.suggest_index.load()
+        self.spell_index.load()
+        self.hit_counter.load()
+        self.tier_index = None
+        if TierIndex.exists(self.output_dir, self.index_name):
+            tier_index = TierIndex(self.output_dir, self.index_name)
+            # tier satu dari main index sebelum dibangun ulang tidak dipakai (docID-nya
+            # bisa tidak ada lagi di doc_id_map); query dijawab dari tier dua
+            if tier_index.is_current():
+                self.tier_index = tier_index.load(self.postings_encoding)
+        if SimilarDocuments.exists(self.output_dir):
+            self.similar_docs = SimilarDocuments(self.output_dir).load()
+        if LsiReranker.exists(self.output_dir):
+            self.reranker = LsiReranker(self.output_dir).load()
+
+    def build_tier_index(self, fraction = 0.1, min_postings = 32, k1 = 1.6, b = 0.75):
+        """
+        Membangun tier satu (static index pruning) dari main index dan
+        langsung memakainya untuk retrieve_bm25. Lihat TierIndex.
+        """
+        TierIndex(self.output_dir, self.index_name).build(self, fraction, min_postings, k1, b)
+        self.tier_index = TierIndex(self.output_dir, self.index_name).load(self.postings_encoding)
+        return self.tier_index
 
-        with open(os.path.join(self.output_dir, 'terms.dict'), 'rb') as f:
-            self.term_id_map = pickle.load(f)
-        with open(os.path.join(self.output_dir, 'docs.dict'), 'rb') as f:
-            self.doc_id_map = pickle.load(f)
+    def build_similar_docs(self, k = 10, memory_budget = 64 * 1024 * 1024):
+        """
+        Menghitung top-k dokumen yang mirip untuk setiap dokumen (offline).
+        Lihat SimilarDocuments.
+        """
+        self.similar_docs = SimilarDocuments(self.output_dir, k).build(self, memory_budget)
+        return self.similar_docs
+
+    def get_similar_documents(self, doc_id, k = None):
+        """
+        List of (docID, score) dokumen yang paling mirip dengan doc_id, atau
+        list kosong jika similar_docs belum dibangun.
+        """
+        if self.similar_docs is None:
+            return []
+        return self.similar_docs.neighbours(doc_id, k)
+
+    def build_suggest_index(self, query_log = None, min_phrase_count = 2):
+        """
+        Membangun suggest index dari surface_df (atau dengan membaca ulang
+        dokumen jika surface_df kosong) dan frasa populer dari query_log
+        (QueryLog), lalu menyimpannya. Lihat SuggestIndex.
+        """
+        if not self.surface_df:
+            self.surface_df = SuggestIndex.count_surface_forms(self.doc_id_map.id_to_str)
+        phrase_counts = query_log.counts() if query_log is not None else None
+        self.suggest_index.build(self.surface_df, phrase_counts, min_phrase_count)
+        self.suggest_index.save()
+        return self.suggest_index
+
+    def build_spell_index(self):
+        """
+        Membangun spell index dari surface_df (atau dengan membaca ulang
+        dokumen jika surface_df kosong), lalu menyimpannya. Lihat SpellIndex.
+        """
+        if not self.surface_df:
+            self.surface_df = SuggestIndex.count_surface_forms(self.doc_id_map.id_to_str)
+        self.spell_index.build(self.surface_df)
+        self.spell_index.save()
+        return self.spell_index
+
+    def build_hit_sketches(self):
+        """Menghitung dan menyimpan sketch KMV untuk estimasi hit count. Lihat HitCounter."""
+        self.hit_counter.build(self)
+        self.hit_counter.save()
+        return self.hit_counter
+
+    def count_matches(self, query, conjunctive = False, exact_limit = 16384):
+        """
+        Banyaknya dokumen yang memuat minimal satu term query (atau semua term
+        jika conjunctive), tanpa scoring. Lihat HitCounter.count. Statistik term
+        query (lihat term_stats) dicatat ke StageTimer request yang aktif, dari
+        main index yang sudah terbuka di sini, untuk slow-query log.
+
+        Returns
+        -------
+        Tuple[int, bool]
+            (banyaknya dokumen, True jika exact dan False jika estimasi)
+        """
+        start = time.perf_counter()
+        analyzed = process_text(query)
+        terms = set(analyzed)
+        term_ids = [self.term_id_map.str_to_id[term] for term in terms if term in self.term_id_map.str_to_id]
+        if not term_ids:
+            record_terms(lambda: self.term_stats(analyzed, {}))
+            return 0, True
+        with InvertedIndexReader(self.index_name, self.postings_encoding, directory=self.output_dir) as reader:
+            record_terms(lambda: self.term_stats(analyzed, reader.postings_dict))
+            if conjunctive and len(term_ids) < len(terms):
+                return 0, True
+            result = self.hit_counter.count(reader, term_ids, conjunctive, exact_limit)
+        record('count', time.perf_counter() - start)
+        return result
+
+    def correct_query(self, query):
+        """
+        "Did you mean": query dengan kata-kata out-of-vocabulary dikoreksi,
+        atau None jika tidak ada yang dikoreksi. Lihat SpellIndex.correct.
+        """
+        return self.spell_index.correct(query, self.term_id_map.str_to_id)
+
+    def build_reranker(self, num_topics = 100):
+        """Membangun model LSI untuk reranking (offline). Lihat LsiReranker."""
+        self.reranker = LsiReranker(self.output_dir).build(self, num_topics)
+        return self.reranker
+
+    def rerank(self, query, results, budget = None):
+        """
+        Mengurutkan ulang hasil retrieve_bm25 (list of (score, nama dokumen))
+        dengan reranker. Jika reranker belum dibangun atau latency budget
+        (detik) terlampaui, results dikembalikan apa adanya.
+        """
+        if self.reranker is None:
+            return results
+        candidates = [(score, self.doc_id_map.str_to_id[doc]) for score, doc in results]
+        term_ids = self._query_term_ids(query)
+        start = time.perf_counter()
+        reranked = self.reranker.rerank(candidates, term_ids, budget)
+        record('rerank', time.perf_counter() - start)
+        if reranked is candidates:
+            return results
+        return [(score, self.doc_id_map[doc]) for score, doc in reranked]
+
+    def get_document(self, doc_id):
+        """
+        Mengembalikan DocumentSnippets (judul, isi, dan struktur kalimat) dari
+        sebuah dokumen berdasarkan docID-nya.
+        """
+        return self.snippet_index.get(doc_id, self.doc_id_map[doc_id])
 
     def parse_block(self, block_dir_relative):
         """
@@ -106,11 +273,16 @@ class BSBIIndex:
             reader = open(f, 'rb+')
 
             text = reader.read().decode()
-            text_tokenized = process_text(text)
+            reader.close()
+            surface = tokenize_surface(text)
+            self.surface_df.update(set(surface))
+            text_tokenized = [STEMMER.stem(word) for word in surface]
 
+            doc_id = self.doc_id_map[f]
             terms = [self.term_id_map[term] for term in text_tokenized]
-            curr_pairs = [(term_id, self.doc_id_map[f]) for term_id in terms]
+            curr_pairs = [(term_id, doc_id) for term_id in terms]
             td_pairs.extend(curr_pairs)
+            self.snippet_index.add(doc_id, f, text)
 
         return td_pairs
 
@@ -230,38 +402,8 @@ class BSBIIndex:
         JANGAN LEMPAR ERROR/EXCEPTION untuk terms yang TIDAK ADA di collection.
 
         """
-        # TODO
-        query_tokenized = process_text(query)
-
-        with InvertedIndexReader(directory=self.output_dir, index_name=self.index_name, postings_encoding=self.postings_encoding) as reader:
-            scores = {}
-
-            for i in range(len(query_tokenized)):
-                if query_tokenized[i] not in self.term_id_map:
-                    continue
-                
-                encoded_list = reader.get_postings_list(self.term_id_map[query_tokenized[i]])
-                posting_list = self.postings_encoding.decode(encoded_list[0])
-                tf_list = self.postings_encoding.decode(encoded_list[1])
-
-                wtq = 0
-                if df_mode == 0:
-                    wtq = math.log(len(reader.doc_length) / len(posting_list))
-                elif df_mode == 1:
-                    wtq = max(0, math.log((len(reader.doc_length) - len(posting_list))/ len(posting_list)))
-
-                for j in range(len(posting_list)):
-                    if posting_list[j] not in scores and tf_mode == 0:
-                        scores[posting_list[j]] = wtq * tf_list[j]
-                    elif posting_list[j] not in scores and tf_mode == 1:
-                        scores[posting_list[j]] = wtq * (1 + math.log(tf_list[j]))
-                    elif posting_list[j] in scores and tf_mode == 0:
-                        scores[posting_list[j]] += wtq * tf_list[j]
-                    elif posting_list[j] in scores and tf_mode == 1:
-                        scores[posting_list[j]] += wtq * (1 + math.log(tf_list[j]))
-
-        return [(score, self.doc_id_map[doc]) for doc, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)][:k]
-    
+        return self._retrieve_batch_chunk([query], 'tfidf', k, {'tf_mode': tf_mode, 'df_mode': df_mode})[0]
+
     def retrieve_bm25(self, query, k = 10, k1 = 1.6, b = 0.75):
         """
         Melakukan Ranked Retrieval dengan skema TaaT (Term-at-a-Time).
@@ -298,25 +440,251 @@ class BSBIIndex:
         JANGAN LEMPAR ERROR/EXCEPTION untuk terms yang TIDAK ADA di collection.
 
         """
-        # TODO
-        query_tokenized = process_text(query)
+        if self.tier_index is not None:
+            term_ids = self._query_term_ids(query)
+            start = time.perf_counter()
+            top = self.tier_index.retrieve(term_ids, k, k1, b)
+            record('tier', time.perf_counter() - start)
+            if top is not None:
+                return [(score, self.doc_id_map[doc]) for doc, score in top]
+        return self._retrieve_batch_chunk([query], 'bm25', k, {'k1': k1, 'b': b})[0]
+
+    def retrieve_tfidf_batch(self, queries, tf_mode = 1, df_mode = 0, k = 10, workers = None, executor = None):
+        """
+        Versi batch dari retrieve_tfidf. Lihat retrieve_bm25_batch.
 
+        Returns
+        -------
+        List[List[(int, str)]]
+            Hasil retrieve_tfidf untuk setiap query, sesuai urutan queries.
+        """
+        return self._retrieve_batch(queries, 'tfidf', k, {'tf_mode': tf_mode, 'df_mode': df_mode}, workers, executor)
+
+    def retrieve_bm25_batch(self, queries, k = 10, k1 = 1.6, b = 0.75, workers = None, executor = None):
+        """
+        Melakukan retrieve_bm25 untuk banyak query sekaligus. Index hanya dibuka
+        sekali, terms dari semua query di-deduplikasi, dan postings list setiap
+        term hanya dibaca dan di-decode sekali untuk dipakai semua query.
+
+        Parameters
+        ----------
+        queries: List[str]
+            List of query
+        workers: int
+            Jika diisi, queries dibagi menjadi beberapa chunk yang dikerjakan
+            secara paralel oleh process pool berukuran workers. Deduplikasi
+            postings dilakukan per chunk.
+        executor: ProcessPoolExecutor
+            Process pool yang dipakai ulang antar panggilan (misal satu pool
+            per process web server). Jika None, pool berukuran workers dibuat
+            dan ditutup lagi di setiap panggilan.
+
+        Returns
+        -------
+        List[List[(int, str)]]
+            Hasil retrieve_bm25 untuk setiap query, sesuai urutan queries.
+        """
+        return self._retrieve_batch(queries, 'bm25', k, {'k1': k1, 'b': b}, workers, executor)
+
+    def _retrieve_batch(self, queries, model, k, params, workers, executor = None):
+        if not workers or workers < 2 or len(queries) < 2:
+            return self._retrieve_batch_chunk(queries, model, k, params)
+
+        chunk_size = math.ceil(len(queries) / workers)
+        chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+        if executor is None:
+            with ProcessPoolExecutor(max_workers = len(chunks)) as executor:
+                return self._retrieve_batch(queries, model, k, params, workers, executor)
+        results = executor.map(self._retrieve_batch_chunk, chunks, itertools.repeat(model), \
+                               itertools.repeat(k), itertools.repeat(params))
+        return list(itertools.chain.from_iterable(results))
+
+    def _retrieve_batch_chunk(self, queries, model, k, params):
+        """
+        Inti dari retrieve_tfidf, retrieve_bm25, dan versi batch-nya. Skema
+        scoring tetap TaaT, namun setiap postings list yang dibutuhkan oleh
+        queries cukup di-decode sekali.
+        """
+        query_terms = [self._query_term_ids(query) for query in queries]
+
+        results = []
+        with InvertedIndexReader(self.index_name, self.postings_encoding, directory=self.output_dir) as reader:
+            postings = {}
+            for term_id in set(itertools.chain.from_iterable(query_terms)):
+                postings[term_id] = reader.get_decoded_postings(term_id)
+
+            for term_ids in query_terms:
+                start = time.perf_counter()
+                scores = {}
+                for term_id in term_ids:
+                    if model == 'bm25':
+                        self._score_bm25(scores, reader, *postings[term_id], **params)
+                    else:
+                        self._score_tfidf(scores, reader, *postings[term_id], **params)
+                scored = time.perf_counter()
+                results.append(self._top_k(scores, k))
+                record('score', scored - start)
+                record('topk', time.perf_counter() - scored)
+                count('docs_scored', len(scores))
+
+        return results
+
+    def _query_term_ids(self, query):
+        """Term IDs dari query; term yang tidak ada di collection diabaikan"""
+        start = time.perf_counter()
+        terms = process_text(query)
+        analyzed = time.perf_counter()
+        term_ids = [self.term_id_map.str_to_id[term] for term in terms if term in self.term_id_map.str_to_id]
+        record('analyze', analyzed - start)
+        record('dictionary', time.perf_counter() - analyzed)
+        return term_ids
+
+    def query_term_stats(self, query):
+        """Statistik term hasil analisis query (lihat term_stats) dari main index"""
+        with InvertedIndexReader(self.index_name, self.postings_encoding, directory=self.output_dir) as reader:
+            return self.term_stats(process_text(query), reader.postings_dict)
+
+    def term_stats(self, terms, postings_dict):
+        """
+        Term hasil analisis query beserta df dan ukuran postings-nya (bytes)
+        menurut postings_dict main index, misal untuk slow-query log. Term yang
+        tidak ada di collection memiliki df 0.
+
+        Returns
+        -------
+        List[dict]
+            {"term": stem, "df": document frequency, "bytes": ukuran postings
+            list dan tf list di index}
+        """
+        stats = []
+        for term in terms:
+            entry = postings_dict.get(self.term_id_map.str_to_id.get(term))
+            if entry is None:
+                stats.append({"term": term, "df": 0, "bytes": 0})
+            else:
+                stats.append({"term": term, "df": entry[1], "bytes": entry[2] + entry[3]})
+        return stats
+
+    def retrieve_bm25_after(self, query, k = 10, after = None, k1 = 1.6, b = 0.75):
+        """
+        Cursor-based pagination ("search after") untuk BM25. Hasil diurutkan
+        berdasarkan skor mengecil, lalu docID membesar jika skornya sama
+        (urutan yang sama dengan retrieve_bm25).
+
+        Halaman berikutnya diambil dengan bounded heap berukuran k atas dokumen
+        yang berada setelah cursor, tanpa mengurutkan seluruh hasil. Bobot
+        BM25 per posting diambil dari term_weights_cache sehingga halaman-halaman
+        berikutnya tidak perlu membaca dan menghitung ulang postings.
+
+        Parameters
+        ----------
+        after: Tuple[float, int]
+            Cursor (score, docID) dari dokumen terakhir di halaman sebelumnya,
+            atau None untuk halaman pertama.
+
+        Returns
+        -------
+        Tuple[List[(float, str)], Tuple[float, int]]
+            Top-K dokumen setelah cursor, dan cursor untuk halaman berikutnya
+            (None jika tidak ada halaman berikutnya).
+        """
+        scores = {}
+        term_ids = self._query_term_ids(query)
         with InvertedIndexReader(self.index_name, self.postings_encoding, directory=self.output_dir) as reader:
-            total_docs = len(reader.doc_length)
-            scores = {i:0 for i in range(total_docs)}
+            for term_id in term_ids:
+                postings_list, weights = self._bm25_term_weights(reader, term_id, k1, b)
+                start = time.perf_counter()
+                for doc_id, weight in zip(postings_list, weights):
+                    scores[doc_id] = scores.get(doc_id, 0) + weight
+                record('score', time.perf_counter() - start)
+
+        count('docs_scored', len(scores))
+        start = time.perf_counter()
+        candidates = scores.items()
+        if after is not None:
+            after_score, after_doc = after
+            candidates = ((doc, score) for doc, score in candidates \
+                          if score < after_score or (score == after_score and doc > after_doc))
+        top = heapq.nlargest(k, candidates, key=lambda item: (item[1], -item[0]))
+
+        cursor = (top[-1][1], top[-1][0]) if len(top) == k else None
+        top = [(score, self.doc_id_map[doc]) for doc, score in top]
+        record('topk', time.perf_counter() - start)
+        return top, cursor
+
+    def _bm25_term_weights(self, reader, term_id, k1, b):
+        """
+        Bobot BM25 (w(t, Q) * w(t, D)) untuk setiap posting dari sebuah term,
+        disimpan di term_weights_cache agar bisa dipakai ulang. Cache ini
+        dibatasi ukurannya dalam bytes dan aman dipakai dari beberapa thread
+        (lihat PostingsCache).
+        """
+        key = (reader.version, term_id, k1, b)
+        cached = self.term_weights_cache.get(key)
+        if cached is not None:
+            return cached
+
+        postings_list, tf_list = reader.get_decoded_postings(term_id)
+        scores = {}
+        self._score_bm25(scores, reader, postings_list, tf_list, k1, b)
+
+        weights = array.array('d', (scores[doc_id] for doc_id in postings_list))
+        self.term_weights_cache.put(key, postings_list, weights)
+        return postings_list, weights
 
-            for term in query_tokenized:
-                if term not in self.term_id_map:
-                    continue
-                term_id = self.term_id_map[term]
-                wtq = math.log10(total_docs / reader.postings_dict[term_id][1])
-                postings_list, tf_list = reader.get_postings_list(term_id)
+    def _top_k(self, scores, k):
+        return [(score, self.doc_id_map[doc]) for doc, score in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))]
 
-                for i, doc_id in enumerate(self.postings_encoding.decode(postings_list)):
-                    doc_weight = ((k1 + 1) * tf_list[i]) / (k1 * (1 - b + b * reader.doc_length[doc_id] / reader.avg_doc_length) + tf_list[i])
-                    scores[doc_id] += doc_weight * wtq
+    @staticmethod
+    def _score_tfidf(scores, reader, posting_list, tf_list, tf_mode, df_mode):
+        """
+        Akumulasi skor TF-IDF sebuah term ke scores (TaaT). Term yang muncul di
+        semua dokumen (untuk df_mode 1: di minimal separuh dokumen) ber-idf 0.
+        """
+        N, df = len(reader.doc_length), len(posting_list)
+        wtq = 0
+        if df_mode == 0:
+            wtq = math.log(N / df)
+        elif df_mode == 1 and N > df:
+            wtq = max(0, math.log((N - df) / df))
+
+        for doc_id, tf in zip(posting_list, tf_list):
+            if tf_mode == 0:
+                scores[doc_id] = scores.get(doc_id, 0) + wtq * tf
+            elif tf_mode == 1:
+                scores[doc_id] = scores.get(doc_id, 0) + wtq * (1 + math.log(tf))
 
-        return [(score, self.doc_id_map[doc]) for doc, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)][:k]
+    @staticmethod
+    def _score_bm25(scores, reader, postings_list, tf_list, k1, b):
+        """Akumulasi skor BM25 sebuah term ke scores (TaaT)"""
+        wtq = math.log10(len(reader.doc_length) / len(postings_list))
+        for doc_id, tf in zip(postings_list, tf_list):
+            doc_weight = ((k1 + 1) * tf) / (k1 * (1 - b + b * reader.doc_length[doc_id] / reader.avg_doc_length) + tf)
+            scores[doc_id] = scores.get(doc_id, 0) + doc_weight * wtq
+
+    def __getstate__(self):
+        """
+        Saat dikirim ke worker process, snippet_index, term_weights_cache,
+        tier_index, similar_docs, reranker, suggest_index, spell_index, dan
+        surface_df tidak ikut di-pickle karena tidak dibutuhkan untuk
+        retrieval batch. snippet_index dan term_weights_cache (yang memegang
+        lock) dibuat ulang kosong di __setstate__.
+        """
+        state = self.__dict__.copy()
+        state['snippet_index'] = None
+        state['term_weights_cache'] = None
+        state['tier_index'] = None
+        state['similar_docs'] = None
+        state['reranker'] = None
+        state['suggest_index'] = SuggestIndex(self.suggest_index.path)
+        state['spell_index'] = SpellIndex(self.spell_index.path)
+        state['surface_df'] = Counter()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.snippet_index = SnippetIndex(os.path.join(self.output_dir, 'snippets.dict'))
+        self.term_weights_cache = PostingsCache(self.TERM_WEIGHTS_CACHE_BYTES)
 
     def index(self):
         """
@@ -329,20 +697,43 @@ class BSBIIndex:
         di setiap block dan menyimpannya ke index yang baru.
         """
         # loop untuk setiap sub-directory di dalam folder collection (setiap block)
-        for block_dir_relative in tqdm(sorted(next(os.walk(self.data_dir))[1])):
-            td_pairs = self.parse_block(block_dir_relative)
-            index_id = 'intermediate_index_'+block_dir_relative
-            self.intermediate_indices.append(index_id)
-            with InvertedIndexWriter(index_id, self.postings_encoding, directory = self.output_dir) as index:
-                self.invert_write(td_pairs, index)
-                td_pairs = None
+        self.snippet_index.clear()
+        for block_dir_relative in tqdm(self.blocks()):
+            self.intermediate_indices.append(self.index_block(block_dir_relative))
+            self.snippet_index.flush()
     
         self.save()
+        self.merge_indices(self.intermediate_indices, self.index_name)
+
+        self.build_suggest_index()
+        self.build_spell_index()
+        self.build_hit_sketches()
+
+    def blocks(self):
+        """Nama-nama block (sub-directory) di collection, sesuai urutan indexing"""
+        return sorted(next(os.walk(self.data_dir))[1])
 
-        with InvertedIndexWriter(self.index_name, self.postings_encoding, directory = self.output_dir) as merged_index:
+    def index_block(self, block_dir_relative):
+        """
+        Parsing dan inversion satu block ke sebuah intermediate index.
+
+        Returns
+        -------
+        str
+            Nama intermediate index dari block tersebut
+        """
+        td_pairs = self.parse_block(block_dir_relative)
+        index_id = 'intermediate_index_'+block_dir_relative
+        with InvertedIndexWriter(index_id, self.postings_encoding, directory = self.output_dir) as index:
+            self.invert_write(td_pairs, index)
+        return index_id
+
+    def merge_indices(self, index_ids, output_name):
+        """Merge beberapa index (intermediate) di output directory menjadi index output_name"""
+        with InvertedIndexWriter(output_name, self.postings_encoding, directory = self.output_dir) as merged_index:
             with contextlib.ExitStack() as stack:
                 indices = [stack.enter_context(InvertedIndexReader(index_id, self.postings_encoding, directory=self.output_dir))
-                               for index_id in self.intermediate_indices]
+                               for index_id in index_ids]
                 self.merge(indices, merged_index)
 
 
@@ -0,0 +1,491 @@
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+import threading
+import dill as pickle
+from collections import Counter
+
+from main.engine.index import InvertedIndexReader
+from main.engine.util import IdMap
+from main.engine.tier import TierIndex
+from main.engine.similar import SimilarDocuments
+from main.engine.rerank import LsiReranker
+from main.engine.shard import ShardedIndex, shard_name, stats_path, load_shard_stats
+from main.engine.reorder import DocIdReassigner
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+MANIFEST_VERSION = 1
+
+def file_checksum(path, chunk_size = 1 << 20):
+    """SHA-256 dari isi sebuah file, dibaca per chunk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def peak_rss():
+    """Peak resident set size process ini (bytes), atau None jika tidak tersedia"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def current_rss():
+    """Resident set size process ini saat ini (bytes) dari /proc, atau None jika tidak tersedia"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class PhaseRss:
+    """
+    Peak RSS selama sebuah fase build. ru_maxrss adalah peak seumur process,
+    sehingga fase yang lebih ringan akan ikut melaporkan peak fase sebelumnya;
+    karena itu RSS di-sample oleh sebuah thread setiap interval detik selama
+    fase berjalan (lonjakan yang lebih singkat dari interval bisa terlewat).
+    Tanpa /proc (selain Linux), yang dilaporkan adalah peak_rss() di akhir fase.
+
+    Dipakai sebagai context manager; hasilnya ada di attribute peak.
+    """
+
+    def __init__(self, interval = 0.01):
+        self.interval = interval
+        self.peak = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def sample(self):
+        rss = current_rss()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        if self.peak is not None:
+            self.__thread = threading.Thread(target=self.__run, daemon=True)
+            self.__thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.__thread is None:
+            self.peak = peak_rss()
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.sample()
+
+class IndexBuilder:
+    """
+    Indexing BSBI yang bisa dilanjutkan (resumable) setelah terhenti.
+
+    Setiap block yang selesai di-index dicatat di manifest (build_manifest.json
+    di output directory) beserta checksum SHA-256 dari intermediate index-nya
+    dan dari file state block tersebut. File state (build/<index_id>.state)
+    berisi term, dokumen, snippet, dan df surface form yang baru ditambahkan
+    oleh block tersebut, sehingga term_id_map, doc_id_map, snippet index, dan
+    surface_df bisa dibangun ulang tanpa parsing ulang block yang sudah selesai.
+
+    Merge dilakukan bertingkat dengan fan-in tertentu: di setiap level, index
+    dari level sebelumnya di-merge per kelompok (merge_<level>_<kelompok>),
+    sampai tersisa paling banyak fan_in index yang di-merge menjadi main index.
+    Setiap hasil merge juga dicatat di manifest, sehingga build yang terhenti
+    saat merge dilanjutkan dari level terakhir yang selesai.
+
+    Saat dilanjutkan, checksum setiap block diverifikasi sesuai urutan block.
+    Karena docID dan termID diberikan berurutan, block pertama yang belum
+    selesai atau checksum-nya tidak cocok dan semua block setelahnya di-index
+    ulang.
+
+    Index turunan dari main index (tier satu, similar docs, model LSI, dan
+    shard) memakai docID main index, sehingga di fase finalize semua index
+    turunan yang ada (atau yang tercatat di manifest) dibangun ulang dengan
+    parameter yang sama, lalu dicatat di manifest (derived) beserta
+    checksum file-filenya. Index turunan baru (atau parameter baru) diminta
+    lewat parameter derived; jika berbeda dari yang tercatat, fase finalize
+    dijalankan ulang walaupun build sudah selesai.
+
+    Reorder docID (lihat DocIdReassigner) adalah fase antara merge dan
+    finalize. Manifest mencatat method, checksum main index hasil merge
+    (inputs), checksum main index hasil reorder, dan urutan docID-nya
+    (build/reorder.order). Selama hasil merge dan hasil reorder tidak berubah,
+    build berikutnya tidak me-merge ulang, dan doc_id_map serta snippet index
+    yang dibangun ulang dari state block langsung disusun ulang dengan urutan
+    yang tersimpan.
+
+    Attributes
+    ----------
+    bsbi_index(BSBIIndex): Index yang dibangun
+    fan_in(int): Banyaknya index yang di-merge sekaligus
+    progress: Callable(str) untuk pesan progress, atau None
+    reorder(str): Method reorder docID ('bisection' atau 'terms'), 'none' untuk
+        urutan asli, atau None untuk memakai method yang tercatat di manifest
+    derived: Dictionary nama index turunan -> parameter yang diminta (misal
+        {'tier': {'fraction': 0.05}}); parameter yang tidak disebut diambil dari
+        manifest, atau default method build-nya
+    query_log(QueryLog): Sumber frasa populer untuk suggest index, atau None
+    """
+
+    DERIVED = ('tier', 'similar', 'lsi', 'shards')
+
+    def __init__(self, bsbi_index, fan_in = 16, progress = None, reorder = None, derived = None, query_log = None):
+        if fan_in < 2:
+            raise ValueError("fan_in must be at least 2")
+        if reorder not in (None, 'none') + DocIdReassigner.METHODS:
+            raise ValueError(f"Unknown reorder method {reorder!r}")
+        for name in derived or {}:
+            if name not in self.DERIVED:
+                raise ValueError(f"Unknown derived index {name!r}")
+        self.bsbi_index = bsbi_index
+        self.fan_in = fan_in
+        self.progress = progress
+        self.reorder = reorder
+        self.derived = derived or {}
+        self.query_log = query_log
+        self.state_dir = os.path.join(bsbi_index.output_dir, 'build')
+        self.manifest_path = os.path.join(bsbi_index.output_dir, 'build_manifest.json')
+
+    def config(self):
+        index = self.bsbi_index
+        return {
+            "data_dir": os.path.abspath(index.data_dir),
+            "index_name": index.index_name,
+            "postings_encoding": index.postings_encoding.__name__,
+            "fan_in": self.fan_in,
+        }
+
+    def log(self, message):
+        if self.progress is not None:
+            self.progress(message)
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        """Ditulis ke file sementara lalu di-rename, agar manifest tidak pernah setengah jadi"""
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def checksums(self, filenames):
+        output_dir = self.bsbi_index.output_dir
+        return {filename: file_checksum(os.path.join(output_dir, filename)) for filename in filenames}
+
+    def verify(self, entry):
+        """True jika semua file sebuah entry manifest ada dan checksum-nya cocok"""
+        output_dir = self.bsbi_index.output_dir
+        for filename, checksum in entry["files"].items():
+            path = os.path.join(output_dir, filename)
+            if not os.path.exists(path) or file_checksum(path) != checksum:
+                return False
+        return True
+
+    @staticmethod
+    def index_files(index_id):
+        return [index_id + '.index', index_id + '.dict']
+
+    def state_file(self, index_id):
+        return os.path.join('build', index_id + '.state')
+
+    def order_file(self):
+        return os.path.join('build', 'reorder.order')
+
+    def reorder_method(self, manifest):
+        """Method reorder build ini: dari parameter reorder, atau yang tercatat di manifest"""
+        method = self.reorder if self.reorder is not None else (manifest.get("reorder") or {}).get("method")
+        return None if method == 'none' else method
+
+    def is_reordered(self, manifest, method):
+        """True jika main index di disk adalah hasil merge yang tercatat, di-reorder dengan method"""
+        entry = manifest.get("reorder")
+        merge = manifest["merges"].get(self.bsbi_index.index_name)
+        return method is not None and entry is not None and merge is not None and entry["method"] == method \
+               and entry["inputs"] == merge["files"] and self.verify(entry)
+
+    def run(self, restart = False):
+        """
+        Membangun (atau melanjutkan build) index, lalu mengembalikan laporan
+        per fase: throughput dan peak RSS.
+        """
+        index = self.bsbi_index
+        manifest = None if restart else self.load_manifest()
+        if manifest is not None and (manifest.get("version") != MANIFEST_VERSION or manifest.get("config") != self.config()):
+            self.log("Manifest was written for a different build configuration; starting over")
+            manifest = None
+        if manifest is None:
+            manifest = {"version": MANIFEST_VERSION, "config": self.config(), "blocks": {}, "merges": {}, "derived": {}, \
+                        "done": False}
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        blocks = index.blocks()
+        resumed = []
+        for block in blocks:
+            entry = manifest["blocks"].get(block)
+            if entry is None or not self.verify(entry):
+                break
+            resumed.append(block)
+        if len(resumed) < len(blocks):
+            manifest["blocks"] = {block: manifest["blocks"][block] for block in resumed}
+            manifest["merges"] = {}
+            manifest["done"] = False
+        recorded = manifest.setdefault("derived", {})
+        if any({**recorded.get(name, {}).get("params", {}), **params} != recorded.get(name, {}).get("params") \
+               for name, params in self.derived.items()):
+            manifest["done"] = False
+
+        method = self.reorder_method(manifest)
+        report = {}
+        for phase, run_phase in (("index", lambda: self.index_phase(manifest, blocks, resumed, method)), \
+                                 ("merge", lambda: self.merge_phase(manifest, blocks, method)), \
+                                 ("reorder", lambda: self.reorder_phase(manifest, method)), \
+                                 ("finalize", lambda: self.finalize_phase(manifest))):
+            with PhaseRss() as rss:
+                report[phase] = run_phase()
+            report[phase]["peak_rss"] = rss.peak
+        return report
+
+    def restore_block(self, block, entry):
+        """Menerapkan ulang state sebuah block yang sudah selesai ke bsbi_index"""
+        index = self.bsbi_index
+        with open(os.path.join(index.output_dir, self.state_file(entry["index_id"])), 'rb') as f:
+            state = pickle.load(f)
+        for term in state["terms"]:
+            index.term_id_map[term]
+        for doc in state["docs"]:
+            index.doc_id_map[doc]
+        index.snippet_index.pending.update(state["snippets"])
+        index.snippet_index.flush()
+        index.surface_df.update(state["surface_df"])
+
+    def index_phase(self, manifest, blocks, resumed, method):
+        index = self.bsbi_index
+        index.term_id_map = IdMap()
+        index.doc_id_map = IdMap()
+        index.snippet_index.clear()
+        index.surface_df = Counter()
+        for block in resumed:
+            self.restore_block(block, manifest["blocks"][block])
+        if resumed:
+            self.log(f"Resuming after {len(resumed)} of {len(blocks)} blocks")
+
+        start = time.perf_counter()
+        totals = Counter()
+        for block in blocks[len(resumed):]:
+            block_start = time.perf_counter()
+            num_terms, num_docs = len(index.term_id_map), len(index.doc_id_map)
+            surface_df, index.surface_df = index.surface_df, Counter()
+
+            index_id = index.index_block(block)
+
+            block_surface_df, index.surface_df = index.surface_df, surface_df
+            index.surface_df.update(block_surface_df)
+            new_docs = range(num_docs, len(index.doc_id_map))
+            state = {
+                "terms": index.term_id_map.id_to_str[num_terms:],
+                "docs": index.doc_id_map.id_to_str[num_docs:],
+                "snippets": dict(index.snippet_index.pending),
+                "surface_df": block_surface_df,
+            }
+            with open(os.path.join(index.output_dir, self.state_file(index_id)), 'wb') as f:
+                pickle.dump(state, f)
+            index.snippet_index.flush()
+
+            block_dir = os.path.join(index.data_dir, block)
+            size = sum(os.path.getsize(os.path.join(block_dir, filename)) for filename in os.listdir(block_dir))
+            with InvertedIndexReader(index_id, index.postings_encoding, directory=index.output_dir) as reader:
+                tokens = sum(reader.doc_length.values())
+
+            manifest["blocks"][block] = {
+                "index_id": index_id,
+                "files": self.checksums(self.index_files(index_id) + [self.state_file(index_id)]),
+                "docs": len(new_docs),
+                "tokens": tokens,
+                "bytes": size,
+                "seconds": time.perf_counter() - block_start,
+            }
+            self.save_manifest(manifest)
+            totals.update(docs = len(new_docs), tokens = tokens, bytes = size)
+            self.log(f"Block {block}: {len(new_docs)} docs, {tokens} tokens in {manifest['blocks'][block]['seconds']:.2f}s")
+
+        if self.is_reordered(manifest, method):
+            # main index di disk sudah di-reorder; docID dokumen disusun ulang dengan urutan yang sama
+            with open(os.path.join(index.output_dir, self.order_file()), 'rb') as f:
+                DocIdReassigner(index).remap_documents(pickle.load(f))
+        else:
+            index.save()
+        seconds = time.perf_counter() - start
+        return {
+            "blocks": len(blocks) - len(resumed),
+            "resumed_blocks": len(resumed),
+            "docs": totals["docs"],
+            "tokens": totals["tokens"],
+            "bytes": totals["bytes"],
+            "seconds": seconds,
+            "docs_per_second": totals["docs"] / seconds if seconds else 0.0,
+            "tokens_per_second": totals["tokens"] / seconds if seconds else 0.0,
+            "mb_per_second": totals["bytes"] / (1 << 20) / seconds if seconds else 0.0,
+        }
+
+    def merge_phase(self, manifest, blocks, method):
+        index = self.bsbi_index
+        start = time.perf_counter()
+        level_ids = [manifest["blocks"][block]["index_id"] for block in blocks]
+        merged, skipped, input_bytes = 0, 0, 0
+        level = 1
+        while level_ids:
+            final = len(level_ids) <= self.fan_in
+            groups = [level_ids] if final else [level_ids[i:i + self.fan_in] for i in range(0, len(level_ids), self.fan_in)]
+            outputs = []
+            for group_no, group in enumerate(groups):
+                if len(group) == 1 and not final:
+                    outputs.append(group[0])
+                    continue
+                name = index.index_name if final else f'merge_{level}_{group_no}'
+                entry = manifest["merges"].get(name)
+                if entry is not None and entry["inputs"] == group and \
+                   (self.verify(entry) or (final and self.is_reordered(manifest, method))):
+                    skipped += 1
+                else:
+                    index.merge_indices(group, name)
+                    manifest["merges"][name] = {"level": level, "inputs": group, "files": self.checksums(self.index_files(name))}
+                    manifest["done"] = False
+                    self.save_manifest(manifest)
+                    merged += 1
+                    input_bytes += sum(os.path.getsize(os.path.join(index.output_dir, filename)) \
+                                       for index_id in group for filename in self.index_files(index_id))
+                    self.log(f"Merged {len(group)} indexes into {name} (level {level})")
+                outputs.append(name)
+            if final:
+                break
+            level_ids = outputs
+            level += 1
+
+        seconds = time.perf_counter() - start
+        return {
+            "levels": level if level_ids else 0,
+            "merges": merged,
+            "resumed_merges": skipped,
+            "input_bytes": input_bytes,
+            "seconds": seconds,
+            "mb_per_second": input_bytes / (1 << 20) / seconds if seconds else 0.0,
+        }
+
+    def reorder_phase(self, manifest, method):
+        """Reorder docID main index hasil merge dengan method (lihat DocIdReassigner)"""
+        start = time.perf_counter()
+        if method is None or self.is_reordered(manifest, method):
+            if method is None and manifest.get("reorder") is not None:
+                manifest["reorder"] = None
+                self.save_manifest(manifest)
+            return {"method": method, "skipped": True, "seconds": time.perf_counter() - start}
+
+        index = self.bsbi_index
+        reassigner = DocIdReassigner(index)
+        size_before, decode_before, gap_before = reassigner.measure()
+        order = reassigner.compute_order(method)
+        reassigner.rewrite_main_index(order)
+        reassigner.remap_documents(order)
+        with open(os.path.join(index.output_dir, self.order_file()), 'wb') as f:
+            pickle.dump(order, f)
+        manifest["reorder"] = {
+            "method": method,
+            "inputs": manifest["merges"][index.index_name]["files"],
+            "files": self.checksums(self.index_files(index.index_name) + [self.order_file()]),
+        }
+        # index turunan dan sketch dibangun ulang di ruang docID yang baru
+        manifest["done"] = False
+        self.save_manifest(manifest)
+        size_after, decode_after, gap_after = reassigner.measure()
+        self.log(f"Reordered doc ids ({method}): {gap_before:.3f} -> {gap_after:.3f} bits per gap")
+        return {
+            "method": method,
+            "skipped": False,
+            "index_bytes_before": size_before,
+            "index_bytes_after": size_after,
+            "decode_seconds_before": decode_before,
+            "decode_seconds_after": decode_after,
+            "log2_gap_before": gap_before,
+            "log2_gap_after": gap_after,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def derived_indexes(self, manifest):
+        """
+        Index turunan yang perlu dibangun ulang beserta parameternya: yang
+        tercatat di manifest, ditambah yang ada di disk tetapi dibangun di
+        luar IndexBuilder (misal lewat BSBIIndex.build_tier_index), ditambah
+        yang diminta lewat parameter derived.
+        """
+        index = self.bsbi_index
+        output_dir = index.output_dir
+        derived = {name: entry["params"] for name, entry in manifest.get("derived", {}).items()}
+        if "tier" not in derived and TierIndex.exists(output_dir, index.index_name):
+            derived["tier"] = TierIndex(output_dir, index.index_name).build_params()
+        if "similar" not in derived and SimilarDocuments.exists(output_dir):
+            derived["similar"] = {"k": int(SimilarDocuments(output_dir).load().k)}
+        if "lsi" not in derived and LsiReranker.exists(output_dir):
+            derived["lsi"] = {"num_topics": int(LsiReranker(output_dir).load().docs.shape[1])}
+        if "shards" not in derived and os.path.exists(stats_path(output_dir, index.index_name)):
+            derived["shards"] = {"num_shards": load_shard_stats(output_dir, index.index_name)["num_shards"]}
+        for name, params in self.derived.items():
+            derived[name] = {**derived.get(name, {}), **params}
+        return derived
+
+    def build_derived(self, name, params):
+        """Membangun ulang sebuah index turunan dari main index, lalu mengembalikan nama file-filenya"""
+        index = self.bsbi_index
+        if name == "tier":
+            index.build_tier_index(**params)
+            return [index.index_name + '_tier1' + suffix for suffix in ('.index', '.dict', '.bounds')]
+        if name == "similar":
+            index.build_similar_docs(**params)
+            return ['similar_docs.npy', 'similar_scores.npy']
+        if name == "lsi":
+            index.build_reranker(**params)
+            return ['lsi_docs.npy', 'lsi_terms.npy']
+        if name == "shards":
+            ShardedIndex(index, params["num_shards"]).build()
+            return [os.path.basename(stats_path(index.output_dir, index.index_name))] + \
+                   [filename for shard_id in range(params["num_shards"]) \
+                    for filename in self.index_files(shard_name(index.index_name, shard_id))]
+        raise ValueError(f"Unknown derived index {name!r}")
+
+    def finalize_phase(self, manifest):
+        """
+        Suggest index dan spell index dari surface_df, sketch hit count dari
+        main index, dan index turunan lain (lihat derived_indexes)
+        """
+        start = time.perf_counter()
+        skipped = manifest["done"]
+        rebuilt = []
+        if not skipped:
+            self.bsbi_index.build_suggest_index(self.query_log)
+            self.bsbi_index.build_spell_index()
+            self.bsbi_index.build_hit_sketches()
+            derived = self.derived_indexes(manifest)
+            manifest["derived"] = {}
+            for name, params in derived.items():
+                files = self.build_derived(name, params)
+                manifest["derived"][name] = {"params": params, "files": self.checksums(files)}
+                self.save_manifest(manifest)
+                rebuilt.append(name)
+                self.log(f"Rebuilt derived index {name} ({', '.join(f'{key}={value}' for key, value in params.items())})")
+            manifest["done"] = True
+            self.save_manifest(manifest)
+        return {"skipped": skipped, "derived": rebuilt, "seconds": time.perf_counter() - start}
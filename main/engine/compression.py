@@ -1,5 +1,7 @@
 import array
 
+from main.engine.bitmap import RoaringBitmap
+
 class StandardPostings:
     """ 
     Class dengan static methods, untuk mengubah representasi postings list
@@ -245,11 +247,45 @@ class VBEPostings:
         """
         return VBEPostings.vb_decode(encoded_tf_list)
 
+class BitmapPostings:
+    """
+    Postings list sebagai RoaringBitmap (lihat bitmap.py). Untuk term yang
+    muncul di sebagian besar dokumen, bitmap lebih ringkas dari gap VBE (yang
+    minimal 1 byte per posting), dan decode-nya hampir seperti memcpy:
+    container dibaca langsung dengan np.frombuffer, tanpa loop per posting.
+
+    TF tidak bisa direpresentasikan sebagai bitmap, sehingga disimpan terpisah
+    sebagai VBE. InvertedIndexWriter memakai BitmapPostings untuk postings list
+    yang padat (lihat InvertedIndexWriter.BITMAP_DENSITY); TF list-nya tetap
+    di-encode dengan postings_encoding index.
+    """
+
+    @staticmethod
+    def encode(postings_list):
+        return RoaringBitmap.from_sorted(postings_list).to_bytes()
+
+    @staticmethod
+    def decode(encoded_postings_list):
+        return RoaringBitmap.from_bytes(encoded_postings_list).to_array().tolist()
+
+    @staticmethod
+    def decode_array(encoded_postings_list):
+        """Seperti decode, namun langsung sebagai array('I') tanpa membuat python's list"""
+        return array.array('I', RoaringBitmap.from_bytes(encoded_postings_list).to_array().astype('=u4').tobytes())
+
+    @staticmethod
+    def encode_tf(tf_list):
+        return VBEPostings.encode_tf(tf_list)
+
+    @staticmethod
+    def decode_tf(encoded_tf_list):
+        return VBEPostings.decode_tf(encoded_tf_list)
+
 if __name__ == '__main__':
     
     postings_list = [34, 67, 89, 454, 2345738]
     tf_list = [12, 10, 3, 4, 1]
-    for Postings in [StandardPostings, VBEPostings]:
+    for Postings in [StandardPostings, VBEPostings, BitmapPostings]:
         print(Postings.__name__)
         encoded_postings_list = Postings.encode(postings_list)
         encoded_tf_list = Postings.encode_tf(tf_list)
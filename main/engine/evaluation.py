@@ -0,0 +1,220 @@
+import os
+import math
+import time
+import itertools
+import numpy as np
+
+from main.engine.benchmark import percentiles
+from main.engine.index import InvertedIndexReader
+
+def load_queries(path):
+    """
+    Query dalam format SMART (MED.QRY): setiap query diawali ".I <id>",
+    teksnya berada setelah baris ".W".
+
+    Returns
+    -------
+    Dict[str, str]
+        Mapping id query -> teks query, sesuai urutan di file
+    """
+    queries = {}
+    query_id, field = None, None
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if line.startswith('.I'):
+                query_id, field = line.split()[1], None
+                queries[query_id] = ''
+            elif line.startswith('.'):
+                field = line[:2]
+            elif query_id is not None and field == '.W':
+                queries[query_id] += ' ' + line.strip()
+    return {query_id: text.strip() for query_id, text in queries.items()}
+
+def load_qrels(path):
+    """
+    Relevance judgment (MED.REL). Setiap baris berformat TREC
+    "<query> 0 <dokumen> <relevansi>" atau "<query> <dokumen>" (relevansi 1).
+
+    Returns
+    -------
+    Dict[str, Dict[str, int]]
+        Mapping id query -> {id dokumen: relevansi}, hanya relevansi > 0
+    """
+    qrels = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 4:
+                query_id, _, doc_id, relevance = fields
+            elif len(fields) == 2:
+                (query_id, doc_id), relevance = fields, 1
+            else:
+                continue
+            if int(relevance) > 0:
+                qrels.setdefault(query_id, {})[doc_id] = int(relevance)
+    return qrels
+
+def doc_key(doc_path):
+    """Id dokumen pada relevance judgment, yaitu nama file tanpa .txt"""
+    return os.path.basename(doc_path)[:-4]
+
+def average_precision(ranking, judgments):
+    hits, total = 0, 0.0
+    for rank, doc in enumerate(ranking, 1):
+        if doc in judgments:
+            hits += 1
+            total += hits / rank
+    return total / len(judgments) if judgments else 0.0
+
+def ndcg(ranking, judgments, k = 10):
+    """nDCG@k dengan gain 2^rel - 1"""
+    dcg = sum((2 ** judgments.get(doc, 0) - 1) / math.log2(rank + 1) for rank, doc in enumerate(ranking[:k], 1))
+    ideal = sorted(judgments.values(), reverse = True)[:k]
+    idcg = sum((2 ** rel - 1) / math.log2(rank + 1) for rank, rel in enumerate(ideal, 1))
+    return dcg / idcg if idcg else 0.0
+
+def recall(ranking, judgments, k = 100):
+    return sum(1 for doc in ranking[:k] if doc in judgments) / len(judgments) if judgments else 0.0
+
+def evaluate(run, qrels):
+    """
+    MAP, nDCG@10, dan recall@100 rata-rata atas query yang memiliki judgment.
+
+    Parameters
+    ----------
+    run: Dict[str, List[str]]
+        Mapping id query -> ranking id dokumen
+    """
+    query_ids = [query_id for query_id in run if qrels.get(query_id)]
+    if not query_ids:
+        return {"queries": 0, "map": 0.0, "ndcg@10": 0.0, "recall@100": 0.0}
+    return {
+        "queries": len(query_ids),
+        "map": float(np.mean([average_precision(run[q], qrels[q]) for q in query_ids])),
+        "ndcg@10": float(np.mean([ndcg(run[q], qrels[q], 10) for q in query_ids])),
+        "recall@100": float(np.mean([recall(run[q], qrels[q], 100) for q in query_ids])),
+    }
+
+class Evaluator:
+    """
+    Evaluasi efektivitas (MAP, nDCG@10, recall@100) dan kecepatan (latency)
+    dari mode-mode retrieval sebuah BSBIIndex atas query dan relevance
+    judgment yang sama, agar konfigurasi yang lebih cepat bisa dipilih tanpa
+    menurunkan kualitas ranking.
+
+    Attributes
+    ----------
+    bsbi_index(BSBIIndex): Index yang dievaluasi
+    queries: Dictionary mapping id query -> teks query
+    qrels: Dictionary mapping id query -> {id dokumen: relevansi}
+    depth(int): Banyaknya dokumen yang di-retrieve per query (kedalaman MAP)
+    """
+
+    def __init__(self, bsbi_index, queries, qrels, depth = 1000):
+        self.bsbi_index = bsbi_index
+        self.queries = {query_id: text for query_id, text in queries.items() if query_id in qrels}
+        self.qrels = qrels
+        self.depth = depth
+
+    def modes(self):
+        """
+        Mapping nama mode -> callable(query, k) yang mengembalikan list of
+        (score, nama dokumen): BM25, TF-IDF untuk semua kombinasi tf_mode dan
+        df_mode, serta BM25 tanpa tier dan BM25 + rerank LSI jika tersedia.
+        """
+        index = self.bsbi_index
+        modes = {"bm25": lambda query, k: index.retrieve_bm25(query, k = k)}
+        for tf_mode, df_mode in itertools.product((0, 1), (0, 1)):
+            modes[f"tfidf(tf_mode={tf_mode},df_mode={df_mode})"] = \
+                lambda query, k, tf_mode = tf_mode, df_mode = df_mode: \
+                    index.retrieve_tfidf(query, tf_mode = tf_mode, df_mode = df_mode, k = k)
+        if index.tier_index is not None:
+            modes["bm25(no tier)"] = lambda query, k: \
+                index._retrieve_batch_chunk([query], 'bm25', k, {'k1': 1.6, 'b': 0.75})[0]
+        if index.reranker is not None:
+            modes["bm25+rerank"] = lambda query, k: index.rerank(query, index.retrieve_bm25(query, k = k))
+        return modes
+
+    def run(self, retrieve, warmup = True):
+        """
+        Menjalankan semua query dengan retrieve; hasil evaluasi dan latency per
+        query. Jika warmup, semua query dijalankan sekali terlebih dahulu agar
+        latency yang diukur tidak termasuk memuat metadata dan mengisi cache.
+        """
+        if warmup:
+            for text in self.queries.values():
+                retrieve(text, self.depth)
+        run, latencies = {}, []
+        for query_id, text in self.queries.items():
+            start = time.perf_counter()
+            results = retrieve(text, self.depth)
+            latencies.append(time.perf_counter() - start)
+            run[query_id] = [doc_key(doc_path) for _, doc_path in results]
+        report = evaluate(run, self.qrels)
+        report["latency_ms"] = percentiles(latencies)
+        return report
+
+    def evaluate_modes(self, names = None):
+        modes = self.modes()
+        names = names or list(modes)
+        return {name: self.run(modes[name]) for name in names}
+
+    def sweep_bm25(self, k1_values, b_values, memory_budget = 64 * 1024 * 1024):
+        """
+        Evaluasi BM25 untuk semua kombinasi k1 dan b tanpa indexing ulang.
+        Postings setiap query cukup dibaca sekali, lalu skor untuk seluruh grid
+        (k1, b) dihitung sekaligus dengan numpy: matriks skor berukuran
+        (banyaknya kombinasi, banyaknya dokumen kandidat) per query, dibagi per
+        kelompok kombinasi agar ukurannya tidak melebihi memory_budget. Skor dan
+        urutan (skor mengecil, lalu docID membesar) sama dengan retrieve_bm25.
+
+        Returns
+        -------
+        List[dict]
+            {"k1", "b", "map", "ndcg@10", "recall@100"} untuk setiap kombinasi,
+            terurut dari MAP terbesar
+        """
+        grid = np.array(list(itertools.product(k1_values, b_values)), dtype = np.float64)
+        runs = [{} for _ in range(len(grid))]
+        index = self.bsbi_index
+        with InvertedIndexReader(index.index_name, index.postings_encoding, directory = index.output_dir) as reader:
+            N = len(reader.doc_length)
+            doc_keys = {doc_id: doc_key(index.doc_id_map[doc_id]) for doc_id in reader.doc_length}
+            for query_id, text in self.queries.items():
+                term_ids = index._query_term_ids(text)
+                postings = [reader.get_decoded_postings(term_id) for term_id in term_ids]
+                if not postings:
+                    for run in runs:
+                        run[query_id] = []
+                    continue
+                candidates, inverse = np.unique(np.concatenate([np.asarray(p, dtype = np.int64) for p, _ in postings]), \
+                                                return_inverse = True)
+                relative_length = np.array([reader.doc_length[doc_id] for doc_id in candidates], \
+                                           dtype = np.float64) / reader.avg_doc_length
+                keys = [doc_keys[doc_id] for doc_id in candidates.tolist()]
+                depth = min(self.depth, len(candidates))
+                rows = max(1, memory_budget // (3 * 8 * len(candidates)))
+                for start in range(0, len(grid), rows):
+                    k1, b = grid[start:start + rows, :1], grid[start:start + rows, 1:]
+                    norm = k1 * (1 - b + b * relative_length)     # (kombinasi, kandidat)
+                    scores = np.zeros(norm.shape)
+                    offset = 0
+                    for postings_list, tf_list in postings:
+                        columns = inverse[offset:offset + len(postings_list)]
+                        offset += len(postings_list)
+                        tf = np.asarray(tf_list, dtype = np.float64)
+                        wtq = math.log10(N / len(postings_list))
+                        scores[:, columns] += wtq * ((k1 + 1) * tf) / (norm[:, columns] + tf)
+
+                    for row, run in zip(scores, runs[start:start + rows]):
+                        # candidates terurut membesar, sehingga sort stabil atas -skor memberi tie-break docID
+                        order = np.argsort(-row, kind = 'stable')[:depth]
+                        run[query_id] = [keys[i] for i in order]
+
+        results = []
+        for (k1_value, b_value), run in zip(grid.tolist(), runs):
+            report = evaluate(run, self.qrels)
+            results.append({"k1": k1_value, "b": b_value, "map": report["map"], \
+                            "ndcg@10": report["ndcg@10"], "recall@100": report["recall@100"]})
+        results.sort(key = lambda result: -result["map"])
+        return results
@@ -0,0 +1,130 @@
+import os
+import functools
+import dill as pickle
+import numpy as np
+
+from main.engine.bitmap import RoaringBitmap
+from main.engine.index import InvertedIndexReader
+
+def doc_hashes(doc_ids):
+    """Hash 64-bit (splitmix64) dari setiap docID, tersebar seragam di [0, 2^64)"""
+    x = np.asarray(doc_ids, dtype = np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def exact_count(postings_lists, conjunctive = False):
+    """Kardinalitas union (atau intersection jika conjunctive) dari beberapa postings list"""
+    arrays = sorted((np.asarray(postings) for postings in postings_lists), key = len)
+    if conjunctive:
+        return int(len(functools.reduce(np.intersect1d, arrays)))
+    return int(len(np.unique(np.concatenate(arrays))))
+
+class HitCounter:
+    """
+    Banyaknya dokumen yang cocok dengan sebuah query (disjunctive: minimal satu
+    term, conjunctive: semua term), tanpa scoring.
+
+    Jika total df term-term query kecil, jumlahnya dihitung secara exact dari
+    postings list (yang biasanya sudah ada di postings_cache). Postings list
+    yang disimpan sebagai bitmap tidak dihitung dalam total tersebut, karena
+    union/intersection-nya dikerjakan per word tanpa decode. Jika besar,
+    jumlahnya diestimasi dari sketch KMV (k minimum values) per term yang
+    dihitung saat indexing: k hash terkecil dari docID di postings list term
+    dengan df >= min_df (term dengan df lebih kecil di-hash saat query).
+    Semua hash yang lebih kecil dari theta, yaitu hash ke-k terkecil dari
+    sketch yang tidak memuat seluruh postings-nya, diketahui untuk setiap term,
+    sehingga union dan intersection diestimasi dari banyaknya hash < theta
+    di union/intersection tersebut dibagi theta (dinormalisasi ke [0, 1)).
+    Galat relatif estimasi union sekitar 1 / sqrt(k); intersection yang jauh
+    lebih kecil dari term-term-nya diestimasi dengan galat yang lebih besar.
+
+    Attributes
+    ----------
+    path(str): Path ke file sketch
+    k(int): Ukuran sketch
+    min_df(int): Term dengan df >= min_df disimpan sketch-nya; None berarti
+        ditentukan dari banyaknya dokumen saat build (lihat default_min_df)
+    sketches: Dictionary mapping termID -> np.ndarray uint64 (k hash terkecil, terurut)
+    """
+
+    # batas atas min_df: postings term tanpa sketch di-hash saat query, sehingga df-nya harus kecil
+    MIN_DF = 1024
+
+    def __init__(self, path, k = 256, min_df = None):
+        self.path = path
+        self.k = k
+        self.min_df = min_df
+        self.auto_min_df = min_df is None
+        self.sketches = {}
+
+    def default_min_df(self, N):
+        """
+        min_df untuk koleksi dengan N dokumen. Term dengan df <= k tidak perlu
+        sketch (sketch-nya memuat seluruh hash), dan di koleksi kecil MIN_DF
+        bisa lebih besar dari df term mana pun sehingga tidak ada sketch sama
+        sekali; karena itu min_df diturunkan sampai N / 4.
+        """
+        return min(self.MIN_DF, max(self.k + 1, N // 4))
+
+    def build(self, bsbi_index):
+        """Menghitung sketch untuk setiap term di main index dengan df >= min_df"""
+        self.sketches = {}
+        with InvertedIndexReader(bsbi_index.index_name, bsbi_index.postings_encoding, \
+                                 directory = bsbi_index.output_dir) as reader:
+            if self.auto_min_df:
+                self.min_df = self.default_min_df(len(reader.doc_length))
+            for term_id, entry in reader.postings_dict.items():
+                if entry[1] >= self.min_df:
+                    postings, _ = reader.get_postings_list(term_id)
+                    self.sketches[term_id] = np.sort(doc_hashes(reader.postings_codec(term_id).decode(postings)))[:self.k]
+        return self
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            pickle.dump((self.k, self.min_df, self.sketches), f)
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.k, self.min_df, self.sketches = pickle.load(f)
+        return self
+
+    def count(self, reader, term_ids, conjunctive = False, exact_limit = 16384):
+        """
+        Returns
+        -------
+        Tuple[int, bool]
+            (banyaknya dokumen yang cocok, True jika jumlahnya exact)
+        """
+        term_ids = list(dict.fromkeys(term_ids))
+        if not term_ids:
+            return 0, True
+        dfs = [reader.postings_dict[term_id][1] for term_id in term_ids]
+        # term dengan df besar tanpa sketch (misal index dibangun sebelum ada
+        # sketch) tidak bisa diestimasi, sehingga dihitung exact
+        min_df = self.MIN_DF if self.min_df is None else self.min_df
+        estimable = all(term_id in self.sketches or df < min_df for term_id, df in zip(term_ids, dfs))
+        bitmaps = [reader.is_bitmap(term_id) for term_id in term_ids]
+        if sum(df for df, bitmap in zip(dfs, bitmaps) if not bitmap) <= exact_limit or not estimable:
+            if any(bitmaps):
+                return len(RoaringBitmap.combine([reader.get_bitmap(term_id) for term_id in term_ids], \
+                                                 conjunctive)), True
+            postings = [reader.get_decoded_postings(term_id)[0] for term_id in term_ids]
+            return exact_count(postings, conjunctive), True
+
+        sketches = [self.sketches[term_id] if term_id in self.sketches else \
+                    np.sort(doc_hashes(reader.get_decoded_postings(term_id)[0])) for term_id in term_ids]
+        truncated = [sketch for sketch, df in zip(sketches, dfs) if len(sketch) < df]
+        if not truncated:
+            # semua sketch memuat seluruh hash term-nya, sehingga hasilnya exact
+            return exact_count(sketches, conjunctive), True
+
+        theta = min(sketch[-1] for sketch in truncated)
+        samples = [sketch[sketch < theta] for sketch in sketches]
+        estimate = exact_count(samples, conjunctive) / (float(theta) / 2 ** 64)
+        if conjunctive:
+            estimate = min(estimate, min(dfs))
+        else:
+            estimate = min(max(estimate, max(dfs)), len(reader.doc_length))
+        return int(round(estimate)), False
@@ -1,5 +1,152 @@
 import pickle
 import os
+import math
+import heapq
+import time
+import array
+import threading
+
+from main.engine.metrics import record, count
+from main.engine.bitmap import RoaringBitmap
+from main.engine.compression import BitmapPostings
+
+class PostingsCache:
+    """
+    Cache per-process untuk postings list yang sudah di-decode, agar postings
+    dari term yang sering muncul di query tidak perlu dibaca dari disk dan
+    di-decode ulang di setiap query.
+
+    Postings disimpan sebagai array('I') (bukan python's list) agar ringkas.
+    Key dari cache adalah (versi index, termID), sehingga entry dari index
+    lama otomatis tidak terpakai lagi ketika index dibangun ulang.
+
+    Eviction menggunakan skema GreedyDual-Size-Frequency: prioritas sebuah
+    entry adalah L + frekuensi_akses * log2(1 + df), dengan L adalah prioritas
+    entry terakhir yang di-evict. Term dengan df besar (mahal untuk di-decode)
+    lebih lama dipertahankan, sementara entry yang lama tidak diakses
+    perlahan "menua" dan ter-evict.
+
+    Attributes
+    ----------
+    max_bytes(int): Batas total ukuran (dalam bytes) dari postings yang di-cache
+    hits, misses, evictions(int): Counter untuk monitoring
+    """
+
+    # perkiraan overhead per entry (tuple, key, dan dua objek array)
+    ENTRY_OVERHEAD = 256
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__entries = {}     # key -> [postings, tfs, size, priority, frequency, df]
+        self.__heap = []        # (priority, key), dengan lazy deletion
+        self.__age = 0          # nilai L pada GreedyDual
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key):
+        """Mengembalikan (postings, tfs) atau None jika key tidak ada di cache"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[4] += 1
+            entry[3] = self.__age + entry[4] * math.log2(1 + entry[5])
+            heapq.heappush(self.__heap, (entry[3], key))
+            return entry[0], entry[1]
+
+    def put(self, key, postings, tfs):
+        """Menyimpan postings dan tfs (array) ke cache, lalu evict jika melebihi budget"""
+        size = postings.itemsize * len(postings) + tfs.itemsize * len(tfs) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                return
+            df = len(postings)
+            priority = self.__age + math.log2(1 + df)
+            self.__entries[key] = [postings, tfs, size, priority, 1, df]
+            heapq.heappush(self.__heap, (priority, key))
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self.__heap:
+                priority, victim = heapq.heappop(self.__heap)
+                entry = self.__entries.get(victim)
+                if entry is None or entry[3] != priority:
+                    continue        # entry heap yang sudah usang
+                del self.__entries[victim]
+                self.current_bytes -= entry[2]
+                self.__age = priority
+                self.evictions += 1
+
+            # buang entry usang jika heap tumbuh jauh lebih besar dari isi cache
+            if len(self.__heap) > 4 * len(self.__entries) + 64:
+                self.__heap = [(entry[3], k) for k, entry in self.__entries.items()]
+                heapq.heapify(self.__heap)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__heap = []
+            self.__age = 0
+            self.current_bytes = 0
+
+    def stats(self):
+        """Ringkasan counter cache, berguna untuk monitoring"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.__entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Satu cache untuk setiap process, budget dapat diatur lewat environment variable
+postings_cache = PostingsCache(int(os.environ.get('MEDBIB_POSTINGS_CACHE_BYTES', 64 * 1024 * 1024)))
+
+# Metadata (postings_dict, terms, doc_length, avg_doc_length) yang sudah di-unpickle,
+# per path file metadata: path -> ((mtime, size), metadata)
+metadata_cache = {}
+metadata_cache_lock = threading.Lock()
+
+# penanda di elemen ke-5 entry postings_dict untuk postings list berbentuk bitmap
+BITMAP = 'bitmap'
+
+def load_metadata(metadata_file_path):
+    """
+    Memuat metadata sebuah index. Hasil unpickle disimpan di metadata_cache
+    sehingga reader yang dibuka berulang kali (misal, sekali per query) tidak
+    perlu membaca ulang file metadata selama file tersebut tidak berubah.
+    """
+    stat = os.stat(metadata_file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with metadata_cache_lock:
+        cached = metadata_cache.get(metadata_file_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    with open(metadata_file_path, 'rb') as f:
+        metadata = pickle.load(f)
+    with metadata_cache_lock:
+        metadata_cache[metadata_file_path] = (version, metadata)
+    return metadata
+
+def evict_metadata(directory):
+    """Membuang metadata dari semua index di sebuah directory dari metadata_cache"""
+    directory = os.path.join(directory, '')
+    with metadata_cache_lock:
+        for path in [path for path in metadata_cache if path.startswith(directory)]:
+            del metadata_cache[path]
 
 class InvertedIndex:
     """
@@ -32,6 +179,9 @@ class InvertedIndex:
            4. length_in_bytes_of_tf_list : panjang list of term frequencies dari
               postings list terkait dalam satuan byte
 
+        Entry dari postings list yang disimpan sebagai bitmap (lihat
+        InvertedIndexWriter.BITMAP_DENSITY) memiliki elemen ke-5, yaitu BITMAP.
+
     terms: List[int]
         List of terms IDs, untuk mengingat urutan terms yang dimasukan ke
         dalam Inverted Index.
@@ -81,12 +231,18 @@ class InvertedIndex:
         https://docs.python.org/3/reference/datamodel.html#object.__enter__
         """
         # Membuka index file
-        self.index_file = open(self.index_file_path, 'rb+')
+        self.index_file = open(self.index_file_path, 'rb')
+
+        # Versi index, dipakai sebagai bagian dari key PostingsCache
+        stat = os.fstat(self.index_file.fileno())
+        self.version = (self.index_file_path, stat.st_mtime_ns, stat.st_size)
 
         # Kita muat postings dict dan terms iterator dari file metadata
-        with open(self.metadata_file_path, 'rb') as f:
-            self.postings_dict, self.terms, self.doc_length, self.avg_doc_length = pickle.load(f)
-            self.term_iter = self.terms.__iter__()
+        # (lewat metadata_cache, lihat load_metadata)
+        start = time.perf_counter()
+        self.postings_dict, self.terms, self.doc_length, self.avg_doc_length = load_metadata(self.metadata_file_path)
+        record('dictionary', time.perf_counter() - start)
+        self.term_iter = self.terms.__iter__()
 
         return self
 
@@ -99,6 +255,13 @@ class InvertedIndex:
         with open(self.metadata_file_path, 'wb') as f:
             pickle.dump([self.postings_dict, self.terms, self.doc_length, self.avg_doc_length], f)
 
+    def is_bitmap(self, term):
+        return len(self.postings_dict[term]) > 4
+
+    def postings_codec(self, term):
+        """Encoding postings list term: BitmapPostings atau postings_encoding"""
+        return BitmapPostings if self.is_bitmap(term) else self.postings_encoding
+
 
 class InvertedIndexReader(InvertedIndex):
     """
@@ -108,6 +271,13 @@ class InvertedIndexReader(InvertedIndex):
     def __iter__(self):
         return self
 
+    def __exit__(self, exception_type, exception_value, traceback):
+        """
+        Reader tidak mengubah metadata, sehingga cukup menutup index_file.
+        Hal ini juga membuat beberapa reader aman dibuka bersamaan.
+        """
+        self.index_file.close()
+
     def reset(self):
         """
         Kembalikan file pointer ke awal, dan kembalikan pointer iterator
@@ -132,8 +302,8 @@ class InvertedIndexReader(InvertedIndex):
         diproses di memori. JANGAN MEMUAT SEMUA INDEX DI MEMORI!
         """
         curr_term = next(self.term_iter)
-        pos, number_of_postings, len_in_bytes_of_postings, len_in_bytes_of_tf = self.postings_dict[curr_term]
-        postings_list = self.postings_encoding.decode(self.index_file.read(len_in_bytes_of_postings))
+        pos, number_of_postings, len_in_bytes_of_postings, len_in_bytes_of_tf = self.postings_dict[curr_term][:4]
+        postings_list = self.postings_codec(curr_term).decode(self.index_file.read(len_in_bytes_of_postings))
         tf_list = self.postings_encoding.decode_tf(self.index_file.read(len_in_bytes_of_tf))
         return (curr_term, postings_list, tf_list)
 
@@ -157,16 +327,63 @@ class InvertedIndexReader(InvertedIndex):
         
         return (posting_list, tf_list)
 
+    def get_decoded_postings(self, term):
+        """
+        Sama seperti get_postings_list, namun mengembalikan postings list dan
+        tf list yang sudah di-decode (sebagai array). Hasil decode disimpan di
+        postings_cache sehingga term yang sama tidak perlu di-decode ulang.
+        """
+        key = (self.version, term)
+        cached = postings_cache.get(key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        posting_list, tf_list = self.get_postings_list(term)
+        read = time.perf_counter()
+        if self.is_bitmap(term):
+            posting_list = BitmapPostings.decode_array(posting_list)
+        else:
+            posting_list = array.array('I', self.postings_encoding.decode(posting_list))
+        tf_list = array.array('I', self.postings_encoding.decode_tf(tf_list))
+        record('postings_read', read - start)
+        record('decode', time.perf_counter() - read)
+        count('postings_bytes', self.postings_dict[term][2] + self.postings_dict[term][3])
+        postings_cache.put(key, posting_list, tf_list)
+        return posting_list, tf_list
+
+    def get_bitmap(self, term):
+        """
+        Postings list sebuah term sebagai RoaringBitmap, untuk operasi boolean
+        dan menghitung hasil. Postings list berbentuk bitmap langsung dibaca
+        tanpa di-decode per posting.
+        """
+        if self.is_bitmap(term):
+            posting_list, _ = self.get_postings_list(term)
+            return RoaringBitmap.from_bytes(posting_list)
+        return RoaringBitmap.from_sorted(self.get_decoded_postings(term)[0])
+
 
 class InvertedIndexWriter(InvertedIndex):
     """
     Class yang mengimplementasikan bagaimana caranya menulis secara
     efisien Inverted Index yang disimpan di sebuah file.
     """
+
+    # postings list dengan setidaknya BITMAP_MIN_POSTINGS posting dan kepadatan
+    # df / (docID terbesar + 1) >= BITMAP_DENSITY disimpan sebagai bitmap; pada
+    # kepadatan 1/8 bitmap sudah tidak lebih besar dari gap VBE (>= 8 bit per posting)
+    BITMAP_DENSITY = 1 / 8
+    BITMAP_MIN_POSTINGS = 64
+
     def __enter__(self):
         self.index_file = open(self.index_file_path, 'wb+')
         return self
 
+    def use_bitmap(self, postings_list):
+        return self.BITMAP_DENSITY is not None and len(postings_list) >= self.BITMAP_MIN_POSTINGS and \
+               len(postings_list) >= self.BITMAP_DENSITY * (postings_list[-1] + 1)
+
     def append(self, term, postings_list, tf_list):
         """
         Menambahkan (append) sebuah term, postings_list, dan juga TF list 
@@ -206,13 +423,16 @@ class InvertedIndexWriter(InvertedIndex):
         # TODO
         self.index_file.seek(0, 2)
         start_index = self.index_file.tell()
-        encoded_postings = self.postings_encoding.encode(postings_list)
+        bitmap = self.use_bitmap(postings_list)
+        encoded_postings = (BitmapPostings if bitmap else self.postings_encoding).encode(postings_list)
         encoded_tf = self.postings_encoding.encode_tf(tf_list)
 
         self.index_file.write(encoded_postings)
         self.index_file.write(encoded_tf)
         
         self.postings_dict[term] = (start_index, len(postings_list), len(encoded_postings), len(encoded_tf))
+        if bitmap:
+            self.postings_dict[term] += (BITMAP,)
         self.terms.append(term)
 
         for i in range(len(postings_list)):
@@ -0,0 +1,311 @@
+import os
+import sys
+import time
+import pickle
+import numpy as np
+
+from main.engine import compression
+from main.engine.benchmark import codecs
+from main.engine.index import BITMAP, InvertedIndexReader
+
+# nama komponen metadata di file .dict, sesuai urutan di pickle
+METADATA_STRUCTURES = ('postings_dict', 'terms', 'doc_length', 'avg_doc_length')
+
+# banyaknya error integritas yang dilaporkan satu per satu
+MAX_ERRORS = 100
+
+def deep_sizeof(obj):
+    """
+    Perkiraan memori sebuah objek python beserta semua objek yang
+    direferensikannya (dict, list, tuple, set, __dict__, dan __slots__).
+    Objek yang direferensikan berkali-kali (misal small int) dihitung sekali.
+    """
+    seen, stack, total = set(), [obj], 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(current.__dict__)
+            for name in getattr(type(current), '__slots__', ()):
+                if hasattr(current, name):
+                    stack.append(getattr(current, name))
+    return total
+
+def summarize(values):
+    """Ringkasan distribusi: count, min, max, mean, persentil, dan histogram log2"""
+    values = np.asarray(values, dtype = np.float64)
+    if values.size == 0:
+        return {"count": 0}
+    summary = {
+        "count": int(values.size),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+        "sum": float(values.sum()),
+    }
+    summary.update({f"p{p}": float(np.percentile(values, p)) for p in (50, 90, 99)})
+    # bucket ke-i berisi nilai di rentang [2^i, 2^(i+1))
+    exponents = np.floor(np.log2(np.maximum(values, 1))).astype(np.int64)
+    counts = np.bincount(exponents)
+    summary["histogram"] = [[2 ** i, 2 ** (i + 1) - 1, int(n)] for i, n in enumerate(counts) if n]
+    return summary
+
+class IndexInspector:
+    """
+    Membedah sebuah inverted index (file .index dan .dict) untuk melihat ke mana
+    bytes dan waktu decode dihabiskan: ukuran setiap struktur di file metadata
+    (pickle), memorinya setelah dimuat sebagai objek python, distribusi df dan
+    ukuran postings, rasio kompresi setiap codec dibandingkan StandardPostings,
+    throughput decode untuk term-term terberat, serta pemeriksaan integritas
+    setiap offset di postings_dict.
+
+    Attributes
+    ----------
+    bsbi_index(BSBIIndex): Index yang diinspeksi
+    index_name(str): Nama inverted index di output directory, default-nya
+        main index milik bsbi_index (misal "main_index_tier1" untuk tier satu)
+    """
+
+    def __init__(self, bsbi_index, index_name = None):
+        self.bsbi_index = bsbi_index
+        self.index_name = index_name or bsbi_index.index_name
+
+    def reader(self):
+        return InvertedIndexReader(self.index_name, self.bsbi_index.postings_encoding, \
+                                   directory = self.bsbi_index.output_dir)
+
+    def files(self):
+        """Ukuran file .index dan .dict (bytes)"""
+        sizes = {}
+        for suffix in ('.index', '.dict'):
+            path = os.path.join(self.bsbi_index.output_dir, self.index_name + suffix)
+            sizes[self.index_name + suffix] = os.path.getsize(path)
+        return sizes
+
+    def structures(self):
+        """
+        Untuk setiap struktur metadata: ukurannya jika di-pickle sendiri-sendiri
+        (perkiraan porsinya di file .dict), memori objek python-nya setelah
+        dimuat, dan rata-rata bytes per entry. Ditambah struktur lain yang dimuat
+        BSBIIndex (term_id_map, doc_id_map, dan snippet index).
+        """
+        with self.reader() as reader:
+            metadata = dict(zip(METADATA_STRUCTURES, \
+                                (reader.postings_dict, reader.terms, reader.doc_length, reader.avg_doc_length)))
+        loaded = {
+            "term_id_map": self.bsbi_index.term_id_map,
+            "doc_id_map": self.bsbi_index.doc_id_map,
+            "snippet_index": self.bsbi_index.snippet_index.offsets,
+        }
+        report = {}
+        for name, value in list(metadata.items()) + list(loaded.items()):
+            entries = len(value) if hasattr(value, '__len__') else 1
+            pickled = len(pickle.dumps(value))
+            memory = deep_sizeof(value)
+            report[name] = {
+                "entries": entries,
+                "pickled_bytes": pickled,
+                "memory_bytes": memory,
+                "memory_per_entry": memory / entries if entries else 0.0,
+                "expansion": memory / pickled if pickled else 0.0,
+                "in_dict_file": name in metadata,
+            }
+        return report
+
+    def distributions(self):
+        """Distribusi df, ukuran postings (bytes), ukuran tf list, dan bits per posting"""
+        with self.reader() as reader:
+            entries = list(reader.postings_dict.values())
+        df = [entry[1] for entry in entries]
+        return {
+            "df": summarize(df),
+            "postings_bytes": summarize([entry[2] for entry in entries]),
+            "tf_bytes": summarize([entry[3] for entry in entries]),
+            "bits_per_posting": summarize([8 * entry[2] / entry[1] for entry in entries if entry[1]]),
+        }
+
+    def bitmap_terms(self):
+        """Banyaknya postings list yang disimpan sebagai bitmap"""
+        with self.reader() as reader:
+            return sum(1 for term in reader.postings_dict if reader.is_bitmap(term))
+
+    def codec_ratios(self, max_postings = None):
+        """
+        Ukuran postings dan tf list jika di-encode dengan setiap codec di
+        compression.py, dan rasionya terhadap StandardPostings (semakin besar
+        semakin ringkas). Jika max_postings diberikan, hanya term dengan df
+        terbesar sampai total max_postings posting yang dihitung.
+        """
+        lists, total = [], 0
+        with self.reader() as reader:
+            terms = sorted(reader.postings_dict, key = lambda term: -reader.postings_dict[term][1])
+            for term in terms:
+                if max_postings is not None and total >= max_postings:
+                    break
+                postings, tfs = reader.get_postings_list(term)
+                postings = reader.postings_codec(term).decode(postings)
+                lists.append((postings, reader.postings_encoding.decode_tf(tfs)))
+                total += len(postings)
+
+        report = {"lists": len(lists), "postings": total, "codecs": {}}
+        for codec in codecs():
+            postings_bytes = sum(len(codec.encode(postings)) for postings, _ in lists)
+            tf_bytes = sum(len(codec.encode_tf(tfs)) for _, tfs in lists)
+            report["codecs"][codec.__name__] = {
+                "postings_bytes": postings_bytes,
+                "tf_bytes": tf_bytes,
+                "bits_per_posting": 8 * postings_bytes / total if total else 0.0,
+            }
+        standard = report["codecs"].get(compression.StandardPostings.__name__)
+        for result in report["codecs"].values():
+            size = result["postings_bytes"] + result["tf_bytes"]
+            result["ratio"] = (standard["postings_bytes"] + standard["tf_bytes"]) / size if standard and size else None
+        return report
+
+    def decode_throughput(self, top = 20, repeat = 5):
+        """
+        Waktu decode (terbaik dari repeat kali) postings dan tf list dari top
+        term dengan postings terbesar (bytes), tanpa postings_cache dan tanpa
+        waktu baca file.
+        """
+        results = []
+        with self.reader() as reader:
+            heaviest = sorted(reader.postings_dict.items(), key = lambda item: -(item[1][2] + item[1][3]))[:top]
+            for term, (_, df, postings_bytes, tf_bytes, *_) in heaviest:
+                postings, tfs = reader.get_postings_list(term)
+                codec = reader.postings_codec(term)
+                best = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    codec.decode(postings)
+                    reader.postings_encoding.decode_tf(tfs)
+                    best = min(best, time.perf_counter() - start)
+                results.append({
+                    "term_id": term,
+                    "term": self.term_string(term),
+                    "codec": codec.__name__,
+                    "df": df,
+                    "bytes": postings_bytes + tf_bytes,
+                    "decode_seconds": best,
+                    "postings_per_second": df / best if best else 0.0,
+                    "megabytes_per_second": (postings_bytes + tf_bytes) / best / 1e6 if best else 0.0,
+                })
+        return results
+
+    def term_string(self, term):
+        term_id_map = self.bsbi_index.term_id_map
+        return term_id_map[term] if 0 <= term < len(term_id_map) else None
+
+    def check(self):
+        """
+        Memeriksa integritas index: setiap entry postings_dict menunjuk ke
+        rentang bytes yang valid dan tidak saling tumpang tindih di file
+        .index; postings dapat di-decode, panjangnya sama dengan df, terurut
+        naik, dan hanya berisi docID yang ada di doc_length; tf list sepanjang
+        df dan bernilai positif; terms sama dengan key postings_dict; serta
+        avg_doc_length sesuai dengan doc_length.
+
+        Returns
+        -------
+        dict
+            {"ok", "terms_checked", "errors" (maksimal MAX_ERRORS),
+             "error_count", "unreferenced_bytes"}
+        """
+        errors = []
+
+        def error(message):
+            errors.append(message)
+
+        with self.reader() as reader:
+            encoding = reader.postings_encoding
+            file_size = os.fstat(reader.index_file.fileno()).st_size
+            num_terms = len(self.bsbi_index.term_id_map)
+            num_docs = len(self.bsbi_index.doc_id_map)
+
+            if len(reader.terms) != len(set(reader.terms)):
+                error("terms contains duplicate term IDs")
+            if set(reader.terms) != set(reader.postings_dict):
+                error(f"terms and postings_dict differ in {len(set(reader.terms) ^ set(reader.postings_dict))} term IDs")
+            for doc_id in reader.doc_length:
+                if not 0 <= doc_id < num_docs:
+                    error(f"doc_length has doc ID {doc_id} outside doc_id_map")
+            if reader.doc_length:
+                mean = sum(reader.doc_length.values()) / len(reader.doc_length)
+                if abs(mean - reader.avg_doc_length) > 1e-6 * max(1.0, mean):
+                    error(f"avg_doc_length {reader.avg_doc_length} differs from the mean document length {mean}")
+
+            ranges = []
+            for term, entry in reader.postings_dict.items():
+                if not isinstance(entry, tuple) or len(entry) not in (4, 5) or \
+                   not all(isinstance(value, int) and value >= 0 for value in entry[:4]) or \
+                   (len(entry) == 5 and entry[4] != BITMAP):
+                    error(f"term {term}: malformed entry {entry!r}")
+                    continue
+                pos, df, postings_bytes, tf_bytes = entry[:4]
+                if not 0 <= term < num_terms:
+                    error(f"term {term}: term ID outside term_id_map")
+                end = pos + postings_bytes + tf_bytes
+                if end > file_size:
+                    error(f"term {term}: bytes {pos}-{end} beyond the end of the index file ({file_size})")
+                    continue
+                ranges.append((pos, end, term))
+
+                reader.index_file.seek(pos)
+                try:
+                    postings = reader.postings_codec(term).decode(reader.index_file.read(postings_bytes))
+                    tfs = encoding.decode_tf(reader.index_file.read(tf_bytes))
+                except Exception as e:
+                    error(f"term {term}: cannot decode postings ({type(e).__name__}: {e})")
+                    continue
+                if len(postings) != df:
+                    error(f"term {term}: df is {df} but the postings list has {len(postings)} entries")
+                if len(tfs) != len(postings):
+                    error(f"term {term}: {len(tfs)} term frequencies for {len(postings)} postings")
+                if any(a >= b for a, b in zip(postings, postings[1:])):
+                    error(f"term {term}: postings list is not strictly increasing")
+                missing = [doc_id for doc_id in postings if doc_id not in reader.doc_length]
+                if missing:
+                    error(f"term {term}: {len(missing)} doc IDs not in doc_length (e.g. {missing[0]})")
+                if any(tf <= 0 for tf in tfs):
+                    error(f"term {term}: non-positive term frequency")
+
+            ranges.sort()
+            referenced, previous_end, previous_term = 0, 0, None
+            for pos, end, term in ranges:
+                if pos < previous_end:
+                    error(f"term {term}: bytes {pos}-{end} overlap term {previous_term}")
+                referenced += end - max(pos, previous_end) if end > previous_end else 0
+                if end > previous_end:
+                    previous_end, previous_term = end, term
+
+        return {
+            "ok": not errors,
+            "terms_checked": len(ranges),
+            "error_count": len(errors),
+            "errors": errors[:MAX_ERRORS],
+            "unreferenced_bytes": file_size - referenced,
+        }
+
+    def report(self, top = 20, repeat = 5, max_postings = None, compare_codecs = True):
+        report = {
+            "index_name": self.index_name,
+            "postings_encoding": self.bsbi_index.postings_encoding.__name__,
+            "bitmap_terms": self.bitmap_terms(),
+            "files": self.files(),
+            "structures": self.structures(),
+            "distributions": self.distributions(),
+            "decode": self.decode_throughput(top, repeat),
+            "integrity": self.check(),
+        }
+        if compare_codecs:
+            report["codecs"] = self.codec_ratios(max_postings)
+        return report
@@ -0,0 +1,209 @@
+import time
+import math
+import bisect
+import threading
+import contextlib
+import contextvars
+import functools
+
+# batas atas bucket histogram latency (detik); lebih rapat di bawah 10 ms
+# karena sebagian besar tahap retrieval selesai di rentang tersebut
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class StageTimer:
+    """
+    Durasi kumulatif setiap tahap (stage) selama satu request, misal analyze,
+    dictionary, postings_read, decode, score, topk, document, snippet, dan
+    render. Tahap yang terjadi berkali-kali (misal decode untuk setiap term)
+    dijumlahkan. Selain durasi, dicatat juga counter pekerjaan yang dilakukan,
+    misal postings_bytes (bytes postings yang di-decode) dan docs_scored.
+
+    Attributes
+    ----------
+    stages: Dictionary mapping nama tahap -> [total detik, banyaknya kejadian]
+    counters: Dictionary mapping nama counter -> nilai
+    terms: Statistik term query pertama di request ini (lihat record_terms), atau None
+    start(float): Waktu mulai (time.perf_counter)
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.terms = None
+        self.start = time.perf_counter()
+        self.__lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.__lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def increment(self, name, value):
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total = None):
+        """Isi header Server-Timing (durasi dalam milidetik)"""
+        with self.__lock:
+            parts = [f"{name};dur={seconds * 1000:.3f}" for name, (seconds, _) in self.stages.items()]
+        parts.append(f"total;dur={(self.elapsed() if total is None else total) * 1000:.3f}")
+        return ", ".join(parts)
+
+# StageTimer dari request yang sedang berjalan. ContextVar (bukan thread-local)
+# agar juga berlaku untuk view async; lihat bind untuk run_in_executor.
+current_timer = contextvars.ContextVar('current_timer', default = None)
+
+@contextlib.contextmanager
+def collect():
+    """Context di mana semua record/stage dicatat ke sebuah StageTimer baru"""
+    timer = StageTimer()
+    token = current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        current_timer.reset(token)
+
+def record(name, seconds):
+    """
+    Mencatat durasi sebuah tahap ke StageTimer yang aktif. Dipakai di hot path
+    engine (cukup satu ContextVar.get jika tidak ada timer yang aktif).
+    """
+    timer = current_timer.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+def count(name, value = 1):
+    """Menambah counter name di StageTimer yang aktif"""
+    timer = current_timer.get()
+    if timer is not None:
+        timer.increment(name, value)
+
+def record_terms(function):
+    """
+    Mencatat statistik term query (hasil function(), misal df dan ukuran
+    postings) ke StageTimer yang aktif, sekali per request. function hanya
+    dipanggil jika ada timer aktif yang belum memiliki statistik term.
+    """
+    timer = current_timer.get()
+    if timer is not None and timer.terms is None:
+        timer.terms = function()
+
+@contextlib.contextmanager
+def stage(name):
+    """Mengukur durasi sebuah blok sebagai tahap name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def bind(function):
+    """
+    function yang dijalankan di dalam context saat ini, untuk
+    loop.run_in_executor (yang tidak membawa ContextVar ke thread pool).
+    """
+    return functools.partial(contextvars.copy_context().run, function)
+
+class Histogram:
+    """Histogram kumulatif dengan bucket tetap, seperti histogram Prometheus"""
+
+    def __init__(self, buckets = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.__lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(list of (batas atas, jumlah kumulatif), sum, count)"""
+        with self.__lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, buckets = 0, []
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            cumulative += n
+            buckets.append((bound, cumulative))
+        return buckets, total, count
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """
+    Histogram latency per process, ditampilkan dalam format teks Prometheus
+    (endpoint /metrics). Metric lain (gauge dan counter yang nilainya
+    dibaca saat scrape, misal statistik cache) diberikan ke render sebagai
+    samples.
+    """
+
+    def __init__(self):
+        self.histograms = {}    # nama -> (help, {tuple label: Histogram})
+        self.__lock = threading.Lock()
+
+    def observe(self, name, help, value, **labels):
+        key = tuple(labels.items())
+        with self.__lock:
+            _, series = self.histograms.setdefault(name, (help, {}))
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def observe_timer(self, timer, total, **labels):
+        """Mencatat total durasi dan durasi setiap tahap dari sebuah StageTimer"""
+        self.observe("medbib_request_duration_seconds", "Request latency", total, **labels)
+        for name, (seconds, _) in list(timer.stages.items()):
+            self.observe("medbib_stage_duration_seconds", "Time spent per request in each stage", \
+                         seconds, stage = name, **labels)
+
+    def render(self, samples = ()):
+        """
+        Teks Prometheus dari semua histogram dan samples, list of
+        (nama, tipe, help, labels, nilai).
+        """
+        lines = []
+        with self.__lock:
+            histograms = [(name, help, dict(series)) for name, (help, series) in sorted(self.histograms.items())]
+        for name, help, series in histograms:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(series.items()):
+                labels = dict(key)
+                buckets, total, count = histogram.snapshot()
+                for bound, cumulative in buckets:
+                    lines.append(f"{name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        described = set()
+        for name, kind, help, labels, value in sorted(samples, key = lambda sample: sample[0]):
+            if name not in described:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# satu registry untuk setiap process
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,78 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import Counter
+
+def normalize_query(query):
+    """Lowercase dan rapikan spasi, agar query yang sama dihitung sebagai satu"""
+    return re.sub(r"\s+", " ", query.lower()).strip()
+
+class QueryLog:
+    """
+    Log query yang masuk ke search engine, satu baris JSON per query
+    (append-only). Setiap baris minimal berisi waktu ("ts") dan query ("q"),
+    ditambah field lain dari pemanggil (misal index dan banyaknya hasil).
+
+    Log ini menjadi sumber frasa populer untuk autocomplete, dan dapat
+    di-replay untuk load test maupun warm-up cache.
+
+    Jika max_bytes diisi, file log yang melebihi max_bytes di-rotate menjadi
+    <path>.1 (menggantikan rotasi sebelumnya). Iterasi membaca <path>.1 lalu
+    path, sehingga yang dibaca selalu entry terbaru, paling banyak sekitar
+    2 * max_bytes.
+
+    Attributes
+    ----------
+    path(str): Path ke file log; None berarti logging dimatikan
+    max_bytes(int): Ukuran file log sebelum di-rotate, atau None (tanpa rotasi)
+    """
+
+    def __init__(self, path, max_bytes = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.__lock = threading.Lock()
+
+    @property
+    def rotated_path(self):
+        return self.path + '.1'
+
+    def append(self, query, **fields):
+        if not self.path:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "q": query, **fields}) + "\n"
+        with self.__lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                size = f.tell()
+            if self.max_bytes is not None and size > self.max_bytes:
+                os.replace(self.path, self.rotated_path)
+
+    def __iter__(self):
+        """Iterasi setiap entry (dict) di log, dari yang terlama; baris yang rusak dilewati"""
+        if not self.path:
+            return
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and isinstance(entry.get("q"), str):
+                        yield entry
+
+    def counts(self):
+        """Counter query (sudah dinormalisasi) -> berapa kali query tersebut muncul"""
+        counts = Counter()
+        for entry in self:
+            query = normalize_query(entry["q"])
+            if query:
+                counts[query] += 1
+        return counts
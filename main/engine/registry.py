@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+
+from main.engine import compression
+from main.engine.bsbi import BSBIIndex
+from main.engine.index import evict_metadata
+
+class IndexRegistry:
+    """
+    Registry untuk beberapa index (collection) yang dilayani oleh satu process,
+    menggantikan pola singleton pada BSBIIndex.
+
+    Index dibuka secara lazy saat pertama kali dibutuhkan. Semua index berbagi
+    analyzer (process_text) dan cache yang sama (postings_cache dan
+    metadata_cache di index.py, yang key-nya sudah memuat path index). Jika
+    total perkiraan memori index yang terbuka melebihi memory_budget, index
+    yang paling lama tidak dipakai (LRU) di-unload.
+
+    Index yang dibangun ulang di disk dibuka ulang oleh get(): setiap
+    reload_interval detik versi index (lihat version) diperiksa, dan index
+    dibuka ulang setelah versinya berubah lalu tidak berubah lagi selama
+    reload_interval (dan build_manifest.json, jika ada, menandai build selesai),
+    agar index yang sedang ditulis tidak ikut terbuka.
+
+    Attributes
+    ----------
+    configs: Dictionary mapping nama index -> dict berisi data_dir, output_dir,
+        postings_encoding (nama class di compression.py, atau class-nya langsung),
+        dan (opsional) index_name
+    default(str): Nama index yang dipakai jika query tidak menyebut index
+    memory_budget(int): Batas total perkiraan memori (bytes), None berarti tanpa batas
+    reload_interval(float): Interval pemeriksaan versi index (detik), None berarti
+        index tidak pernah dibuka ulang secara otomatis
+    """
+
+    # Perkiraan rasio ukuran objek python terhadap ukuran file pickle-nya
+    MEMORY_EXPANSION = 4
+
+    # File-file yang isinya mempengaruhi hasil search dan halaman dokumen, selain
+    # file main index dan tier satu (yang namanya bergantung pada index_name)
+    VERSION_FILES = ['terms.dict', 'docs.dict', 'snippets.dict', 'snippets.data', 'spell.dict', \
+                     'similar_docs.npy', 'lsi_docs.npy', 'lsi_terms.npy']
+
+    def __init__(self, configs, default = None, memory_budget = None, reload_interval = None):
+        if not configs:
+            raise ValueError("At least one index must be configured")
+        self.configs = configs
+        self.default = default or next(iter(configs))
+        if self.default not in configs:
+            raise KeyError(f"Unknown default index {self.default!r}")
+        self.memory_budget = memory_budget
+        self.reload_interval = reload_interval
+
+        self.__indexes = OrderedDict()     # nama -> (BSBIIndex, perkiraan memori)
+        self.__versions = {}    # nama -> [versi saat dibuka, versi terakhir, sejak kapan, waktu cek terakhir]
+        self.__opening = {}     # nama -> lock, agar sebuah index tidak dibuka dua kali bersamaan
+        self.__lock = threading.RLock()
+        self.load_listeners = []
+
+    def __contains__(self, name):
+        return name in self.configs
+
+    def names(self):
+        return list(self.configs)
+
+    def loaded(self):
+        """Nama-nama index yang sedang terbuka, dari yang paling lama tidak dipakai"""
+        with self.__lock:
+            return list(self.__indexes)
+
+    def get(self, name = None):
+        """
+        Mengembalikan BSBIIndex dengan nama name, membukanya jika belum terbuka
+        atau jika index sudah dibangun ulang di disk
+        """
+        name = name or self.default
+        if name not in self.configs:
+            raise KeyError(f"Unknown index {name!r}")
+        index = self.lookup(name)
+        if index is not None:
+            return index
+
+        # index dibuka di luar __lock, agar get() untuk index lain yang sudah
+        # terbuka tidak ikut menunggu
+        with self.__lock:
+            opening = self.__opening.setdefault(name, threading.Lock())
+        with opening:
+            index = self.lookup(name)
+            if index is not None:
+                return index
+            version = self.version(name)[0]
+            if name in self.loaded():
+                # index lama sudah dibangun ulang, metadata lamanya tidak terpakai lagi
+                evict_metadata(self.configs[name]['output_dir'])
+            index = self.open(self.configs[name])
+            memory = self.estimate_memory(index)
+            with self.__lock:
+                self.__indexes.pop(name, None)
+                self.__indexes[name] = (index, memory)
+                self.__versions[name] = [version, version, time.monotonic(), time.monotonic()]
+            self.enforce_budget(keep = name)
+
+        for listener in self.load_listeners:
+            listener(name, index)
+        return index
+
+    def lookup(self, name):
+        """BSBIIndex name yang sudah terbuka dan tidak perlu dibuka ulang, atau None"""
+        with self.__lock:
+            entry = self.__indexes.get(name)
+            if entry is None:
+                return None
+            self.__indexes.move_to_end(name)
+            if self.changed(name):
+                return None
+            return entry[0]
+
+    def changed(self, name):
+        """
+        True jika index name sudah dibangun ulang di disk sejak dibuka dan
+        versinya sudah stabil selama reload_interval. Versi hanya diperiksa
+        sekali setiap reload_interval.
+        """
+        if not self.reload_interval:
+            return False
+        state = self.__versions[name]
+        opened, seen, since, checked = state
+        now = time.monotonic()
+        if now - checked < self.reload_interval:
+            return seen != opened and now - since >= self.reload_interval and not self.building(name)
+        state[3] = now
+        current = self.version(name)[0]
+        if current != seen:
+            state[1], state[2] = current, now
+            return False
+        return current != opened and now - since >= self.reload_interval and not self.building(name)
+
+    def building(self, name):
+        """True jika build_manifest.json index name menandai build yang belum selesai"""
+        path = os.path.join(self.configs[name]['output_dir'], 'build_manifest.json')
+        try:
+            with open(path) as f:
+                return not json.load(f).get("done", True)
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def open(config):
+        postings_encoding = config.get('postings_encoding', compression.VBEPostings)
+        if isinstance(postings_encoding, str):
+            postings_encoding = getattr(compression, postings_encoding)
+        return BSBIIndex(data_dir = config['data_dir'], \
+                         output_dir = config['output_dir'], \
+                         postings_encoding = postings_encoding, \
+                         index_name = config.get('index_name', 'main_index'))
+
+    def version(self, name = None):
+        """
+        Versi index name di disk, dari mtime dan ukuran file-file index-nya,
+        tanpa membuka index. Dipakai sebagai validator cache HTTP (ETag dan
+        Last-Modified): versi berubah setiap kali index dibangun ulang.
+
+        Returns
+        -------
+        Tuple[str, float]
+            (tag versi, mtime terbaru dalam detik)
+        """
+        config = self.configs[name or self.default]
+        index_name = config.get('index_name', 'main_index')
+        filenames = self.VERSION_FILES + [index_name + suffix for suffix in \
+                        ('.index', '.dict', '.sketch', '_tier1.index', '_tier1.dict', '_tier1.bounds')]
+        parts, latest = [], 0.0
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(config['output_dir'], filename))
+            except FileNotFoundError:
+                continue
+            parts.append(f"{filename}:{stat.st_mtime_ns}:{stat.st_size}")
+            latest = max(latest, stat.st_mtime)
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16], latest
+
+    def estimate_memory(self, index):
+        """
+        Perkiraan memori sebuah index yang terbuka, dari ukuran file-file
+        metadata yang dimuat ke memori.
+        """
+        files = ['terms.dict', 'docs.dict', 'snippets.dict', index.index_name + '.dict']
+        size = 0
+        for filename in files:
+            path = os.path.join(index.output_dir, filename)
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return size * self.MEMORY_EXPANSION
+
+    def memory_usage(self):
+        with self.__lock:
+            return sum(memory for _, memory in self.__indexes.values())
+
+    def enforce_budget(self, keep = None):
+        """Unload index LRU sampai total perkiraan memori tidak melebihi budget"""
+        if self.memory_budget is None:
+            return
+        with self.__lock:
+            for name in list(self.__indexes):
+                if self.memory_usage() <= self.memory_budget:
+                    break
+                if name != keep:
+                    self.unload(name)
+
+    def unload(self, name):
+        """Menutup sebuah index dan membuang metadata-nya dari cache bersama"""
+        with self.__lock:
+            entry = self.__indexes.pop(name, None)
+        if entry is not None:
+            evict_metadata(entry[0].output_dir)
+
+    def reload(self, name):
+        """Membuka ulang sebuah index, misal setelah index dibangun ulang"""
+        self.unload(name)
+        return self.get(name)
+
+    def retrieve_bm25(self, query, names = None, k = 10, k1 = 1.6, b = 0.75):
+        """
+        Routing query ke satu index, atau fan-out ke beberapa index lalu
+        top-K dari semua index di-merge berdasarkan skor.
+
+        Returns
+        -------
+        List[(float, str, str)]
+            List of (score, nama index, nama dokumen), terurut mengecil
+            berdasarkan skor.
+        """
+        names = names or [self.default]
+        results = []
+        for name in names:
+            results.extend((score, name, doc) for score, doc in self.get(name).retrieve_bm25(query, k = k, k1 = k1, b = b))
+        if len(names) == 1:
+            return results
+        return heapq.nlargest(k, results, key=lambda item: item[0])
@@ -0,0 +1,143 @@
+import os
+import math
+import time
+import threading
+
+import numpy as np
+from scipy.sparse.linalg import svds
+
+from main.engine.index import InvertedIndexReader
+from main.engine.similar import SimilarDocuments
+
+class LsiReranker:
+    """
+    Reranker tahap kedua untuk top-K hasil BM25, dengan Latent Semantic
+    Indexing (LSI). Matrix tf-idf dokumen X (N x T) difaktorkan dengan
+    truncated SVD, X ~ U S V^T, lalu disimpan dua matrix float32:
+
+        - lsi_docs.npy: U S (N x r), setiap baris dinormalisasi (L2)
+        - lsi_terms.npy: idf(t) * V (T x r), proyeksi setiap term ke ruang LSI
+
+    Vektor query adalah jumlah baris lsi_terms dari term-term di query
+    (dihitung sekali per query), sehingga semua kandidat di-score dengan satu
+    perkalian matrix-vektor. Kedua file dibuka dengan mmap.
+
+    Skor akhir adalah interpolasi skor BM25 (dinormalisasi terhadap skor
+    tertinggi) dan cosine similarity LSI:
+
+        score = (1 - alpha) * bm25 / max(bm25) + alpha * cos(Q, D)
+
+    Attributes
+    ----------
+    output_dir(str): Path ke output index files
+    alpha(float): Bobot skor LSI
+    docs, terms(np.ndarray): Matrix hasil load (memmap)
+    reranked, skipped(int): Counter query yang di-rerank dan yang dilewati
+        (tidak ada term query yang dikenal, atau melebihi latency budget)
+    """
+
+    def __init__(self, output_dir, alpha = 0.3):
+        self.output_dir = output_dir
+        self.alpha = alpha
+        self.docs_path = os.path.join(output_dir, 'lsi_docs.npy')
+        self.terms_path = os.path.join(output_dir, 'lsi_terms.npy')
+        self.docs = None
+        self.terms = None
+        self.reranked = 0
+        self.skipped = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def exists(output_dir):
+        return os.path.exists(os.path.join(output_dir, 'lsi_docs.npy'))
+
+    def build(self, bsbi_index, num_topics = 100):
+        """Menghitung truncated SVD dari matrix tf-idf dokumen (offline)"""
+        vectors = SimilarDocuments.document_vectors(bsbi_index)
+        num_topics = min(num_topics, min(vectors.shape) - 1)
+        u, s, vt = svds(vectors.astype(np.float64), k=num_topics)
+        order = np.argsort(-s)
+        u, s, vt = u[:, order], s[order], vt[order]
+
+        docs = u * s
+        norms = np.linalg.norm(docs, axis=1)
+        norms[norms == 0] = 1
+        docs /= norms[:, None]
+
+        idf = np.zeros(vectors.shape[1])
+        with InvertedIndexReader(bsbi_index.index_name, bsbi_index.postings_encoding, directory=bsbi_index.output_dir) as reader:
+            N = len(reader.doc_length)
+            for term_id, entry in reader.postings_dict.items():
+                idf[term_id] = math.log(N / entry[1])
+
+        np.save(self.docs_path, docs.astype(np.float32))
+        np.save(self.terms_path, (vt.T * idf[:, None]).astype(np.float32))
+        return self.load()
+
+    def load(self):
+        self.docs = np.load(self.docs_path, mmap_mode='r')
+        self.terms = np.load(self.terms_path, mmap_mode='r')
+        return self
+
+    def query_vector(self, term_ids):
+        """
+        Vektor query di ruang LSI (dinormalisasi), dengan bobot (1 + log tf)
+        untuk term yang muncul beberapa kali. None jika tidak ada term query
+        yang dikenal.
+        """
+        counts = {}
+        for term_id in term_ids:
+            if term_id < self.terms.shape[0]:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        if not counts:
+            return None
+        rows = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        weights = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        vector = weights @ self.terms[rows]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def rerank(self, candidates, term_ids, budget = None):
+        """
+        Mengurutkan ulang kandidat.
+
+        Parameters
+        ----------
+        candidates: List[Tuple[float, int]]
+            List (skor BM25, docID) hasil retrieval tahap pertama
+        term_ids: List[int]
+            termID dari query
+        budget: float
+            Latency budget (detik) untuk tahap ini. Jika terlampaui, kandidat
+            dikembalikan dengan urutan aslinya.
+
+        Returns
+        -------
+        List[Tuple[float, int]]
+            List (skor gabungan, docID), terurut mengecil berdasarkan skor;
+            atau candidates apa adanya jika rerank dilewati
+        """
+        start = time.perf_counter()
+        if not candidates:
+            return candidates
+        query = self.query_vector(term_ids)
+        if query is None or (budget is not None and time.perf_counter() - start > budget):
+            return self.__count(candidates, skipped = True)
+
+        bm25 = np.fromiter((score for score, _ in candidates), dtype=np.float32, count=len(candidates))
+        doc_ids = np.fromiter((doc_id for _, doc_id in candidates), dtype=np.int64, count=len(candidates))
+        max_bm25 = bm25.max()
+        scores = (1 - self.alpha) * bm25 / (max_bm25 if max_bm25 > 0 else 1) + self.alpha * (self.docs[doc_ids] @ query)
+        if budget is not None and time.perf_counter() - start > budget:
+            return self.__count(candidates, skipped = True)
+
+        order = np.lexsort((doc_ids, -scores))
+        return self.__count([(float(scores[i]), int(doc_ids[i])) for i in order])
+
+    def __count(self, result, skipped = False):
+        with self.__lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.reranked += 1
+        return result
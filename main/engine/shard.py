@@ -0,0 +1,157 @@
+import os
+import math
+import heapq
+import contextlib
+import dill as pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from main.engine.index import InvertedIndexReader, InvertedIndexWriter
+
+def shard_name(index_name, shard_id):
+    return f'{index_name}_shard_{shard_id}'
+
+def stats_path(output_dir, index_name):
+    return os.path.join(output_dir, f'{index_name}_shards.dict')
+
+def load_shard_stats(output_dir, index_name):
+    """Statistik global (num_shards, N, df, avg_doc_length) hasil ShardedIndex.build"""
+    with open(stats_path(output_dir, index_name), 'rb') as f:
+        return pickle.load(f)
+
+def score_shard(output_dir, index_name, postings_encoding, term_weights, k, k1, b, avg_doc_length):
+    """
+    Menghitung top-K BM25 di satu shard. Dijalankan di worker process.
+
+    Skor dihitung dengan statistik global (idf dari N dan df global, serta
+    avg_doc_length global) sehingga hasilnya sama persis dengan index yang
+    tidak di-shard. doc_length tetap lokal karena sebuah dokumen hanya ada
+    di satu shard.
+
+    Parameters
+    ----------
+    term_weights: List[Tuple[int, float]]
+        List (termID, w(t, Q)) dari query, sesuai urutan term di query
+
+    Returns
+    -------
+    List[Tuple[float, int]]
+        Top-K (score, docID) di shard tersebut
+    """
+    scores = {}
+    with InvertedIndexReader(index_name, postings_encoding, directory=output_dir) as reader:
+        for term_id, wtq in term_weights:
+            if term_id not in reader.postings_dict:
+                continue
+            postings_list, tf_list = reader.get_decoded_postings(term_id)
+            for doc_id, tf in zip(postings_list, tf_list):
+                doc_weight = ((k1 + 1) * tf) / (k1 * (1 - b + b * reader.doc_length[doc_id] / avg_doc_length) + tf)
+                scores[doc_id] = scores.get(doc_id, 0) + doc_weight * wtq
+
+    return [(score, doc_id) for doc_id, score in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))]
+
+
+class ShardedIndex:
+    """
+    Index yang dipartisi berdasarkan dokumen (doc-partitioned) menjadi
+    num_shards shard. Setiap shard adalah inverted index biasa dengan postings
+    dan doc_length lokal, sedangkan statistik koleksi (N, df, avg_doc_length)
+    disimpan secara global agar skor BM25 sama persis dengan index utuh.
+
+    Query dikerjakan dengan scatter-gather: setiap shard di-score secara paralel
+    di process pool, lalu top-K dari setiap shard di-merge.
+
+    Attributes
+    ----------
+    bsbi_index(BSBIIndex): Index utuh; term_id_map dan doc_id_map dipakai bersama
+    num_shards(int): Banyaknya shard
+    workers(int): Ukuran process pool (default: min(num_shards, cpu_count))
+    N(int): Banyaknya dokumen di koleksi
+    df: Dictionary mapping termID -> document frequency global
+    avg_doc_length(float): Rata-rata panjang dokumen di seluruh koleksi
+    """
+
+    def __init__(self, bsbi_index, num_shards, workers = None):
+        self.bsbi_index = bsbi_index
+        self.num_shards = num_shards
+        self.workers = workers or min(num_shards, os.cpu_count() or 1)
+        self.output_dir = bsbi_index.output_dir
+        self.index_name = bsbi_index.index_name
+        self.postings_encoding = bsbi_index.postings_encoding
+        self.stats_path = stats_path(self.output_dir, self.index_name)
+
+        self.N = 0
+        self.df = {}
+        self.avg_doc_length = 0
+        self.executor = None
+
+    def shard_of(self, doc_id):
+        """Partisi round-robin agar ukuran shard seimbang"""
+        return doc_id % self.num_shards
+
+    def build(self):
+        """
+        Membagi main index menjadi num_shards shard. Postings dibaca secara
+        sequential dari main index, dan setiap postings list dipecah sesuai
+        shard dari masing-masing docID (docID tetap global).
+        """
+        with InvertedIndexReader(self.index_name, self.postings_encoding, directory=self.output_dir) as main_index:
+            self.N = len(main_index.doc_length)
+            self.avg_doc_length = main_index.avg_doc_length
+            self.df = {term_id: entry[1] for term_id, entry in main_index.postings_dict.items()}
+
+            with contextlib.ExitStack() as stack:
+                shards = [stack.enter_context(InvertedIndexWriter(shard_name(self.index_name, i), \
+                                                                  self.postings_encoding, directory=self.output_dir))
+                          for i in range(self.num_shards)]
+                for term_id, postings_list, tf_list in main_index:
+                    parts = [([], []) for _ in range(self.num_shards)]
+                    for doc_id, tf in zip(postings_list, tf_list):
+                        part = parts[self.shard_of(doc_id)]
+                        part[0].append(doc_id)
+                        part[1].append(tf)
+                    for shard, (shard_postings, shard_tfs) in zip(shards, parts):
+                        if shard_postings:
+                            shard.append(term_id, shard_postings, shard_tfs)
+                for shard in shards:
+                    if shard.doc_length:
+                        shard.count_avg_doc_length()
+
+        with open(self.stats_path, 'wb') as f:
+            pickle.dump({'num_shards': self.num_shards, 'N': self.N, 'df': self.df, \
+                         'avg_doc_length': self.avg_doc_length}, f)
+
+    def load(self):
+        """Memuat statistik global yang disimpan saat build"""
+        stats = load_shard_stats(self.output_dir, self.index_name)
+        if stats['num_shards'] != self.num_shards:
+            raise ValueError(f"Index has {stats['num_shards']} shards, not {self.num_shards}")
+        self.N, self.df, self.avg_doc_length = stats['N'], stats['df'], stats['avg_doc_length']
+        return self
+
+    def df_weight(self, term_id):
+        """w(t, Q) BM25 dari sebuah term, dihitung dari N dan df global"""
+        return math.log10(self.N / self.df[term_id])
+
+    def retrieve_bm25(self, query, k = 10, k1 = 1.6, b = 0.75):
+        """
+        Sama seperti BSBIIndex.retrieve_bm25, namun setiap shard di-score
+        secara paralel lalu top-K dari semua shard di-merge.
+        """
+        term_weights = [(term_id, self.df_weight(term_id)) \
+                        for term_id in self.bsbi_index._query_term_ids(query) if term_id in self.df]
+        if not term_weights:
+            return []
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers = self.workers)
+        futures = [self.executor.submit(score_shard, self.output_dir, shard_name(self.index_name, i), \
+                                        self.postings_encoding, term_weights, k, k1, b, self.avg_doc_length)
+                   for i in range(self.num_shards)]
+        merged = heapq.nlargest(k, (item for future in futures for item in future.result()), \
+                                key=lambda item: (item[0], -item[1]))
+        return [(score, self.bsbi_index.doc_id_map[doc_id]) for score, doc_id in merged]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
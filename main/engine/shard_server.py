@@ -0,0 +1,400 @@
+import os
+import sys
+import time
+import struct
+import socket
+import argparse
+import threading
+import socketserver
+import dill as pickle
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from main.engine.compression import VBEPostings
+from main.engine.shard import shard_name, score_shard, load_shard_stats
+from main.engine.snippet import SnippetIndex
+
+# Protocol biner antara aggregator dan shard server. Setiap frame diawali
+# panjang payload (4 bytes, unsigned, big-endian).
+#
+# Request payload:
+#     request_id (u32), op (u8), k (u16), k1 (f64), b (f64), n_terms (u16),
+#     lalu n_terms kali (termID (u32), w(t, Q) (f64))
+#
+# Response payload:
+#     request_id (u32), status (u8), count (u32),
+#     lalu count kali (score (f64), docID (u32))
+#
+# Request OP_DOCS (judul dan snippet dokumen hasil search):
+#     request_id (u32), op (u8), n_docs (u32), lalu n_docs kali docID (u32),
+#     lalu term query (stem) dipisahkan spasi, UTF-8
+#
+# Response OP_DOCS:
+#     request_id (u32), status (u8), count (u32), lalu count kali
+#     (docID (u32), panjang judul (u32), panjang snippet (u32), judul, snippet)
+
+FRAME_HEADER = struct.Struct('!I')
+REQUEST_PREFIX = struct.Struct('!IB')
+REQUEST_HEADER = struct.Struct('!IBHddH')
+REQUEST_TERM = struct.Struct('!Id')
+RESPONSE_HEADER = struct.Struct('!IBI')
+RESPONSE_HIT = struct.Struct('!dI')
+DOCS_HEADER = struct.Struct('!IBI')
+DOC_ID = struct.Struct('!I')
+DOC_HEADER = struct.Struct('!III')
+
+OP_PING = 0
+OP_BM25 = 1
+OP_DOCS = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+def encode_request(request_id, op, k, k1, b, term_weights):
+    payload = [REQUEST_HEADER.pack(request_id, op, k, k1, b, len(term_weights))]
+    payload.extend(REQUEST_TERM.pack(term_id, wtq) for term_id, wtq in term_weights)
+    return b"".join(payload)
+
+def decode_request(payload):
+    request_id, op, k, k1, b, n_terms = REQUEST_HEADER.unpack_from(payload)
+    term_weights = list(REQUEST_TERM.iter_unpack(payload[REQUEST_HEADER.size:REQUEST_HEADER.size + n_terms * REQUEST_TERM.size]))
+    return request_id, op, k, k1, b, term_weights
+
+def encode_response(request_id, status, hits):
+    payload = [RESPONSE_HEADER.pack(request_id, status, len(hits))]
+    payload.extend(RESPONSE_HIT.pack(score, doc_id) for score, doc_id in hits)
+    return b"".join(payload)
+
+def decode_response(payload):
+    request_id, status, count = RESPONSE_HEADER.unpack_from(payload)
+    hits = list(RESPONSE_HIT.iter_unpack(payload[RESPONSE_HEADER.size:RESPONSE_HEADER.size + count * RESPONSE_HIT.size]))
+    return request_id, status, hits
+
+def encode_docs_request(request_id, doc_ids, query_terms):
+    payload = [DOCS_HEADER.pack(request_id, OP_DOCS, len(doc_ids))]
+    payload.extend(DOC_ID.pack(doc_id) for doc_id in doc_ids)
+    payload.append(" ".join(query_terms).encode())
+    return b"".join(payload)
+
+def decode_docs_request(payload):
+    request_id, _, n_docs = DOCS_HEADER.unpack_from(payload)
+    end = DOCS_HEADER.size + n_docs * DOC_ID.size
+    doc_ids = [doc_id for doc_id, in DOC_ID.iter_unpack(payload[DOCS_HEADER.size:end])]
+    return request_id, doc_ids, payload[end:].decode().split()
+
+def encode_docs_response(request_id, status, documents):
+    """documents: list of (docID, judul, snippet)"""
+    payload = [RESPONSE_HEADER.pack(request_id, status, len(documents))]
+    for doc_id, title, snippet in documents:
+        title, snippet = title.encode(), snippet.encode()
+        payload.append(DOC_HEADER.pack(doc_id, len(title), len(snippet)) + title + snippet)
+    return b"".join(payload)
+
+def decode_docs_response(payload):
+    request_id, status, count = RESPONSE_HEADER.unpack_from(payload)
+    documents, pos = [], RESPONSE_HEADER.size
+    for _ in range(count):
+        doc_id, title_length, snippet_length = DOC_HEADER.unpack_from(payload, pos)
+        pos += DOC_HEADER.size
+        title = payload[pos:pos + title_length].decode()
+        pos += title_length
+        documents.append((doc_id, title, payload[pos:pos + snippet_length].decode()))
+        pos += snippet_length
+    return request_id, status, documents
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+def recv_frame(sock):
+    """Membaca satu frame; mengembalikan None jika koneksi ditutup"""
+    header = recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    return recv_exact(sock, FRAME_HEADER.unpack(header)[0])
+
+def recv_exact(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def parse_address(address):
+    """
+    "host:port" untuk TCP, atau "unix:/path/ke/socket" untuk Unix socket.
+    """
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[5:]
+    host, port = address.rsplit(':', 1)
+    return socket.AF_INET, (host, int(port))
+
+
+class ShardRequestHandler(socketserver.BaseRequestHandler):
+    """Melayani request dari satu koneksi (persistent) sampai koneksi ditutup"""
+
+    def handle(self):
+        server = self.server
+        while True:
+            payload = recv_frame(self.request)
+            if payload is None:
+                return
+            request_id, op = REQUEST_PREFIX.unpack_from(payload)
+            if op == OP_DOCS:
+                try:
+                    _, doc_ids, query_terms = decode_docs_request(payload)
+                    response = encode_docs_response(request_id, STATUS_OK, server.documents(doc_ids, query_terms))
+                except Exception:
+                    response = encode_docs_response(request_id, STATUS_ERROR, [])
+                send_frame(self.request, response)
+                continue
+
+            request_id, op, k, k1, b, term_weights = decode_request(payload)
+            try:
+                hits = []
+                if op == OP_BM25:
+                    hits = score_shard(server.output_dir, server.shard_index_name, server.postings_encoding, \
+                                       term_weights, k, k1, b, server.avg_doc_length)
+                response = encode_response(request_id, STATUS_OK, hits)
+            except Exception:
+                response = encode_response(request_id, STATUS_ERROR, [])
+            send_frame(self.request, response)
+
+
+class ShardServerMixin:
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def setup_shard(self, output_dir, index_name, shard_id, postings_encoding):
+        self.output_dir = output_dir
+        self.shard_index_name = shard_name(index_name, shard_id)
+        self.postings_encoding = postings_encoding
+
+        # avg_doc_length global diambil dari hasil ShardedIndex.build
+        self.avg_doc_length = load_shard_stats(output_dir, index_name)['avg_doc_length']
+
+        # judul dan snippet dokumen dilayani dari snippet index (on-disk), sehingga
+        # web tier tidak perlu membuka snippet index sendiri
+        self.snippet_index = SnippetIndex(os.path.join(output_dir, 'snippets.dict'))
+        self.snippet_index.load()
+        with open(os.path.join(output_dir, 'docs.dict'), 'rb') as f:
+            self.doc_id_map = pickle.load(f)
+
+    def documents(self, doc_ids, query_terms):
+        """(docID, judul, snippet HTML) untuk setiap docID"""
+        result = []
+        for doc_id in doc_ids:
+            document = self.snippet_index.get(doc_id, self.doc_id_map[doc_id])
+            result.append((doc_id, document.title, document.snippet(query_terms)))
+        return result
+
+
+class TCPShardServer(ShardServerMixin, socketserver.ThreadingTCPServer):
+    pass
+
+
+class UnixShardServer(ShardServerMixin, socketserver.ThreadingUnixStreamServer):
+    pass
+
+
+def make_server(address, output_dir, index_name, shard_id, postings_encoding = VBEPostings):
+    family, bind = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind):
+            os.remove(bind)
+        server = UnixShardServer(bind, ShardRequestHandler)
+    else:
+        server = TCPShardServer(bind, ShardRequestHandler)
+    server.setup_shard(output_dir, index_name, shard_id, postings_encoding)
+    return server
+
+
+class ShardConnectionPool:
+    """Pool koneksi idle ke satu alamat shard server"""
+
+    def __init__(self, address):
+        self.address = address
+        self.family, self.target = parse_address(address)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout):
+        with self.lock:
+            if self.idle:
+                sock = self.idle.pop()
+                sock.settimeout(timeout)
+                return sock
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(self.target)
+        return sock
+
+    def release(self, sock):
+        with self.lock:
+            self.idle.append(sock)
+
+
+class ShardAggregator:
+    """
+    Fan-out query ke semua shard server, lalu merge top-K dari setiap shard.
+
+    Setiap shard boleh punya beberapa replica. Request dikirim ke replica
+    pertama; jika belum ada jawaban setelah hedge_delay detik (atau replica
+    tersebut gagal), request yang sama dikirim juga ke replica berikutnya dan
+    jawaban yang pertama datang yang dipakai. Shard yang tidak menjawab dalam
+    timeout detik dilewati, dan hasilnya ditandai sebagai partial.
+
+    Attributes
+    ----------
+    sharded_index(ShardedIndex): Untuk term_id_map, doc_id_map, dan statistik global
+    shards: List[List[str]]
+        Untuk setiap shard (sesuai urutan shard id), list alamat replica-nya
+    last_missing: List[int]
+        Shard id yang tidak menjawab pada query terakhir di thread ini
+    """
+
+    def __init__(self, sharded_index, shards, timeout = 1.0, hedge_delay = 0.05):
+        if len(shards) != sharded_index.num_shards:
+            raise ValueError(f"{len(shards)} shard addresses configured for {sharded_index.num_shards} shards")
+        self.sharded_index = sharded_index
+        self.shards = shards
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.pools = {address: ShardConnectionPool(address) for replicas in shards for address in replicas}
+        # fan-out per shard dan pemanggilan ke replica memakai pool terpisah,
+        # agar task fan-out yang sedang menunggu tidak menghabiskan worker
+        self.fanout_executor = ThreadPoolExecutor(max_workers = 4 * len(shards))
+        self.call_executor = ThreadPoolExecutor(max_workers = 4 * sum(len(replicas) for replicas in shards))
+        self.request_ids = iter(range(1, 2 ** 32))
+        self.request_ids_lock = threading.Lock()
+        self.local = threading.local()
+
+    @property
+    def last_missing(self):
+        return getattr(self.local, 'missing', [])
+
+    def call(self, address, payload, request_id, decode = decode_response):
+        pool = self.pools[address]
+        sock = pool.acquire(self.timeout)
+        try:
+            send_frame(sock, payload)
+            response = recv_frame(sock)
+        except OSError:
+            sock.close()
+            raise
+        if response is None:
+            sock.close()
+            raise ConnectionError(f"{address} closed the connection")
+        response_id, status, hits = decode(response)
+        if response_id != request_id or status != STATUS_OK:
+            sock.close()
+            raise ConnectionError(f"{address} returned an invalid response")
+        pool.release(sock)
+        return hits
+
+    def query_shard(self, replicas, payload, request_id, deadline, decode = decode_response):
+        """Hedged request ke replica-replica dari satu shard"""
+        pending = set()
+        remaining = list(replicas)
+        while remaining or pending:
+            if remaining:
+                pending.add(self.call_executor.submit(self.call, remaining.pop(0), payload, request_id, decode))
+            wait_time = deadline - time.monotonic()
+            if wait_time <= 0:
+                break
+            if remaining:
+                wait_time = min(wait_time, self.hedge_delay)
+            done, pending = wait(pending, timeout = wait_time, return_when = FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+            if not done and not remaining and time.monotonic() >= deadline:
+                break
+        return None
+
+    def retrieve_bm25(self, query, k = 10, k1 = 1.6, b = 0.75):
+        """
+        Sama seperti BSBIIndex.retrieve_bm25. Shard id yang tidak menjawab
+        dapat dilihat di last_missing.
+        """
+        index = self.sharded_index
+        term_weights = [(term_id, index.df_weight(term_id)) \
+                        for term_id in index.bsbi_index._query_term_ids(query) if term_id in index.df]
+        self.local.missing = []
+        if not term_weights:
+            return []
+
+        with self.request_ids_lock:
+            request_id = next(self.request_ids)
+        payload = encode_request(request_id, OP_BM25, k, k1, b, term_weights)
+        deadline = time.monotonic() + self.timeout
+        futures = [self.fanout_executor.submit(self.query_shard, replicas, payload, request_id, deadline) \
+                   for replicas in self.shards]
+
+        hits = []
+        for shard_id, future in enumerate(futures):
+            shard_hits = future.result()
+            if shard_hits is None:
+                self.local.missing.append(shard_id)
+            else:
+                hits.extend(shard_hits)
+        merged = sorted(hits, key=lambda item: (-item[0], item[1]))[:k]
+        return [(score, index.bsbi_index.doc_id_map[doc_id]) for score, doc_id in merged]
+
+    def documents(self, doc_ids, query_terms):
+        """
+        Judul dan snippet (HTML) dokumen-dokumen hasil search, masing-masing
+        dari shard yang memuat dokumen tersebut. Shard yang tidak menjawab
+        ditambahkan ke last_missing dan dokumennya tidak ada di hasil.
+
+        Returns
+        -------
+        Dict[int, Tuple[str, str]]
+            Mapping docID -> (judul, snippet)
+        """
+        by_shard = {}
+        for doc_id in doc_ids:
+            by_shard.setdefault(self.sharded_index.shard_of(doc_id), []).append(doc_id)
+        deadline = time.monotonic() + self.timeout
+        futures = {}
+        for shard_id, shard_doc_ids in by_shard.items():
+            with self.request_ids_lock:
+                request_id = next(self.request_ids)
+            payload = encode_docs_request(request_id, shard_doc_ids, query_terms)
+            futures[shard_id] = self.fanout_executor.submit(self.query_shard, self.shards[shard_id], payload, \
+                                                            request_id, deadline, decode_docs_response)
+
+        documents = {}
+        for shard_id, future in futures.items():
+            shard_documents = future.result()
+            if shard_documents is None:
+                if shard_id not in self.last_missing:
+                    self.local.missing = self.last_missing + [shard_id]
+            else:
+                documents.update((doc_id, (title, snippet)) for doc_id, title, snippet in shard_documents)
+        return documents
+
+    def close(self):
+        self.fanout_executor.shutdown(wait = False)
+        self.call_executor.shutdown(wait = False)
+        for pool in self.pools.values():
+            for sock in pool.idle:
+                sock.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Serve one shard of a ShardedIndex over TCP or a Unix socket")
+    parser.add_argument('--bind', required = True, help = "host:port or unix:/path/to/socket")
+    parser.add_argument('--shard-id', type = int, required = True)
+    parser.add_argument('--output-dir', default = os.path.join("main/engine", "index"))
+    parser.add_argument('--index-name', default = "main_index")
+    args = parser.parse_args()
+
+    server = make_server(args.bind, args.output_dir, args.index_name, args.shard_id)
+    print(f"Serving shard {args.shard_id} on {args.bind}", file = sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,122 @@
+import os
+import math
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+from main.engine.index import InvertedIndexReader
+
+class SimilarDocuments:
+    """
+    Daftar dokumen yang mirip (nearest neighbours) untuk setiap dokumen,
+    dihitung offline dengan cosine similarity antar vektor tf-idf dokumen.
+
+    Hasilnya disimpan di dua file .npy di output directory:
+        - similar_docs.npy: matrix int32 N x k berisi docID tetangga (-1 jika
+          tetangganya kurang dari k)
+        - similar_scores.npy: matrix float32 N x k berisi skor cosine-nya
+    Kedua file dibuka dengan mmap, sehingga lookup untuk sebuah dokumen hanya
+    membaca satu baris dan tidak perlu memuat seluruh matrix ke memori.
+
+    Attributes
+    ----------
+    output_dir(str): Path ke output index files
+    k(int): Banyaknya tetangga per dokumen
+    neighbours_matrix, scores_matrix(np.ndarray): Matrix hasil load (memmap)
+    """
+
+    def __init__(self, output_dir, k = 10):
+        self.output_dir = output_dir
+        self.k = k
+        self.docs_path = os.path.join(output_dir, 'similar_docs.npy')
+        self.scores_path = os.path.join(output_dir, 'similar_scores.npy')
+        self.neighbours_matrix = None
+        self.scores_matrix = None
+
+    @staticmethod
+    def exists(output_dir):
+        return os.path.exists(os.path.join(output_dir, 'similar_docs.npy'))
+
+    @staticmethod
+    def document_vectors(bsbi_index):
+        """
+        Matrix sparse (CSR) N x T berisi vektor tf-idf setiap dokumen,
+        w(t, D) = (1 + log tf) * log(N / df), yang sudah dinormalisasi (L2)
+        sehingga dot product antar baris adalah cosine similarity. Kolom ke-t
+        adalah term dengan termID t.
+        """
+        rows, cols, data = array('I'), array('I'), array('f')
+        with InvertedIndexReader(bsbi_index.index_name, bsbi_index.postings_encoding, directory=bsbi_index.output_dir) as reader:
+            N, T = len(reader.doc_length), max(reader.postings_dict, default=-1) + 1
+            for term_id, postings_list, tf_list in reader:
+                idf = math.log(N / len(postings_list))
+                rows.extend(postings_list)
+                cols.extend([term_id] * len(postings_list))
+                data.extend((1 + math.log(tf)) * idf for tf in tf_list)
+
+        matrix = sparse.csr_matrix((np.frombuffer(data, dtype=np.float32), \
+                                    (np.frombuffer(rows, dtype=np.uint32), np.frombuffer(cols, dtype=np.uint32))), \
+                                   shape=(N, T), dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(matrix).tocsr().astype(np.float32)
+
+    def build(self, bsbi_index, memory_budget = 64 * 1024 * 1024):
+        """
+        Menghitung top-k tetangga setiap dokumen. Similarity dihitung per blok
+        baris (X[blok] . X^T) sehingga matrix similarity dense yang ada di
+        memori paling besar sekitar memory_budget bytes, berapapun ukuran
+        koleksinya. Hasil ditulis langsung ke file .npy (via memmap).
+        """
+        vectors = self.document_vectors(bsbi_index)
+        N = vectors.shape[0]
+        k = min(self.k, max(N - 1, 0))
+        block_size = max(1, memory_budget // (4 * max(N, 1)))
+        transposed = vectors.T.tocsc()
+
+        neighbours_matrix = np.lib.format.open_memmap(self.docs_path, mode='w+', dtype=np.int32, shape=(N, self.k))
+        scores_matrix = np.lib.format.open_memmap(self.scores_path, mode='w+', dtype=np.float32, shape=(N, self.k))
+        neighbours_matrix[:] = -1
+        scores_matrix[:] = 0
+
+        for start in range(0, N, block_size):
+            end = min(start + block_size, N)
+            similarity = (vectors[start:end] @ transposed).toarray()
+            # dokumen tidak boleh menjadi tetangga dirinya sendiri
+            similarity[np.arange(end - start), np.arange(start, end)] = 0
+            if k == 0:
+                continue
+            top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(similarity, top, axis=1)
+            # urutkan mengecil berdasarkan skor, lalu docID yang lebih kecil
+            order = np.lexsort((top, -top_scores), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            top[top_scores <= 0] = -1
+            top_scores[top_scores <= 0] = 0
+            neighbours_matrix[start:end, :k] = top
+            scores_matrix[start:end, :k] = top_scores
+
+        neighbours_matrix.flush()
+        scores_matrix.flush()
+        del neighbours_matrix, scores_matrix
+        return self.load()
+
+    def load(self):
+        self.neighbours_matrix = np.load(self.docs_path, mmap_mode='r')
+        self.scores_matrix = np.load(self.scores_path, mmap_mode='r')
+        self.k = self.neighbours_matrix.shape[1]
+        return self
+
+    def neighbours(self, doc_id, k = None):
+        """
+        List of (docID, score) dokumen yang paling mirip dengan doc_id,
+        terurut mengecil berdasarkan skor.
+        """
+        if self.neighbours_matrix is None or doc_id >= self.neighbours_matrix.shape[0]:
+            return []
+        k = k or self.k
+        return [(int(neighbour), float(score)) \
+                for neighbour, score in zip(self.neighbours_matrix[doc_id, :k], self.scores_matrix[doc_id, :k]) \
+                if neighbour >= 0]
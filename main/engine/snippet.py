@@ -0,0 +1,301 @@
+import os
+import re
+import html
+import bisect
+import threading
+import dill as pickle
+import numpy as np
+from collections import OrderedDict
+
+from main.engine.util import process_word
+
+SENTENCE_PATTERN = re.compile(r"[^.]*\.|[^.]+$")
+WORD_PATTERN = re.compile(r"\S+")
+
+def get_title_content(lines, col_id, doc_id):
+    """
+    Memisahkan judul dan isi dari sebuah dokumen di collection. Judul adalah
+    baris-baris awal sampai ditemukan baris yang diawali dua spasi.
+
+    Parameters
+    ----------
+    lines: Iterable[str]
+        Baris-baris dari dokumen (bisa berupa file object)
+    col_id: str
+        Nama block (sub-direktori) dari dokumen
+    doc_id: str
+        Nama file dari dokumen, misal "13.txt"
+
+    Returns
+    -------
+    Tuple[str, str]
+        (judul, isi)
+    """
+    title_ends = False
+    title, content = '', ''
+
+    for line in lines:
+        if line[:2] == '  ':
+            title_ends = True
+        if title_ends:
+            content += line.strip()
+        else:
+            title += line.strip()
+
+    if content == '':
+        content, title = title, ''
+    if title == '':
+        title = f'Document {doc_id[:-4]} - Collection {col_id}'
+    content = content.capitalize()
+    if title[-1] == '.':
+        title = title[:-1]
+    return title, content
+
+
+class DocumentSnippets:
+    """
+    Struktur per dokumen yang dihitung saat indexing, agar snippet bisa
+    dibuat tanpa membaca dan men-scan ulang raw text.
+
+    Attributes
+    ----------
+    title(str): Judul dokumen
+    content(str): Isi dokumen (sudah dinormalisasi seperti pada tampilan)
+    sentences: List[Tuple[int, int]]
+        Batas (start, end) setiap kalimat di content, dalam satuan karakter
+    postings: Dictionary mapping stemmed term -> sorted list of sentence ids
+    spans: Dictionary mapping stemmed term -> list of (start, end) posisi
+        kemunculan kata di content, terurut berdasarkan posisi
+    """
+
+    __slots__ = ('title', 'content', 'sentences', 'postings', 'spans')
+
+    def __init__(self, title, content):
+        self.title = title
+        self.content = content
+        self.sentences = []
+        self.postings = {}
+        self.spans = {}
+
+        for sentence_id, match in enumerate(SENTENCE_PATTERN.finditer(content)):
+            self.sentences.append(match.span())
+            for word in WORD_PATTERN.finditer(content, match.start(), match.end()):
+                term = process_word(word.group())
+                if term is None:
+                    continue
+                self.spans.setdefault(term, []).append(self.__trim_span(word))
+                sentence_ids = self.postings.setdefault(term, [])
+                if not sentence_ids or sentence_ids[-1] != sentence_id:
+                    sentence_ids.append(sentence_id)
+
+    @staticmethod
+    def __trim_span(word):
+        """Posisi kata tanpa tanda baca di awal/akhir, untuk keperluan highlight."""
+        start, end = word.span()
+        text = word.group()
+        left = len(text) - len(text.lstrip('.,;:()[]"\''))
+        right = len(text) - len(text.rstrip('.,;:()[]"\''))
+        if left + right >= len(text):
+            return start, end
+        return start + left, end - right
+
+    def best_sentences(self, query_terms, max_sentences=3):
+        """
+        Memilih kalimat-kalimat terbaik untuk query. Skor sebuah kalimat adalah
+        banyaknya term query (unik) yang muncul di kalimat tersebut, dihitung
+        dari irisan query terms dengan postings kalimat. Jika skor sama, kalimat
+        yang muncul lebih awal diutamakan.
+
+        Returns
+        -------
+        List[int]
+            sentence ids yang terpilih, terurut sesuai urutan di dokumen
+        """
+        scores = {}
+        for term in set(query_terms) & self.postings.keys():
+            for sentence_id in self.postings[term]:
+                scores[sentence_id] = scores.get(sentence_id, 0) + 1
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return sorted(sentence_id for sentence_id, _ in best[:max_sentences])
+
+    def highlight(self, sentence_ids, query_terms):
+        """
+        Menggabungkan kalimat-kalimat terpilih dengan pemisah " ... " dan
+        menebalkan (<b>) setiap kata yang stem-nya ada di query, dalam satu
+        kali pass dari kiri ke kanan.
+        """
+        starts = [self.sentences[i][0] for i in sentence_ids]
+        marks = []
+        for term in set(query_terms) & self.spans.keys():
+            for start, end in self.spans[term]:
+                i = bisect.bisect_right(starts, start) - 1
+                if i >= 0 and start < self.sentences[sentence_ids[i]][1]:
+                    marks.append((start, end))
+        marks.sort()
+
+        parts = []
+        mark_iter = iter(marks)
+        mark = next(mark_iter, None)
+        for sentence_id in sentence_ids:
+            pos, sentence_end = self.sentences[sentence_id]
+            sentence = []
+            while mark is not None and mark[0] < sentence_end:
+                sentence.append(html.escape(self.content[pos:mark[0]]))
+                sentence.append("<b>" + html.escape(self.content[mark[0]:mark[1]]) + "</b>")
+                pos = mark[1]
+                mark = next(mark_iter, None)
+            sentence.append(html.escape(self.content[pos:sentence_end]))
+            parts.append("".join(sentence).strip())
+        return " ... ".join(parts)
+
+    def snippet(self, query_terms, max_sentences=3):
+        """
+        Query-biased snippet dalam bentuk HTML, atau string kosong jika tidak
+        ada kalimat yang mengandung term query.
+        """
+        sentence_ids = self.best_sentences(query_terms, max_sentences)
+        if not sentence_ids:
+            return ""
+        return "<p>" + self.highlight(sentence_ids, query_terms) + "</p>"
+
+
+class SnippetIndex:
+    """
+    Kumpulan DocumentSnippets untuk semua dokumen di collection. Seperti
+    postings di inverted index, DocumentSnippets setiap dokumen di-pickle
+    berurutan ke satu file data (data_path), dan posisinya disimpan di tabel
+    offset (path). Hanya tabel offset (16 bytes per dokumen) yang dimuat ke
+    memori; DocumentSnippets dibaca dari disk saat dibutuhkan dan disimpan di
+    cache LRU berukuran cache_size dokumen.
+
+    Saat indexing, DocumentSnippets yang baru ditambahkan ditampung di pending
+    sampai flush menuliskannya ke file data.
+
+    Attributes
+    ----------
+    path(str): Path ke tabel offset
+    data_path(str): Path ke file data
+    offsets: np.ndarray int64 berukuran (banyaknya dokumen, 2), baris ke-docID
+        berisi (posisi, panjang dalam bytes); panjang 0 jika dokumen tidak ada
+    pending: Dictionary mapping docID -> DocumentSnippets yang belum ditulis
+    cache: OrderedDict (LRU) docID -> DocumentSnippets yang sudah dibaca
+    """
+
+    CACHE_SIZE = 1024
+
+    def __init__(self, path, cache_size = CACHE_SIZE):
+        self.path = path
+        self.data_path = os.path.splitext(path)[0] + '.data'
+        self.cache_size = cache_size
+        self.offsets = np.zeros((0, 2), dtype = np.int64)
+        self.pending = {}
+        self.cache = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        stored = set(np.flatnonzero(self.offsets[:, 1]).tolist())
+        return len(stored | self.pending.keys())
+
+    @staticmethod
+    def create(doc_path, text):
+        """DocumentSnippets dari isi (text) sebuah dokumen di collection"""
+        col_id, doc_name = doc_path.replace(os.sep, '/').split('/')[-2:]
+        title, content = get_title_content(text.splitlines(), col_id, doc_name)
+        return DocumentSnippets(title, content)
+
+    def add(self, doc_id, doc_path, text):
+        """
+        Menghitung DocumentSnippets untuk sebuah dokumen dan menampungnya di
+        pending. Dipanggil saat indexing (parse_block).
+        """
+        self.pending[doc_id] = self.create(doc_path, text)
+        return self.pending[doc_id]
+
+    def read(self, doc_id):
+        """DocumentSnippets sebuah dokumen dari file data, atau None jika tidak ada"""
+        if not 0 <= doc_id < len(self.offsets):
+            return None
+        pos, length = self.offsets[doc_id].tolist()
+        if not length:
+            return None
+        with open(self.data_path, 'rb') as f:
+            f.seek(pos)
+            return pickle.loads(f.read(length))
+
+    def get(self, doc_id, doc_path):
+        """
+        Mengembalikan DocumentSnippets dari sebuah dokumen, dari pending, cache,
+        atau file data. Jika dokumen belum ada di snippet index (misal index
+        dibangun sebelum snippet index ada), dokumen dibaca dari collection.
+        """
+        document = self.pending.get(doc_id)
+        if document is not None:
+            return document
+        with self.__lock:
+            document = self.cache.get(doc_id)
+            if document is not None:
+                self.cache.move_to_end(doc_id)
+                return document
+
+        document = self.read(doc_id)
+        if document is None:
+            with open(doc_path) as f:
+                document = self.create(doc_path, f.read())
+        with self.__lock:
+            self.cache[doc_id] = document
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last = False)
+        return document
+
+    def clear(self):
+        """Mengosongkan snippet index, termasuk file data, sebelum indexing ulang"""
+        open(self.data_path, 'wb').close()
+        self.offsets = np.zeros((0, 2), dtype = np.int64)
+        self.pending = {}
+        with self.__lock:
+            self.cache.clear()
+
+    def remap(self, new_id):
+        """Mengganti docID setiap dokumen menjadi new_id[docID] (lihat reorder.py)"""
+        self.flush()
+        offsets = np.zeros((len(new_id), 2), dtype = np.int64)
+        for old_id, new in new_id.items():
+            if old_id < len(self.offsets):
+                offsets[new] = self.offsets[old_id]
+        self.offsets = offsets
+        with self.__lock:
+            self.cache.clear()
+
+    def flush(self):
+        """Menambahkan DocumentSnippets di pending ke akhir file data"""
+        if not self.pending:
+            return
+        if max(self.pending) >= len(self.offsets):
+            grown = np.zeros((max(self.pending) + 1, 2), dtype = np.int64)
+            grown[:len(self.offsets)] = self.offsets
+            self.offsets = grown
+        with open(self.data_path, 'ab') as f:
+            pos = f.seek(0, 2)
+            for doc_id in sorted(self.pending):
+                data = pickle.dumps(self.pending[doc_id])
+                f.write(data)
+                self.offsets[doc_id] = (pos, len(data))
+                pos += len(data)
+        self.pending = {}
+        with self.__lock:
+            self.cache.clear()
+
+    def save(self):
+        self.flush()
+        with open(self.path, 'wb') as f:
+            pickle.dump(self.offsets, f)
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                offsets = pickle.load(f)
+            if isinstance(offsets, dict):
+                # format lama: semua DocumentSnippets di-pickle di satu file
+                self.pending = offsets
+            else:
+                self.offsets = offsets
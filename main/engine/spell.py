@@ -0,0 +1,154 @@
+import os
+import re
+import dill as pickle
+from array import array
+
+from main.engine.util import get_stop_words, process_word
+
+def edit_distance(a, b, max_distance):
+    """
+    Damerau-Levenshtein distance (optimal string alignment) antara a dan b,
+    atau max_distance + 1 jika jaraknya lebih dari max_distance. Perhitungan
+    dihentikan lebih awal begitu seluruh baris DP melebihi max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+def deletes(word, max_distance):
+    """Semua string hasil menghapus sampai max_distance karakter dari word"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+class SpellIndex:
+    """
+    Koreksi ejaan dengan symmetric delete (SymSpell). Untuk setiap surface
+    form di vocabulary disimpan semua variasi hasil menghapus sampai
+    max_distance karakter dari prefix-nya (prefix_length karakter pertama).
+    Kata yang salah eja juga dibuat variasi delete-nya, sehingga kandidat
+    koreksi cukup dicari dengan lookup dictionary, tanpa menghitung edit
+    distance ke seluruh vocabulary. Jarak sebenarnya hanya dihitung untuk
+    kandidat yang ditemukan.
+
+    Kandidat diurutkan berdasarkan edit distance, lalu df terbesar.
+
+    Attributes
+    ----------
+    path(str): Path ke file spell index
+    max_distance(int): Edit distance maksimum
+    prefix_length(int): Panjang prefix yang dibuat variasi delete-nya
+    words: List[str] surface form
+    word_df: array('I') df yang sejajar dengan words
+    index: Dictionary mapping string delete -> slot
+    offsets, postings: array('I'); posisi di words untuk sebuah slot adalah
+        postings[offsets[slot]:offsets[slot + 1]]. Dibuat flat agar file spell
+        index kecil dan cepat di-load.
+    """
+
+    def __init__(self, path, max_distance = 2, prefix_length = 7):
+        self.path = path
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []
+        self.word_df = array('I')
+        self.index = {}
+        self.offsets = array('I', [0])
+        self.postings = array('I')
+
+    def build(self, surface_df):
+        self.words = sorted(surface_df)
+        self.word_df = array('I', (surface_df[word] for word in self.words))
+        lists = {}
+        for i, word in enumerate(self.words):
+            for delete in deletes(word[:self.prefix_length], self.max_distance):
+                lists.setdefault(delete, []).append(i)
+
+        self.index = {}
+        self.offsets = array('I', [0])
+        self.postings = array('I')
+        for slot, (delete, positions) in enumerate(lists.items()):
+            self.index[delete] = slot
+            self.postings.extend(positions)
+            self.offsets.append(len(self.postings))
+        return self
+
+    def candidates(self, word):
+        """
+        List of (surface form, edit distance, df) yang jaraknya paling
+        banyak max_distance dari word, terurut dari kandidat terbaik.
+        """
+        found = set()
+        for delete in deletes(word[:self.prefix_length], self.max_distance):
+            slot = self.index.get(delete)
+            if slot is not None:
+                found.update(self.postings[self.offsets[slot]:self.offsets[slot + 1]])
+
+        result = []
+        for i in found:
+            distance = edit_distance(word, self.words[i], self.max_distance)
+            if distance <= self.max_distance:
+                result.append((self.words[i], distance, self.word_df[i]))
+        result.sort(key=lambda item: (item[1], -item[2], item[0]))
+        return result
+
+    def correct(self, query, vocabulary):
+        """
+        Koreksi ejaan sebuah query. Hanya kata yang stem-nya tidak ada di
+        vocabulary (out-of-vocabulary) yang dicari kandidatnya, sehingga query
+        yang semua term-nya dikenal hanya membayar satu dictionary lookup per
+        kata.
+
+        Parameters
+        ----------
+        vocabulary: Dict[str, int]
+            Mapping stem -> termID (term_id_map.str_to_id)
+
+        Returns
+        -------
+        str atau None
+            Query hasil koreksi, atau None jika tidak ada yang perlu (atau
+            bisa) dikoreksi
+        """
+        stop_words = get_stop_words()
+        words = query.lower().split()
+        changed = False
+        for position, word in enumerate(words):
+            clean = re.sub(r"[^\w]|\d", "", word)
+            if not clean or clean in stop_words:
+                continue
+            if process_word(clean) in vocabulary:
+                continue
+            candidates = self.candidates(clean)
+            if candidates:
+                words[position] = candidates[0][0]
+                changed = True
+        return " ".join(words) if changed else None
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            pickle.dump((self.max_distance, self.prefix_length, self.words, self.word_df, \
+                         list(self.index), self.offsets, self.postings), f)
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.max_distance, self.prefix_length, self.words, self.word_df, \
+                    keys, self.offsets, self.postings = pickle.load(f)
+            self.index = {delete: slot for slot, delete in enumerate(keys)}
+        return self
@@ -0,0 +1,134 @@
+import os
+import heapq
+import dill as pickle
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from main.engine.querylog import normalize_query
+from main.engine.util import tokenize_surface
+
+class SuggestIndex:
+    """
+    Index untuk autocomplete (prefix search). Berbeda dengan term_id_map yang
+    berisi stem, yang disimpan di sini adalah surface form (kata asli yang
+    muncul di dokumen, bukan stopword) beserta document frequency-nya, dan
+    frasa query populer dari query log beserta banyaknya query tersebut.
+
+    Keduanya disimpan sebagai list string yang terurut dan array bobot yang
+    sejajar, sehingga semua entry dengan prefix tertentu berada dalam satu
+    range yang bisa dicari dengan bisect. Untuk prefix pendek (yang range-nya
+    besar), top-n sudah dihitung sebelumnya.
+
+    Urutan saran: frasa dari query log (berdasarkan banyaknya query), lalu
+    surface form (berdasarkan df). Untuk input beberapa kata, kata terakhir
+    dilengkapi dengan surface form, misal "lipid meta" -> "lipid metabolism".
+
+    Attributes
+    ----------
+    path(str): Path ke file suggest index
+    size(int): Banyaknya saran yang dihitung sebelumnya untuk setiap prefix pendek
+    terms, phrases: List[str] yang terurut
+    term_weights, phrase_weights: array('I') bobot yang sejajar dengan terms dan phrases
+    top: Dictionary mapping prefix pendek -> tuple saran
+    """
+
+    # prefix dengan panjang sampai PREFIX_CACHE_LENGTH dihitung sebelumnya
+    PREFIX_CACHE_LENGTH = 3
+
+    def __init__(self, path, size = 10):
+        self.path = path
+        self.size = size
+        self.terms = []
+        self.term_weights = array('I')
+        self.phrases = []
+        self.phrase_weights = array('I')
+        self.top = {}
+
+    @staticmethod
+    def count_surface_forms(doc_paths):
+        """
+        Menghitung df setiap surface form dengan membaca ulang dokumen. Dipakai
+        jika index dibangun sebelum suggest index ada; saat indexing, df ini
+        dihitung langsung di parse_block.
+        """
+        surface_df = Counter()
+        for doc_path in doc_paths:
+            with open(doc_path, encoding='utf-8', errors='ignore') as f:
+                surface_df.update(set(tokenize_surface(f.read())))
+        return surface_df
+
+    def build(self, surface_df, phrase_counts = None, min_phrase_count = 2):
+        """
+        Parameters
+        ----------
+        surface_df: Dict[str, int]
+            Surface form -> document frequency
+        phrase_counts: Dict[str, int]
+            Query (sudah dinormalisasi) -> banyaknya query tersebut di query log.
+            Query yang muncul kurang dari min_phrase_count kali tidak dipakai.
+        """
+        self.terms = sorted(surface_df)
+        self.term_weights = array('I', (surface_df[term] for term in self.terms))
+        phrase_counts = {phrase: count for phrase, count in (phrase_counts or {}).items() if count >= min_phrase_count}
+        self.phrases = sorted(phrase_counts)
+        self.phrase_weights = array('I', (phrase_counts[phrase] for phrase in self.phrases))
+
+        self.top = {}
+        prefixes = set()
+        for key in self.terms + self.phrases:
+            for length in range(1, min(self.PREFIX_CACHE_LENGTH, len(key)) + 1):
+                prefixes.add(key[:length])
+        for prefix in prefixes:
+            self.top[prefix] = tuple(self.lookup(prefix, self.size))
+        return self
+
+    @staticmethod
+    def range_top(keys, weights, prefix, n):
+        """Top-n key dengan prefix tertentu berdasarkan bobotnya"""
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + '\uffff', lo)
+        return [keys[i] for i in heapq.nlargest(n, range(lo, hi), key=lambda i: (weights[i], -i))]
+
+    def lookup(self, prefix, n):
+        """Saran untuk prefix (sudah dinormalisasi) tanpa memakai top"""
+        suggestions = self.range_top(self.phrases, self.phrase_weights, prefix, n)
+        if len(suggestions) < n:
+            head, _, last = prefix.rpartition(' ')
+            if last:
+                seen = set(suggestions)
+                for term in self.range_top(self.terms, self.term_weights, last, n):
+                    suggestion = f"{head} {term}" if head else term
+                    if suggestion not in seen:
+                        suggestions.append(suggestion)
+                        if len(suggestions) == n:
+                            break
+        return suggestions
+
+    def suggest(self, prefix, n = None):
+        """
+        Maksimal n saran untuk prefix yang diketik user.
+
+        Returns
+        -------
+        List[str]
+            Frasa query populer lalu surface form, masing-masing terurut
+            mengecil berdasarkan bobotnya
+        """
+        n = n or self.size
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= self.PREFIX_CACHE_LENGTH and n <= self.size:
+            return list(self.top.get(prefix, ()))[:n]
+        return self.lookup(prefix, n)
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            pickle.dump((self.size, self.terms, self.term_weights, self.phrases, self.phrase_weights, self.top), f)
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.size, self.terms, self.term_weights, self.phrases, self.phrase_weights, self.top = pickle.load(f)
+        return self
@@ -0,0 +1,198 @@
+import os
+import math
+import hashlib
+import heapq
+import threading
+import dill as pickle
+
+from main.engine.index import InvertedIndexReader, InvertedIndexWriter
+
+class TierIndex:
+    """
+    Static index pruning dengan dua tier. Tier satu adalah index kecil yang
+    hanya berisi postings ber-impact tertinggi dari setiap term (impact adalah
+    kontribusi skor BM25 sebuah posting), dan disimpan utuh di memori. Tier dua
+    adalah main index lengkap di disk.
+
+    Sebuah query dijawab dari tier satu jika hasilnya terbukti sama dengan
+    hasil dari index lengkap. Untuk setiap term, disimpan impact maksimum dari
+    postings yang dibuang (omitted_max), sehingga bisa dihitung batas atas skor
+    setiap dokumen:
+
+        upper(D) = lower(D) + jumlah omitted_max(t) untuk term t di query
+                   yang posting (t, D)-nya tidak ada di tier satu
+
+    Top-K dari tier satu aman dipakai jika setiap dokumen di top-K skornya
+    sudah pasti (upper == lower), dan skor dokumen ke-K lebih besar dari batas
+    atas skor dokumen lain mana pun (termasuk dokumen yang tidak muncul sama
+    sekali di tier satu). Jika tidak, query dijawab dari tier dua.
+
+    File .bounds juga menyimpan jumlah dokumen, jumlah term, dan checksum file
+    .dict main index saat tier satu dibangun. Jika main index sudah dibangun
+    ulang (tier satu basi), is_current() False dan tier satu tidak dimuat,
+    sehingga semua query dijawab dari tier dua.
+
+    Attributes
+    ----------
+    k1, b(float): Parameter BM25 saat impact dihitung; query dengan parameter
+        lain selalu dijawab dari tier dua
+    postings: Dictionary mapping termID -> (list of docID, list of impact)
+    omitted_max: Dictionary mapping termID -> impact maksimum postings yang dibuang
+    df: Dictionary mapping termID -> document frequency di main index
+    tier1_queries, fallback_queries(int): Counter untuk laporan fallback
+    """
+
+    def __init__(self, output_dir, index_name):
+        self.output_dir = output_dir
+        self.main_index_name = index_name
+        self.index_name = index_name + '_tier1'
+        self.bounds_path = os.path.join(output_dir, self.index_name + '.bounds')
+        self.k1 = None
+        self.b = None
+        self.postings = {}
+        self.omitted_max = {}
+        self.df = {}
+        self.tier1_queries = 0
+        self.fallback_queries = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def exists(output_dir, index_name):
+        return os.path.exists(os.path.join(output_dir, index_name + '_tier1.bounds'))
+
+    def main_index_checksum(self):
+        """Checksum SHA-256 file .dict main index (postings_dict dan doc_length)"""
+        digest = hashlib.sha256()
+        with open(os.path.join(self.output_dir, self.main_index_name + '.dict'), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_current(self):
+        """True jika tier satu dibangun dari main index yang sekarang ada di disk"""
+        try:
+            with open(self.bounds_path, 'rb') as f:
+                main_index = pickle.load(f).get('main_index')
+            return main_index is not None and main_index['checksum'] == self.main_index_checksum()
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+
+    def build(self, bsbi_index, fraction = 0.1, min_postings = 32, k1 = 1.6, b = 0.75):
+        """
+        Membangun tier satu dari main index. Untuk setiap term, disimpan
+        max(min_postings, ceil(fraction * df)) postings dengan impact tertinggi.
+        """
+        self.k1, self.b = k1, b
+        self.omitted_max = {}
+        self.df = {}
+        with InvertedIndexReader(bsbi_index.index_name, bsbi_index.postings_encoding, directory=bsbi_index.output_dir) as main_index, \
+             InvertedIndexWriter(self.index_name, bsbi_index.postings_encoding, directory=self.output_dir) as tier1:
+            N = len(main_index.doc_length)
+            for term_id, postings_list, tf_list in main_index:
+                self.df[term_id] = len(postings_list)
+                impacts = self.impacts(postings_list, tf_list, len(postings_list), N, main_index.doc_length, main_index.avg_doc_length)
+                keep = max(min_postings, math.ceil(fraction * len(postings_list)))
+                if keep >= len(postings_list):
+                    kept = range(len(postings_list))
+                    self.omitted_max[term_id] = 0.0
+                else:
+                    order = sorted(range(len(postings_list)), key=lambda i: impacts[i], reverse=True)
+                    kept = sorted(order[:keep])
+                    self.omitted_max[term_id] = impacts[order[keep]]
+                tier1.append(term_id, [postings_list[i] for i in kept], [tf_list[i] for i in kept])
+            # tier satu memakai statistik koleksi dari main index
+            tier1.doc_length = main_index.doc_length
+            tier1.avg_doc_length = main_index.avg_doc_length
+
+        main_index = {'docs': N, 'terms': len(self.df), 'checksum': self.main_index_checksum()}
+        with open(self.bounds_path, 'wb') as f:
+            pickle.dump({'k1': k1, 'b': b, 'fraction': fraction, 'min_postings': min_postings, \
+                         'omitted_max': self.omitted_max, 'df': self.df, 'main_index': main_index}, f)
+        return self
+
+    def build_params(self):
+        """Parameter build() tier satu yang tersimpan, untuk membangunnya ulang"""
+        with open(self.bounds_path, 'rb') as f:
+            bounds = pickle.load(f)
+        return {'fraction': bounds.get('fraction', 0.1), 'min_postings': bounds.get('min_postings', 32), \
+                'k1': bounds['k1'], 'b': bounds['b']}
+
+    def impacts(self, postings_list, tf_list, df, N, doc_length, avg_doc_length):
+        """Impact setiap posting, dengan rumus yang sama seperti BSBIIndex._score_bm25"""
+        k1, b = self.k1, self.b
+        wtq = math.log10(N / df)
+        return [((k1 + 1) * tf) / (k1 * (1 - b + b * doc_length[doc_id] / avg_doc_length) + tf) * wtq \
+                for doc_id, tf in zip(postings_list, tf_list)]
+
+    def load(self, postings_encoding):
+        """Memuat seluruh tier satu ke memori, dengan impact yang sudah dihitung"""
+        with open(self.bounds_path, 'rb') as f:
+            bounds = pickle.load(f)
+        self.k1, self.b = bounds['k1'], bounds['b']
+        self.omitted_max, self.df = bounds['omitted_max'], bounds['df']
+        self.postings = {}
+        with InvertedIndexReader(self.index_name, postings_encoding, directory=self.output_dir) as tier1:
+            N = len(tier1.doc_length)
+            for term_id, postings_list, tf_list in tier1:
+                # impact dihitung dengan df dari main index (jumlah postings sebelum pruning)
+                impacts = self.impacts(postings_list, tf_list, self.df[term_id], N, tier1.doc_length, tier1.avg_doc_length)
+                self.postings[term_id] = (postings_list, impacts)
+        return self
+
+    def retrieve(self, term_ids, k, k1, b):
+        """
+        Top-K (docID, score) dari tier satu, atau None jika hasilnya tidak
+        terjamin sama dengan hasil dari index lengkap.
+        """
+        if (k1, b) != (self.k1, self.b) or any(term_id not in self.postings for term_id in term_ids):
+            return self.__count(None)
+
+        lower = {}
+        covered = {}    # docID -> jumlah omitted_max dari term yang posting-nya ada di tier satu
+        total_omitted = 0.0
+        for term_id in term_ids:
+            omitted = self.omitted_max[term_id]
+            total_omitted += omitted
+            postings_list, impacts = self.postings[term_id]
+            for doc_id, impact in zip(postings_list, impacts):
+                lower[doc_id] = lower.get(doc_id, 0) + impact
+                if omitted:
+                    covered[doc_id] = covered.get(doc_id, 0) + omitted
+
+        top = heapq.nlargest(k, lower.items(), key=lambda item: (item[1], -item[0]))
+        if total_omitted == 0:
+            return self.__count(top)
+        if len(top) < k:
+            return self.__count(None)
+
+        top_docs = set()
+        for doc_id, _ in top:
+            if total_omitted - covered.get(doc_id, 0) > 1e-12:
+                return self.__count(None)
+            top_docs.add(doc_id)
+
+        kth_score = top[-1][1]
+        max_other = total_omitted     # batas atas dokumen yang tidak ada di tier satu
+        for doc_id, score in lower.items():
+            if doc_id not in top_docs:
+                max_other = max(max_other, score + total_omitted - covered.get(doc_id, 0))
+        return self.__count(top if kth_score > max_other else None)
+
+    def __count(self, result):
+        with self.__lock:
+            if result is None:
+                self.fallback_queries += 1
+            else:
+                self.tier1_queries += 1
+        return result
+
+    def report(self):
+        """Seberapa sering query dijawab dari tier satu dan seberapa sering fallback"""
+        total = self.tier1_queries + self.fallback_queries
+        return {
+            "queries": total,
+            "tier1": self.tier1_queries,
+            "fallback": self.fallback_queries,
+            "fallback_rate": self.fallback_queries / total if total else 0.0,
+            "tier1_postings": sum(len(postings_list) for postings_list, _ in self.postings.values()),
+        }
@@ -4,6 +4,19 @@ from nltk.stem import PorterStemmer
 import re
 import math
 
+STEMMER = PorterStemmer()
+_STOP_WORDS = None
+
+def get_stop_words():
+    """
+    Mengembalikan set stopwords bahasa Inggris. Set ini cukup dibuat sekali
+    per proses, bukan di setiap pemanggilan process_text.
+    """
+    global _STOP_WORDS
+    if _STOP_WORDS is None:
+        _STOP_WORDS = set(stopwords.words('english'))
+    return _STOP_WORDS
+
 class IdMap:
     """
     Ingat kembali di kuliah, bahwa secara praktis, sebuah dokumen dan
@@ -113,10 +126,9 @@ def sorted_merge_posts_and_tfs(posts_tfs1, posts_tfs2):
             result.append(posts_tfs2[j])
             j += 1
     
-    if len(posts_tfs1) > len(posts_tfs2):
-        result += posts_tfs1[i:]
-    elif len(posts_tfs1) < len(posts_tfs2):
-        result += posts_tfs2[j:]
+    # salah satu list sudah habis; sisa list yang lain langsung ditambahkan
+    result += posts_tfs1[i:]
+    result += posts_tfs2[j:]
 
     return result
 
@@ -124,15 +136,35 @@ def test(output, expected):
     """ simple function for testing """
     return "PASSED" if output == expected else "FAILED"
 
-def process_text(text):
+def tokenize_surface(text):
+    """
+    Tokenisasi seperti process_text, namun tanpa stemming: menghasilkan
+    kata-kata (surface form) yang bukan stopword, sesuai urutan di teks.
+    """
     text = text.lower().strip() # Mengubah uppercase menjadi lowercase dan melakukan trimming pada teks
     text = re.sub("\d", "", text) # Menghilangkan angka
     text = re.sub("\s+", " ", text) # Menghilangkan spasi berlebih
     text = re.sub("[^\w\s]", "", text) # Menghilangkan tanda baca ############
 
-    stop_words = set(stopwords.words('english'))
-    stemmer = PorterStemmer()
-    text_tokenized = word_tokenize(text)
-    text_tokenized = [stemmer.stem(w) for w in text_tokenized if w not in stop_words]
+    stop_words = get_stop_words()
+    return [w for w in word_tokenize(text) if w not in stop_words]
 
-    return text_tokenized
+def process_text(text):
+    return [STEMMER.stem(w) for w in tokenize_surface(text)]
+
+def process_word(word):
+    """
+    Normalisasi satu kata (surface form) dengan aturan yang sama seperti
+    process_text: lowercase, buang angka dan tanda baca, buang stopwords,
+    lalu stemming.
+
+    Returns
+    -------
+    str atau None
+        Stem dari kata tersebut, atau None jika kata tersebut tidak
+        menghasilkan term apapun (misal stopword atau angka).
+    """
+    word = re.sub("[^\w]|\d", "", word.lower())
+    if not word or word in get_stop_words():
+        return None
+    return STEMMER.stem(word)
@@ -0,0 +1,132 @@
+import time
+from collections import Counter
+
+from main.engine.index import InvertedIndexReader, PostingsCache
+from main.engine.querylog import normalize_query
+
+def popular_queries(entries, limit = 500, window = None, now = None):
+    """
+    Query yang paling sering muncul di entries (entry QueryLog), hanya dari
+    window detik terakhir jika window diberikan.
+
+    Returns
+    -------
+    List[Tuple[str, int]]
+        (query yang sudah dinormalisasi, frekuensi), terurut dari yang paling sering
+    """
+    since = None if not window else (now or time.time()) - window
+    counts = Counter()
+    for entry in entries:
+        if since is not None and entry.get("ts", 0) < since:
+            continue
+        query = normalize_query(entry["q"])
+        if query:
+            counts[query] += 1
+    return counts.most_common(limit)
+
+class WarmUp:
+    """
+    Mengisi cache engine dari query populer sebelum worker melayani traffic,
+    agar latency setelah deploy atau index dibangun ulang langsung seperti
+    kondisi steady state. Tiga tahap, masing-masing terurut dari yang paling
+    populer:
+
+    1. postings: postings list dari term-term query di-decode ke postings_cache
+       (term diurutkan berdasarkan total frekuensi query yang memuatnya)
+    2. queries: setiap query dijalankan dengan warm_query, misal untuk mengisi
+       cache hasil search (result set beserta snippet-nya)
+    3. documents: dokumen yang muncul di hasil query populer dimuat dengan
+       warm_document, misal untuk mengisi cache halaman dokumen
+
+    Warm-up berhenti begitu time_budget habis atau perkiraan memori yang
+    ditambahkan mencapai memory_budget. Ukuran postings diketahui dari
+    postings_dict sebelum di-decode; ukuran hasil query dan dokumen baru
+    diketahui setelah dimuat, sehingga budget bisa terlampaui satu entry.
+
+    Attributes
+    ----------
+    bsbi_index(BSBIIndex): Index yang di-warm-up
+    queries: List of (query, frekuensi), lihat popular_queries
+    time_budget(float): Batas waktu warm-up (detik)
+    memory_budget(int): Batas total perkiraan memori yang ditambahkan (bytes)
+    """
+
+    def __init__(self, bsbi_index, queries, time_budget = 20.0, memory_budget = 32 * 1024 * 1024):
+        self.bsbi_index = bsbi_index
+        self.queries = queries
+        self.time_budget = time_budget
+        self.memory_budget = memory_budget
+
+    def run(self, warm_query = None, warm_document = None):
+        """
+        Parameters
+        ----------
+        warm_query: callable(query) -> (perkiraan bytes, list of dokumen hasil),
+            default-nya retrieve_bm25 top-10 (tanpa cache hasil)
+        warm_document: callable(dokumen) -> perkiraan bytes, default-nya
+            get_document
+
+        Returns
+        -------
+        dict
+            Banyaknya term, query, dan dokumen yang di-warm-up, perkiraan
+            bytes, durasi, dan alasan berhenti ("time", "memory", atau None)
+        """
+        index = self.bsbi_index
+        def retrieve(query):
+            return 0, [doc for _, doc in index.retrieve_bm25(query, k = 10)]
+
+        def load_document(doc):
+            index.get_document(index.doc_id_map.str_to_id[doc])
+            return 0
+
+        warm_query = warm_query or retrieve
+        warm_document = warm_document or load_document
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        report = {"queries": 0, "terms": 0, "documents": 0, "bytes": 0, "stopped": None}
+
+        def admit(size):
+            if time.perf_counter() >= deadline:
+                report["stopped"] = "time"
+                return False
+            if report["bytes"] + size > self.memory_budget:
+                report["stopped"] = "memory"
+                return False
+            return True
+
+        term_weights = Counter()
+        for query, frequency in self.queries:
+            for term_id in set(index._query_term_ids(query)):
+                term_weights[term_id] += frequency
+
+        with InvertedIndexReader(index.index_name, index.postings_encoding, directory = index.output_dir) as reader:
+            for term_id, _ in term_weights.most_common():
+                # postings dan tf disimpan sebagai array('I') di postings_cache
+                size = 8 * reader.postings_dict[term_id][1] + PostingsCache.ENTRY_OVERHEAD
+                if not admit(size):
+                    break
+                reader.get_decoded_postings(term_id)
+                report["terms"] += 1
+                report["bytes"] += size
+
+        documents = Counter()
+        if report["stopped"] is None:
+            for query, frequency in self.queries:
+                if not admit(0):
+                    break
+                size, docs = warm_query(query)
+                report["queries"] += 1
+                report["bytes"] += size
+                for doc in docs:
+                    documents[doc] += frequency
+
+        if report["stopped"] is None:
+            for doc, _ in documents.most_common():
+                if not admit(0):
+                    break
+                report["bytes"] += warm_document(doc)
+                report["documents"] += 1
+
+        report["seconds"] = time.perf_counter() - start
+        return report
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine import benchmark
+from main.engine.querylog import QueryLog
+from main.engine.registry import IndexRegistry
+
+
+class Command(BaseCommand):
+    help = ("Benchmark indexing, codecs and query latency on a synthetic Zipfian corpus "
+            "(or on an existing index) and write the results as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--docs", type=int, default=1000, help="number of synthetic documents")
+        parser.add_argument("--docs-per-block", type=int, default=1000, help="documents per collection block")
+        parser.add_argument("--vocabulary", type=int, help="distinct words (default: Heaps' law)")
+        parser.add_argument("--zipf", type=float, default=1.0, help="Zipf exponent of the term distribution")
+        parser.add_argument("--doc-length", type=int, default=120, help="mean words per document")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--work-dir", help="where to write the corpus and index (default: a temporary directory)")
+        parser.add_argument("--keep", action="store_true", help="keep the generated corpus and index")
+        parser.add_argument("--index", help="benchmark this index from SEARCH_INDEXES instead of a synthetic one "
+                                            "(skips generation and indexing)")
+        parser.add_argument("--fan-in", type=int, default=16, help="number of indexes merged at once")
+        parser.add_argument("--queries", type=int, default=200, help="number of queries")
+        parser.add_argument("--query-log", help="use the most frequent queries of this query log")
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--output", default="benchmark.json", help="JSON results file")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+
+    def handle(self, *args, **options):
+        if options["index"] is not None:
+            if options["index"] not in settings.SEARCH_INDEXES:
+                raise CommandError(f"Unknown index {options['index']!r}")
+            BSBI_instance = IndexRegistry.open(settings.SEARCH_INDEXES[options["index"]])
+            report = {"environment": benchmark.environment(), "index": options["index"]}
+            self.run(BSBI_instance, report, None, options)
+            return
+
+        work_dir = options["work_dir"] or tempfile.mkdtemp(prefix="medbib-benchmark-")
+        try:
+            corpus = benchmark.SyntheticCorpus(os.path.join(work_dir, "collection"), options["docs"],
+                                               docs_per_block=options["docs_per_block"],
+                                               vocabulary_size=options["vocabulary"],
+                                               zipf_exponent=options["zipf"],
+                                               mean_length=options["doc_length"], seed=options["seed"])
+            report = {"environment": benchmark.environment(), "corpus": corpus.config()}
+            report["corpus"].update(corpus.generate(progress=self.stdout.write))
+            output_dir = os.path.join(work_dir, "index")
+            os.makedirs(output_dir, exist_ok=True)
+            BSBI_instance = IndexRegistry.open({"data_dir": corpus.data_dir, "output_dir": output_dir})
+            report["indexing"] = benchmark.benchmark_indexing(BSBI_instance, fan_in=options["fan_in"],
+                                                              progress=self.stdout.write)
+            self.run(BSBI_instance, report, corpus, options)
+        finally:
+            if options["keep"]:
+                self.stdout.write(f"Corpus and index kept in {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def run(self, BSBI_instance, report, corpus, options):
+        if options["query_log"]:
+            queries = [query for query, _ in QueryLog(options["query_log"]).counts().most_common(options["queries"])]
+        elif corpus is not None:
+            queries = corpus.queries(options["queries"])
+        else:
+            queries = benchmark.sample_queries(benchmark.index_words(BSBI_instance), options["queries"], options["seed"])
+        if not queries:
+            raise CommandError("No queries to run")
+
+        self.stdout.write("Benchmarking codecs...")
+        report["codecs"] = benchmark.benchmark_codecs(BSBI_instance)
+        self.stdout.write(f"Benchmarking {len(queries)} queries...")
+        report["queries"] = benchmark.benchmark_queries(BSBI_instance, queries, k=options["k"])
+        report["size"] = benchmark.index_size(BSBI_instance)
+        benchmark.save_report(report, options["output"])
+
+        for name, codec in report["codecs"].items():
+            if isinstance(codec, dict):
+                self.stdout.write(f"{name:20} {codec['bits_per_posting']:6.2f} bits/posting, "
+                                  f"encode {codec['encode_postings_per_second'] / 1e6:.2f} M/s, "
+                                  f"decode {codec['decode_postings_per_second'] / 1e6:.2f} M/s")
+        for model in ("bm25", "tfidf"):
+            for run in ("cold", "warm"):
+                summary = report["queries"][model][run]
+                self.stdout.write(f"{model:5} {run:4}  p50 {summary['p50']:.2f} ms  p99 {summary['p99']:.2f} ms  "
+                                  f"{summary['qps']:.0f} q/s")
+        self.stdout.write(f"index size: {report['size']['total']} bytes")
+
+        if options["baseline"]:
+            baseline = benchmark.load_report(options["baseline"])
+            for name, before, after, ratio in benchmark.compare(report, baseline):
+                if ratio is not None and abs(ratio - 1) >= 0.1:
+                    self.stdout.write(f"{name:60} {before:14.4f} -> {after:14.4f} ({ratio:.2f}x)")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
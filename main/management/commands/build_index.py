@@ -0,0 +1,100 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.build import IndexBuilder
+from main.engine.querylog import QueryLog
+from main.engine.registry import IndexRegistry
+from main.engine.reorder import DocIdReassigner
+
+
+def format_bytes(size):
+    if size is None:
+        return "n/a"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = "Build (or resume building) a search index with per-block checkpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", default=settings.SEARCH_DEFAULT_INDEX,
+                            help="name of the index in SEARCH_INDEXES")
+        parser.add_argument("--data-dir", help="override the collection directory")
+        parser.add_argument("--output-dir", help="override the index directory")
+        parser.add_argument("--fan-in", type=int, default=16, help="number of indexes merged at once")
+        parser.add_argument("--restart", action="store_true", help="ignore the manifest and build from scratch")
+        parser.add_argument("--reorder", choices=DocIdReassigner.METHODS + ("none",),
+                            help="reassign document ids after merging (default: keep the manifest's choice)")
+        parser.add_argument("--tier-fraction", type=float,
+                            help="build the tier-one index, keeping this fraction of each postings list (default 0.1)")
+        parser.add_argument("--tier-min-postings", type=int,
+                            help="build the tier-one index, keeping at least this many postings per term (default 32)")
+        parser.add_argument("--similar-k", type=int,
+                            help="build the related-articles table with this many neighbours per document")
+        parser.add_argument("--lsi-topics", type=int, help="build the LSI reranking model with this many topics")
+        parser.add_argument("--query-log", default=settings.SEARCH_QUERY_LOG,
+                            help="query log whose popular queries are added to the autocomplete index")
+        parser.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options["index"] not in settings.SEARCH_INDEXES:
+            raise CommandError(f"Unknown index {options['index']!r}")
+        config = dict(settings.SEARCH_INDEXES[options["index"]])
+        if options["data_dir"]:
+            config["data_dir"] = options["data_dir"]
+        if options["output_dir"]:
+            config["output_dir"] = options["output_dir"]
+
+        # derived indexes requested here are recorded in the manifest and rebuilt by later builds
+        derived = {}
+        tier = {"fraction": options["tier_fraction"], "min_postings": options["tier_min_postings"]}
+        if any(value is not None for value in tier.values()):
+            derived["tier"] = {key: value for key, value in tier.items() if value is not None}
+        if options["similar_k"] is not None:
+            derived["similar"] = {"k": options["similar_k"]}
+        if options["lsi_topics"] is not None:
+            derived["lsi"] = {"num_topics": options["lsi_topics"]}
+
+        BSBI_instance = IndexRegistry.open(config)
+        progress = None if options["json"] else self.stdout.write
+        try:
+            builder = IndexBuilder(BSBI_instance, fan_in=options["fan_in"], progress=progress, reorder=options["reorder"],
+                                   derived=derived, query_log=QueryLog(options["query_log"] or None))
+        except ValueError as e:
+            raise CommandError(str(e))
+        report = builder.run(restart=options["restart"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        phase = report["index"]
+        self.stdout.write(
+            f"index:    {phase['blocks']} blocks ({phase['resumed_blocks']} resumed), {phase['docs']} docs "
+            f"in {phase['seconds']:.2f}s - {phase['docs_per_second']:.0f} docs/s, "
+            f"{phase['mb_per_second']:.2f} MB/s, {phase['tokens_per_second']:.0f} tokens/s, "
+            f"peak RSS {format_bytes(phase['peak_rss'])}")
+        phase = report["merge"]
+        self.stdout.write(
+            f"merge:    {phase['merges']} merges over {phase['levels']} levels ({phase['resumed_merges']} resumed) "
+            f"in {phase['seconds']:.2f}s - {phase['mb_per_second']:.2f} MB/s, peak RSS {format_bytes(phase['peak_rss'])}")
+        phase = report["reorder"]
+        if not phase["skipped"]:
+            self.stdout.write(
+                f"reorder:  {phase['method']} in {phase['seconds']:.2f}s - log2(gap) {phase['log2_gap_before']:.3f} "
+                f"-> {phase['log2_gap_after']:.3f} bits per posting, decode {phase['decode_seconds_before']:.3f}s "
+                f"-> {phase['decode_seconds_after']:.3f}s, peak RSS {format_bytes(phase['peak_rss'])}")
+        phase = report["finalize"]
+        if phase["skipped"]:
+            built = "up to date"
+        else:
+            built = "suggest and spell indexes and hit-count sketches built"
+            if phase["derived"]:
+                built += f", derived indexes rebuilt: {', '.join(phase['derived'])}"
+        self.stdout.write(f"finalize: {built} in {phase['seconds']:.2f}s, peak RSS {format_bytes(phase['peak_rss'])}")
+        self.stdout.write(self.style.SUCCESS(f"Index written to {config['output_dir']}"))
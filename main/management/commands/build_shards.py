@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.registry import IndexRegistry
+from main.engine.shard import ShardedIndex, shard_name
+
+from .build_index import format_bytes
+
+
+class Command(BaseCommand):
+    help = "Split a built index into doc-partitioned shards for the shard servers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", default=settings.SEARCH_DEFAULT_INDEX,
+                            help="name of the index in SEARCH_INDEXES")
+        parser.add_argument("--shards", type=int, required=True, help="number of shards")
+
+    def handle(self, *args, **options):
+        if options["index"] not in settings.SEARCH_INDEXES:
+            raise CommandError(f"Unknown index {options['index']!r}")
+        if options["shards"] < 1:
+            raise CommandError("--shards must be at least 1")
+
+        BSBI_instance = IndexRegistry.open(settings.SEARCH_INDEXES[options["index"]])
+        if not os.path.exists(os.path.join(BSBI_instance.output_dir, BSBI_instance.index_name + ".dict")):
+            raise CommandError(f"{BSBI_instance.index_name} has not been built; run build_index first")
+
+        sharded = ShardedIndex(BSBI_instance, num_shards=options["shards"])
+        sharded.build()
+        for shard_id in range(sharded.num_shards):
+            name = shard_name(sharded.index_name, shard_id)
+            size = sum(os.path.getsize(os.path.join(sharded.output_dir, name + suffix)) for suffix in (".index", ".dict"))
+            self.stdout.write(f"  {name:28} {format_bytes(size):>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{sharded.num_shards} shards of {sharded.N} documents written to {sharded.output_dir}"))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.querylog import QueryLog
+from main.engine.registry import IndexRegistry
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the autocomplete and spelling indexes of a built index, folding in the popular queries "
+            "of the query log. build_index builds both at the end of every build.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", default=settings.SEARCH_DEFAULT_INDEX,
+                            help="name of the index in SEARCH_INDEXES")
+        parser.add_argument("--query-log", default=settings.SEARCH_QUERY_LOG,
+                            help="query log whose popular queries are added to the autocomplete index")
+        parser.add_argument("--min-phrase-count", type=int, default=2,
+                            help="times a query must appear in the log to be suggested")
+
+    def handle(self, *args, **options):
+        if options["index"] not in settings.SEARCH_INDEXES:
+            raise CommandError(f"Unknown index {options['index']!r}")
+
+        BSBI_instance = IndexRegistry.open(settings.SEARCH_INDEXES[options["index"]])
+        if not len(BSBI_instance.doc_id_map):
+            raise CommandError(f"{options['index']!r} has not been built; run build_index first")
+        suggest_index = BSBI_instance.build_suggest_index(QueryLog(options["query_log"] or None),
+                                                          options["min_phrase_count"])
+        spell_index = BSBI_instance.build_spell_index()
+        self.stdout.write(f"suggest: {len(suggest_index.terms)} terms, {len(suggest_index.phrases)} phrases, "
+                          f"{len(suggest_index.top)} cached prefixes")
+        self.stdout.write(f"spell:   {len(spell_index.words)} words")
+        self.stdout.write(self.style.SUCCESS(f"Indexes written to {BSBI_instance.output_dir}"))
@@ -0,0 +1,88 @@
+import os
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.benchmark import index_size
+from main.engine.evaluation import Evaluator, load_qrels, load_queries
+from main.engine.registry import IndexRegistry
+
+
+def parse_range(value):
+    """"0.5:2.0:0.25" -> [0.5, 0.75, ..., 2.0]; "1.2,1.6" -> [1.2, 1.6]"""
+    try:
+        if ":" in value:
+            start, stop, step = (float(x) for x in value.split(":"))
+            count = int(round((stop - start) / step)) + 1
+            return [round(start + i * step, 6) for i in range(count)]
+        return [float(x) for x in value.split(",")]
+    except ValueError:
+        raise CommandError(f"Invalid range {value!r}, expected start:stop:step or a comma-separated list")
+
+
+class Command(BaseCommand):
+    help = ("Evaluate retrieval quality (MAP, nDCG@10, recall@100) against relevance judgments, "
+            "side by side with latency and index size, and sweep BM25 k1/b without reindexing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", default=os.path.join("main/engine", "MED.QRY"),
+                            help="queries in SMART format (.I / .W), e.g. MED.QRY")
+        parser.add_argument("--qrels", default=os.path.join("main/engine", "MED.REL"),
+                            help="relevance judgments in TREC format, e.g. MED.REL")
+        parser.add_argument("--index", default=settings.SEARCH_DEFAULT_INDEX,
+                            help="comma-separated names from SEARCH_INDEXES (e.g. one per codec)")
+        parser.add_argument("--mode", action="append", help="only evaluate this retrieval mode (repeatable)")
+        parser.add_argument("--depth", type=int, default=1000, help="documents retrieved per query")
+        parser.add_argument("--sweep", action="store_true", help="sweep BM25 k1 and b")
+        parser.add_argument("--k1", default="0.4:2.4:0.2", help="k1 values for --sweep (start:stop:step or list)")
+        parser.add_argument("--b", default="0:1:0.1", help="b values for --sweep (start:stop:step or list)")
+        parser.add_argument("--output", help="write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        for name in ("queries", "qrels"):
+            if not os.path.exists(options[name]):
+                raise CommandError(f"{options[name]} not found; pass --{name} (the MED collection's "
+                                   f"MED.QRY and MED.REL)")
+        queries, qrels = load_queries(options["queries"]), load_qrels(options["qrels"])
+        names = [name for name in options["index"].split(",") if name]
+        for name in names:
+            if name not in settings.SEARCH_INDEXES:
+                raise CommandError(f"Unknown index {name!r}")
+
+        results = {}
+        for name in names:
+            BSBI_instance = IndexRegistry.open(settings.SEARCH_INDEXES[name])
+            evaluator = Evaluator(BSBI_instance, queries, qrels, depth=options["depth"])
+            if not evaluator.queries:
+                raise CommandError("None of the queries have relevance judgments")
+            unknown = set(options["mode"] or []) - set(evaluator.modes())
+            if unknown:
+                raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}; "
+                                   f"available: {', '.join(evaluator.modes())}")
+
+            result = {
+                "postings_encoding": BSBI_instance.postings_encoding.__name__,
+                "size": index_size(BSBI_instance),
+                "modes": evaluator.evaluate_modes(options["mode"]),
+            }
+            if options["sweep"]:
+                result["sweep"] = evaluator.sweep_bm25(parse_range(options["k1"]), parse_range(options["b"]))
+            results[name] = result
+
+            self.stdout.write(f"{name} ({result['postings_encoding']}, {result['size']['total']} bytes, "
+                              f"{len(evaluator.queries)} queries)")
+            self.stdout.write(f"  {'mode':32} {'MAP':>7} {'nDCG@10':>8} {'R@100':>7} {'p50 ms':>8} {'p99 ms':>8}")
+            for mode, report in result["modes"].items():
+                self.stdout.write(f"  {mode:32} {report['map']:7.4f} {report['ndcg@10']:8.4f} "
+                                  f"{report['recall@100']:7.4f} {report['latency_ms']['p50']:8.2f} "
+                                  f"{report['latency_ms']['p99']:8.2f}")
+            if options["sweep"]:
+                self.stdout.write("  best BM25 parameters:")
+                for entry in result["sweep"][:5]:
+                    self.stdout.write(f"    k1={entry['k1']:<5} b={entry['b']:<5} MAP {entry['map']:.4f}  "
+                                      f"nDCG@10 {entry['ndcg@10']:.4f}  R@100 {entry['recall@100']:.4f}")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
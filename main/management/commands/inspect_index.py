@@ -0,0 +1,95 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.inspection import IndexInspector
+from main.engine.registry import IndexRegistry
+
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = ("Report where the bytes and decode time of an index go: size and memory per structure, "
+            "df and postings-size distributions, codec compression ratios, decode throughput of the "
+            "heaviest terms, and an integrity check of every postings offset.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", default=settings.SEARCH_DEFAULT_INDEX, help="index from SEARCH_INDEXES")
+        parser.add_argument("--index-name", help="inverted index file name to inspect, e.g. main_index_tier1 "
+                                                 "(default: the main index)")
+        parser.add_argument("--top", type=int, default=20, help="heaviest terms to measure decoding for")
+        parser.add_argument("--repeat", type=int, default=5, help="decode timings per term (best is reported)")
+        parser.add_argument("--max-postings", type=int, help="postings to re-encode per codec (default: all)")
+        parser.add_argument("--no-codecs", action="store_true", help="skip the codec comparison")
+        parser.add_argument("--check", action="store_true", help="only run the integrity check")
+        parser.add_argument("--output", help="write the report as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options["index"] not in settings.SEARCH_INDEXES:
+            raise CommandError(f"Unknown index {options['index']!r}")
+        inspector = IndexInspector(IndexRegistry.open(settings.SEARCH_INDEXES[options["index"]]),
+                                   options["index_name"])
+        try:
+            if options["check"]:
+                report = {"index_name": inspector.index_name, "integrity": inspector.check()}
+            else:
+                report = inspector.report(top=options["top"], repeat=options["repeat"],
+                                          max_postings=options["max_postings"],
+                                          compare_codecs=not options["no_codecs"])
+        except FileNotFoundError as e:
+            raise CommandError(f"Index files not found: {e.filename}")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        if not options["check"]:
+            self.write_report(report)
+
+        integrity = report["integrity"]
+        for error in integrity["errors"]:
+            self.stderr.write(error)
+        if integrity["unreferenced_bytes"]:
+            self.stdout.write(f"{format_bytes(integrity['unreferenced_bytes'])} of the index file are not "
+                              f"referenced by any term")
+        if not integrity["ok"]:
+            raise CommandError(f"{integrity['error_count']} integrity errors in {report['index_name']}")
+        self.stdout.write(self.style.SUCCESS(f"{integrity['terms_checked']} postings lists checked, no errors"))
+
+    def write_report(self, report):
+        self.stdout.write(f"{report['index_name']} ({report['postings_encoding']}, "
+                          f"{report['bitmap_terms']} postings lists as bitmaps)")
+        for filename, size in report["files"].items():
+            self.stdout.write(f"  {filename:28} {format_bytes(size):>12}")
+
+        self.stdout.write("\nStructures               entries      pickled       memory   bytes/entry")
+        for name, structure in report["structures"].items():
+            self.stdout.write(f"  {name:20} {structure['entries']:10} {format_bytes(structure['pickled_bytes']):>12} "
+                              f"{format_bytes(structure['memory_bytes']):>12} {structure['memory_per_entry']:13.1f}")
+
+        self.stdout.write("\nDistributions                 p50        p90        p99        max")
+        for name, summary in report["distributions"].items():
+            if summary["count"]:
+                self.stdout.write(f"  {name:20} {summary['p50']:10.1f} {summary['p90']:10.1f} "
+                                  f"{summary['p99']:10.1f} {summary['max']:10.1f}")
+        self.stdout.write("  df histogram: " + ", ".join(f"{low}-{high}: {n}" for low, high, n
+                                                         in report["distributions"]["df"].get("histogram", [])))
+
+        if "codecs" in report:
+            self.stdout.write(f"\nCodecs ({report['codecs']['postings']} postings)   postings          tf  "
+                              f"bits/posting  vs Standard")
+            for name, codec in report["codecs"]["codecs"].items():
+                ratio = f"{codec['ratio']:.2f}x" if codec["ratio"] else "-"
+                self.stdout.write(f"  {name:20} {format_bytes(codec['postings_bytes']):>12} "
+                                  f"{format_bytes(codec['tf_bytes']):>11} {codec['bits_per_posting']:13.2f} {ratio:>12}")
+
+        self.stdout.write("\nHeaviest terms                 df        bytes   decode us   Mpostings/s")
+        for term in report["decode"]:
+            self.stdout.write(f"  {str(term['term']):20} {term['df']:10} {format_bytes(term['bytes']):>12} "
+                              f"{term['decode_seconds'] * 1e6:11.1f} {term['postings_per_second'] / 1e6:13.2f}")
+        self.stdout.write("")
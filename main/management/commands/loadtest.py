@@ -0,0 +1,265 @@
+import re
+import json
+import time
+import random
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.benchmark import index_words, percentiles, sample_queries
+from main.engine.querylog import QueryLog, normalize_query
+
+DOC_LINK_PATTERN = re.compile(r'href="/doc/(\d+)/"')
+
+
+class HttpTarget:
+    """Requests against a running medbib server, the way a browser issues them."""
+
+    def __init__(self, base_url, timeout, index=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.index = index
+
+    def get(self, path, params=None):
+        url = self.base_url + path + ("?" + urllib.parse.urlencode(params) if params else "")
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                return response.status, response.read().decode("utf-8", errors="replace")
+        except urllib.error.HTTPError as e:
+            return e.code, ""
+
+    def search(self, query, page):
+        params = {"q": query, "page": page}
+        if self.index:
+            params["index"] = self.index
+        status, body = self.get("/search/", params)
+        return status, DOC_LINK_PATTERN.findall(body)
+
+    def doc(self, doc_id):
+        return self.get(f"/doc/{doc_id}/")[0], None
+
+
+class EngineTarget:
+    """The same work as the search and document views, called in-process without HTTP."""
+
+    def __init__(self, index=None):
+        from main import views
+        self.views = views
+        self.indexes = [index] if index else []
+        self.engine = views.get_engine(index)
+        self.doc_paths = {path.split("/")[-1][:-4]: path for path in self.engine.doc_id_map.id_to_str}
+
+    def search(self, query, page):
+        docs = self.views.get_serp(query, indexes=self.indexes)
+        return 200, [doc["id"] for doc in self.views.paginate(docs, page)]
+
+    def doc(self, doc_id):
+        doc_path = self.doc_paths.get(doc_id)
+        if doc_path is None:
+            return 404, None
+        engine_doc_id = self.engine.doc_id_map.str_to_id[doc_path]
+        self.engine.get_document(engine_doc_id)
+        self.views.get_related(doc_path)
+        return 200, None
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = Counter()
+        self.statuses = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, kind, latency, status):
+        with self.lock:
+            self.latencies.setdefault(kind, []).append(latency)
+            self.statuses[(kind, status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[kind] += 1
+
+    def report(self, elapsed):
+        with self.lock:
+            total = sum(len(latencies) for latencies in self.latencies.values())
+            report = {
+                "seconds": elapsed,
+                "requests": total,
+                "throughput": total / elapsed if elapsed else 0.0,
+                "errors": sum(self.errors.values()),
+                "error_rate": sum(self.errors.values()) / total if total else 0.0,
+                "by_type": {},
+            }
+            for kind, latencies in sorted(self.latencies.items()):
+                report["by_type"][kind] = {
+                    "requests": len(latencies),
+                    "errors": self.errors[kind],
+                    "error_rate": self.errors[kind] / len(latencies),
+                    "latency_ms": percentiles(latencies),
+                    "statuses": {str(status): n for (k, status), n in self.statuses.items() if k == kind},
+                }
+        return report
+
+
+class Command(BaseCommand):
+    help = ("Replay a query log (or synthetic queries) against the search and document views, "
+            "at a fixed arrival rate or a fixed concurrency, and report throughput, latency and errors.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of the medbib server")
+        parser.add_argument("--direct", action="store_true", help="call the engine in-process instead of over HTTP")
+        parser.add_argument("--index", help="index to query (default: the server's default index)")
+        parser.add_argument("--query-log", default=settings.SEARCH_QUERY_LOG, help="query log to replay")
+        parser.add_argument("--sample", action="store_true",
+                            help="sample queries by their frequency in the log instead of replaying them in order")
+        parser.add_argument("--synthetic", type=int, default=1000,
+                            help="number of synthetic queries to use when the query log is empty")
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument("--rate", type=float, help="sessions started per second (open loop, Poisson arrivals)")
+        mode.add_argument("--concurrency", type=int, default=8, help="concurrent sessions (closed loop)")
+        parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+        parser.add_argument("--max-workers", type=int, default=256, help="thread limit in --rate mode")
+        parser.add_argument("--page-prob", type=float, default=0.2, help="probability of opening the next results page")
+        parser.add_argument("--click-prob", type=float, default=0.5, help="probability of opening a result document")
+        parser.add_argument("--max-clicks", type=int, default=3, help="documents opened at most per results page")
+        parser.add_argument("--think-time", type=float, default=0.0, help="seconds between requests of a session")
+        parser.add_argument("--timeout", type=float, default=10.0, help="HTTP timeout in seconds")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write the report as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options["index"] and options["index"] not in settings.SEARCH_INDEXES:
+            raise CommandError(f"Unknown index {options['index']!r}")
+        for name in ("page_prob", "click_prob"):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1")
+
+        if options["direct"]:
+            target = EngineTarget(options["index"])
+        else:
+            target = HttpTarget(options["url"], options["timeout"], options["index"])
+            if options["query_log"] and options["query_log"] == settings.SEARCH_QUERY_LOG:
+                # the server appends every search to its query log; replaying that log would feed it back
+                self.stderr.write("Replaying SEARCH_QUERY_LOG over HTTP: start the server with SEARCH_QUERY_LOG=\"\" "
+                                  "so that the load test does not end up in its own query log.")
+        next_query = self.query_source(options)
+        stats = LoadStats()
+
+        start = time.perf_counter()
+        deadline = start + options["duration"]
+        if options["rate"]:
+            self.run_open_loop(target, next_query, stats, options, deadline)
+        else:
+            self.run_closed_loop(target, next_query, stats, options, deadline)
+        report = stats.report(time.perf_counter() - start)
+        report["config"] = {
+            "target": "engine" if options["direct"] else options["url"],
+            "mode": f"rate={options['rate']}/s" if options["rate"] else f"concurrency={options['concurrency']}",
+            "page_prob": options["page_prob"],
+            "click_prob": options["click_prob"],
+        }
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(f"{report['requests']} requests in {report['seconds']:.1f}s: "
+                          f"{report['throughput']:.1f} req/s, error rate {report['error_rate']:.2%}")
+        for kind, summary in report["by_type"].items():
+            latency = summary["latency_ms"]
+            self.stdout.write(f"{kind:7} {summary['requests']:7} req  p50 {latency['p50']:8.2f} ms  "
+                              f"p90 {latency['p90']:8.2f} ms  p99 {latency['p99']:8.2f} ms  "
+                              f"errors {summary['error_rate']:.2%}")
+
+    def query_source(self, options):
+        """A thread-safe callable returning the next query to run."""
+        rng = random.Random(options["seed"])
+        log = QueryLog(options["query_log"] or None)
+        if options["sample"]:
+            counts = log.counts()
+            queries, weights = list(counts), list(counts.values())
+        else:
+            queries = [query for query in (normalize_query(entry["q"]) for entry in log) if query]
+            weights = None
+        if not queries:
+            from main import views
+            engine = views.get_engine(options["index"])
+            queries = sample_queries(index_words(engine), options["synthetic"], options["seed"])
+            self.stdout.write(f"Query log is empty, using {len(queries)} synthetic queries")
+
+        lock = threading.Lock()
+        position = 0
+
+        def next_query():
+            nonlocal position
+            with lock:
+                if weights is not None:
+                    return rng.choices(queries, weights)[0]
+                query = queries[position % len(queries)]
+                position += 1
+                return query
+        return next_query
+
+    def session(self, target, query, stats, options, scheduled, rng):
+        """
+        One user: a search, then (with --page-prob) further results pages, and
+        (with --click-prob) clicks on documents of each page. The latency of the
+        first request counts from its scheduled start, so that queueing delay in
+        --rate mode is not hidden.
+        """
+        page = 1
+        while True:
+            status, doc_ids = self.timed(stats, "search" if page == 1 else "page", target.search, scheduled, query, page)
+            scheduled = None
+            clicks = 0
+            for doc_id in doc_ids or []:
+                if clicks >= options["max_clicks"] or rng.random() >= options["click_prob"]:
+                    break
+                self.think(options)
+                self.timed(stats, "doc", target.doc, None, doc_id)
+                clicks += 1
+            if not doc_ids or len(doc_ids) < 10 or rng.random() >= options["page_prob"]:
+                return
+            self.think(options)
+            page += 1
+
+    @staticmethod
+    def timed(stats, kind, function, scheduled, *args):
+        start = time.perf_counter() if scheduled is None else scheduled
+        try:
+            status, result = function(*args)
+        except Exception as e:
+            status, result = type(e).__name__, None
+        stats.add(kind, time.perf_counter() - start, status)
+        return status, result
+
+    @staticmethod
+    def think(options):
+        if options["think_time"]:
+            time.sleep(options["think_time"])
+
+    def run_closed_loop(self, target, next_query, stats, options, deadline):
+        def user(number):
+            rng = random.Random(options["seed"] * 1000003 + number)
+            while time.perf_counter() < deadline:
+                self.session(target, next_query(), stats, options, None, rng)
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            list(executor.map(user, range(options["concurrency"])))
+
+    def run_open_loop(self, target, next_query, stats, options, deadline):
+        rng = random.Random(options["seed"])
+        scheduled = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["max_workers"]) as executor:
+            number = 0
+            while scheduled < deadline:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.session, target, next_query(), stats, options, scheduled,
+                                random.Random(options["seed"] * 1000003 + number))
+                number += 1
+                scheduled += rng.expovariate(options["rate"])
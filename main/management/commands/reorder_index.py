@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.engine.build import IndexBuilder
+from main.engine.registry import IndexRegistry
+from main.engine.reorder import DocIdReassigner
+
+from .build_index import format_bytes
+
+
+class Command(BaseCommand):
+    help = ("Reassign document ids so that similar documents get nearby ids (smaller postings gaps). "
+            "The reorder is recorded in the build manifest, and derived indexes are rebuilt.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", default=settings.SEARCH_DEFAULT_INDEX,
+                            help="name of the index in SEARCH_INDEXES")
+        parser.add_argument("--method", choices=DocIdReassigner.METHODS + ("none",), default="bisection",
+                            help="reordering method; 'none' restores the original document order")
+        parser.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options["index"] not in settings.SEARCH_INDEXES:
+            raise CommandError(f"Unknown index {options['index']!r}")
+
+        BSBI_instance = IndexRegistry.open(settings.SEARCH_INDEXES[options["index"]])
+        manifest = IndexBuilder(BSBI_instance).load_manifest()
+        if manifest is None or not manifest.get("done"):
+            raise CommandError(f"{options['index']!r} has no finished build; run build_index first")
+        # reuse the fan-in of the finished build so its blocks and merges are not redone
+        builder = IndexBuilder(BSBI_instance, fan_in=manifest["config"]["fan_in"], reorder=options["method"],
+                               progress=None if options["json"] else self.stdout.write)
+        report = builder.run()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        phase = report["reorder"]
+        if phase["method"] is None:
+            self.stdout.write("reorder:  original document order")
+        elif phase["skipped"]:
+            self.stdout.write(f"reorder:  already reordered with {phase['method']}")
+        else:
+            self.stdout.write(
+                f"reorder:  {phase['method']} in {phase['seconds']:.2f}s - index "
+                f"{format_bytes(phase['index_bytes_before'])} -> {format_bytes(phase['index_bytes_after'])}, "
+                f"log2(gap) {phase['log2_gap_before']:.3f} -> {phase['log2_gap_after']:.3f} bits per posting, "
+                f"decode {phase['decode_seconds_before']:.3f}s -> {phase['decode_seconds_after']:.3f}s")
+        phase = report["finalize"]
+        if not phase["skipped"]:
+            self.stdout.write(f"finalize: derived indexes rebuilt: {', '.join(phase['derived']) or 'none'}")
+        self.stdout.write(self.style.SUCCESS(f"Index in {os.path.abspath(BSBI_instance.output_dir)} is up to date"))
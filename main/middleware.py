@@ -0,0 +1,63 @@
+import asyncio
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from main import views
+from main.engine.metrics import collect, metrics_registry
+from main.engine.querylog import QueryLog
+
+# view yang query-nya dicatat di slow-query log
+SLOW_QUERY_VIEWS = {"search", "api-search"}
+
+slow_query_log = QueryLog(settings.SEARCH_SLOW_QUERY_LOG or None, settings.SEARCH_SLOW_QUERY_LOG_MAX_BYTES)
+
+
+def log_slow_query(request, response, view, timer, total):
+    """
+    Mencatat search yang lebih lambat dari SEARCH_SLOW_QUERY_MS ke slow-query
+    log: term hasil analisis beserta df dan ukuran postings-nya, counter
+    pekerjaan (postings_bytes, docs_scored), dan durasi setiap tahap. Statistik
+    term sudah dicatat ke timer selama query dikerjakan (lihat record_terms),
+    sehingga index tidak dibuka lagi di sini.
+    """
+    if not slow_query_log.path or view not in SLOW_QUERY_VIEWS or "q" not in request.GET:
+        return
+    if total * 1000 < settings.SEARCH_SLOW_QUERY_MS:
+        return
+    query = request.GET["q"]
+    index_name = (request.GET.get("index") or views.index_registry.default).split(",")[0]
+    slow_query_log.append(query, view=view, index=index_name, status=response.status_code, \
+                          total_ms=round(total * 1000, 3), \
+                          stages={name: round(seconds * 1000, 3) for name, (seconds, _) in timer.stages.items()}, \
+                          counters=dict(timer.counters), terms=timer.terms or [])
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """
+    Mengukur setiap request per tahap (lihat main.engine.metrics), mengirim
+    hasilnya di header Server-Timing, dan mencatatnya ke histogram /metrics.
+    """
+    def finish(request, response, timer):
+        total = timer.elapsed()
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else "other"
+        if view not in ("metrics", "ready"):
+            metrics_registry.observe_timer(timer, total, view=view)
+        log_slow_query(request, response, view, timer, total)
+        if settings.SEARCH_SERVER_TIMING:
+            response["Server-Timing"] = timer.server_timing(total)
+        return response
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            with collect() as timer:
+                response = await get_response(request)
+            return finish(request, response, timer)
+    else:
+        def middleware(request):
+            with collect() as timer:
+                response = get_response(request)
+            return finish(request, response, timer)
+    return middleware
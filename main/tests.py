@@ -1,3 +1,869 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import json
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from main.engine import shard_server
+from main.engine.benchmark import SyntheticCorpus
+from main.engine.bitmap import RoaringBitmap
+from main.engine.bsbi import BSBIIndex
+from main.engine.build import IndexBuilder, file_checksum
+from main.engine.hitcount import HitCounter
+from main.engine.rerank import LsiReranker
+from main.engine.similar import SimilarDocuments
+from main.engine.compression import VBEPostings
+from main.engine.index import InvertedIndexReader, InvertedIndexWriter, PostingsCache, evict_metadata, postings_cache
+from main.engine.querylog import QueryLog
+from main.engine.registry import IndexRegistry
+from main.engine.shard import ShardedIndex, load_shard_stats
+from main.engine.snippet import SnippetIndex
+from main.engine.tier import TierIndex
+from main.engine.util import process_text
+from main import middleware, views
+
+
+def build_index(work_dir, num_docs=400, docs_per_block=100, seed=0, **options):
+    """Corpus sintetis kecil di work_dir beserta index-nya (lewat IndexBuilder)"""
+    corpus = SyntheticCorpus(os.path.join(work_dir, "collection"), num_docs, docs_per_block=docs_per_block,
+                             mean_length=60, seed=seed)
+    corpus.generate()
+    output_dir = os.path.join(work_dir, "index")
+    os.makedirs(output_dir, exist_ok=True)
+    BSBI_instance = IndexRegistry.open({"data_dir": corpus.data_dir, "output_dir": output_dir})
+    IndexBuilder(BSBI_instance, **options).run()
+    return corpus, BSBI_instance
+
+
+def reopen(BSBI_instance):
+    """BSBIIndex yang sama dibuka ulang dari disk, tanpa metadata dan postings yang masih di-cache"""
+    evict_metadata(BSBI_instance.output_dir)
+    postings_cache.clear()
+    return IndexRegistry.open({"data_dir": BSBI_instance.data_dir, "output_dir": BSBI_instance.output_dir})
+
+
+class IndexTestCase(SimpleTestCase):
+    """Satu index sintetis per class, dibangun di direktori sementara"""
+
+    num_docs = 400
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.work_dir = tempfile.mkdtemp(prefix="medbib-test-")
+        cls.corpus, cls.index = build_index(cls.work_dir, cls.num_docs)
+
+    @classmethod
+    def tearDownClass(cls):
+        evict_metadata(cls.index.output_dir)
+        shutil.rmtree(cls.work_dir, ignore_errors=True)
+        super().tearDownClass()
+
+
+class SnippetIndexTests(IndexTestCase):
+    def test_documents_are_read_from_disk(self):
+        snippets = reopen(self.index).snippet_index
+        self.assertEqual(snippets.pending, {})
+        self.assertEqual(len(snippets), self.num_docs)
+        for doc_id in (0, 17, self.num_docs - 1):
+            doc_path = self.index.doc_id_map[doc_id]
+            with open(doc_path) as f:
+                expected = SnippetIndex.create(doc_path, f.read())
+            document = snippets.get(doc_id, doc_path)
+            self.assertEqual((document.title, document.content, document.sentences),
+                             (expected.title, expected.content, expected.sentences))
+            self.assertEqual(document.postings, expected.postings)
+
+    def test_cache_is_bounded(self):
+        snippets = SnippetIndex(self.index.snippet_index.path, cache_size=4)
+        snippets.load()
+        for doc_id in range(10):
+            snippets.get(doc_id, self.index.doc_id_map[doc_id])
+        self.assertEqual(list(snippets.cache), [6, 7, 8, 9])
+
+    def test_remap(self):
+        snippets = SnippetIndex(self.index.snippet_index.path)
+        snippets.load()
+        titles = [snippets.get(doc_id, None).title for doc_id in range(3)]
+        snippets.remap({0: 2, 1: 0, 2: 1})
+        self.assertEqual([snippets.get(doc_id, None).title for doc_id in range(3)],
+                         [titles[1], titles[2], titles[0]])
+
+
+class RoaringBitmapTests(SimpleTestCase):
+    def random_sets(self, rng, count):
+        """Himpunan docID acak: kosong, jarang, padat, dan yang mencakup beberapa container"""
+        sets = [set(), {0}, {65535, 65536}, set(range(65536)), set(range(70000, 70000 + 4096, 3))]
+        for _ in range(count):
+            universe = rng.choice([100, 5000, 1 << 16, 300000])
+            density = rng.choice([0.001, 0.05, 0.3, 0.9])
+            sets.append({doc_id for doc_id in range(universe) if rng.random() < density})
+        return sets
+
+    def assertBitmapEqual(self, bitmap, doc_ids):
+        self.assertEqual(bitmap.to_array().tolist(), sorted(doc_ids))
+        self.assertEqual(len(bitmap), len(doc_ids))
+
+    def test_round_trip(self):
+        for doc_ids in self.random_sets(random.Random(0), 20):
+            bitmap = RoaringBitmap.from_sorted(sorted(doc_ids))
+            self.assertBitmapEqual(bitmap, doc_ids)
+            self.assertBitmapEqual(RoaringBitmap.from_bytes(bitmap.to_bytes()), doc_ids)
+
+    def test_union_and_intersection(self):
+        rng = random.Random(1)
+        sets = self.random_sets(rng, 20)
+        for _ in range(200):
+            group = rng.sample(sets, rng.randint(1, 4))
+            bitmaps = [RoaringBitmap.from_bytes(RoaringBitmap.from_sorted(sorted(doc_ids)).to_bytes()) for doc_ids in group]
+            self.assertBitmapEqual(RoaringBitmap.combine(bitmaps), set.union(*group))
+            self.assertBitmapEqual(RoaringBitmap.combine(bitmaps, conjunctive=True), set.intersection(*group))
+            self.assertBitmapEqual(bitmaps[0] | bitmaps[-1], group[0] | group[-1])
+            self.assertBitmapEqual(bitmaps[0] & bitmaps[-1], group[0] & group[-1])
+
+    def test_bitmap_postings_in_index(self):
+        directory = tempfile.mkdtemp(prefix="medbib-test-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(evict_metadata, directory)
+        rng = random.Random(2)
+        postings = {
+            0: list(range(0, 2000, 2)),                                  # padat: bitmap
+            1: sorted(rng.sample(range(2000), 40)),                      # jarang: VBE
+            2: list(range(2000)),                                        # semua dokumen
+        }
+        with InvertedIndexWriter("bitmap_test", VBEPostings, directory=directory) as writer:
+            for term_id, postings_list in postings.items():
+                writer.append(term_id, postings_list, [1 + doc_id % 3 for doc_id in postings_list])
+        with InvertedIndexReader("bitmap_test", VBEPostings, directory=directory) as reader:
+            self.assertEqual([reader.is_bitmap(term_id) for term_id in postings], [True, False, True])
+            for term_id, postings_list in postings.items():
+                decoded, tfs = reader.get_decoded_postings(term_id)
+                self.assertEqual(list(decoded), postings_list)
+                self.assertEqual(list(tfs), [1 + doc_id % 3 for doc_id in postings_list])
+                self.assertBitmapEqual(reader.get_bitmap(term_id), postings_list)
+            reader.reset()
+            self.assertEqual([(term_id, list(postings_list)) for term_id, postings_list, _ in reader],
+                             list(postings.items()))
+            union = RoaringBitmap.combine([reader.get_bitmap(term_id) for term_id in postings])
+            self.assertBitmapEqual(union, set().union(*postings.values()))
+
+
+class QueryLogTests(SimpleTestCase):
+    def test_log_is_rotated_by_size(self):
+        directory = tempfile.mkdtemp(prefix="medbib-test-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        log = QueryLog(os.path.join(directory, "queries.log"), max_bytes=1024)
+        for i in range(200):
+            log.append(f"query {i}", index="default")
+        self.assertLessEqual(os.path.getsize(log.path), 1024)
+        self.assertLessEqual(os.path.getsize(log.rotated_path), 1024 + 100)
+        queries = [entry["q"] for entry in log]
+        self.assertLess(len(queries), 200)
+        self.assertEqual(queries, [f"query {i}" for i in range(200 - len(queries), 200)])
+
+    def test_disabled_log(self):
+        log = QueryLog(None)
+        log.append("query")
+        self.assertEqual(list(log), [])
+
+
+class CursorPaginationTests(IndexTestCase):
+    def test_pages_equal_top_n_slices(self):
+        for query in self.corpus.queries(20):
+            expected = self.index.retrieve_bm25(query, k=35)
+            pages, cursor = [], None
+            while True:
+                page, cursor = self.index.retrieve_bm25_after(query, k=10, after=cursor)
+                pages.extend(page)
+                if cursor is None or len(pages) >= 35:
+                    break
+            self.assertEqual(pages[:35], expected, query)
+
+    def test_last_page_has_no_cursor(self):
+        query = self.corpus.queries(1)[0]
+        total = len(self.index.retrieve_bm25(query, k=self.num_docs))
+        page, cursor = self.index.retrieve_bm25_after(query, k=total + 1)
+        self.assertEqual(len(page), total)
+        self.assertIsNone(cursor)
+
+    def test_weights_cache_is_shared_between_threads(self):
+        queries = self.corpus.queries(20)
+        expected = {query: self.index.retrieve_bm25(query, k=10) for query in queries}
+        cache = PostingsCache(16 * 1024)
+        errors = []
+
+        def search(offset):
+            try:
+                for query in queries[offset:] + queries[:offset]:
+                    self.assertEqual(self.index.retrieve_bm25_after(query, k=10)[0], expected[query], query)
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch.object(self.index, "term_weights_cache", cache):
+            threads = [threading.Thread(target=search, args=(offset,)) for offset in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertGreater(cache.evictions, 0)
+        self.assertLessEqual(cache.current_bytes, cache.max_bytes)
+
+
+class ShardedIndexTests(IndexTestCase):
+    def test_shards_equal_full_index(self):
+        sharded = ShardedIndex(self.index, num_shards=3, workers=1)
+        sharded.build()
+        try:
+            for query in self.corpus.queries(20):
+                self.assertEqual(sharded.retrieve_bm25(query, k=10), self.index.retrieve_bm25(query, k=10), query)
+        finally:
+            sharded.close()
+
+
+class ShardProtocolTests(SimpleTestCase):
+    def test_bm25_frames(self):
+        payload = shard_server.encode_request(7, shard_server.OP_BM25, 10, 1.6, 0.75, [(3, 0.5), (42, 1.25)])
+        self.assertEqual(shard_server.decode_request(payload), (7, shard_server.OP_BM25, 10, 1.6, 0.75,
+                                                                [(3, 0.5), (42, 1.25)]))
+        payload = shard_server.encode_response(7, shard_server.STATUS_OK, [(2.5, 11), (1.0, 4)])
+        self.assertEqual(shard_server.decode_response(payload), (7, shard_server.STATUS_OK, [(2.5, 11), (1.0, 4)]))
+
+    def test_docs_frames(self):
+        payload = shard_server.encode_docs_request(9, [5, 1, 300], ["blood", "pressur"])
+        self.assertEqual(shard_server.REQUEST_PREFIX.unpack_from(payload), (9, shard_server.OP_DOCS))
+        self.assertEqual(shard_server.decode_docs_request(payload), (9, [5, 1, 300], ["blood", "pressur"]))
+        documents = [(5, "Fetal heart rate", "<p><b>Blood</b> pressure ...</p>"), (1, "", ""), (300, "Ünïcode", "é")]
+        payload = shard_server.encode_docs_response(9, shard_server.STATUS_OK, documents)
+        self.assertEqual(shard_server.decode_docs_response(payload), (9, shard_server.STATUS_OK, documents))
+
+    def test_frames_over_a_socket(self):
+        left, right = socket.socketpair()
+        with left, right:
+            shard_server.send_frame(left, b"abc" * 1000)
+            shard_server.send_frame(left, b"")
+            self.assertEqual(shard_server.recv_frame(right), b"abc" * 1000)
+            self.assertEqual(shard_server.recv_frame(right), b"")
+            left.close()
+            self.assertIsNone(shard_server.recv_frame(right))
+
+
+class ShardServerTests(IndexTestCase):
+    num_shards = 2
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sharded = ShardedIndex(cls.index, num_shards=cls.num_shards)
+        sharded.build()
+        cls.servers, addresses = [], []
+        for shard_id in range(cls.num_shards):
+            address = f"unix:{os.path.join(cls.work_dir, f'shard-{shard_id}.sock')}"
+            server = shard_server.make_server(address, cls.index.output_dir, cls.index.index_name, shard_id)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            cls.servers.append(server)
+            addresses.append([address])
+        cls.aggregator = shard_server.ShardAggregator(sharded.load(), addresses, timeout=5.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.aggregator.close()
+        for server in cls.servers:
+            server.shutdown()
+            server.server_close()
+        super().tearDownClass()
+
+    def test_aggregator_equals_full_index(self):
+        for query in self.corpus.queries(10):
+            self.assertEqual(self.aggregator.retrieve_bm25(query, k=10), self.index.retrieve_bm25(query, k=10), query)
+            self.assertEqual(self.aggregator.last_missing, [])
+
+    def test_documents_from_shards(self):
+        query = self.corpus.queries(1)[0]
+        query_terms = process_text(query)
+        doc_ids = [self.index.doc_id_map.str_to_id[doc_path] for _, doc_path in self.index.retrieve_bm25(query, k=10)]
+        documents = self.aggregator.documents(doc_ids, query_terms)
+        self.assertEqual(sorted(documents), sorted(doc_ids))
+        for doc_id in doc_ids:
+            document = self.index.get_document(doc_id)
+            self.assertEqual(documents[doc_id], (document.title, document.snippet(query_terms)))
+
+
+class TierIndexTests(IndexTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index.build_tier_index(fraction=0.1, min_postings=4)
+
+    def test_tier_equals_full_top_k(self):
+        tier_index = self.index.tier_index
+        answered = tier_index.tier1_queries
+        queries = self.corpus.queries(50) + [query.split()[0] for query in self.corpus.queries(50)]
+        for query in queries:
+            for k in (1, 10):
+                self.index.tier_index = tier_index
+                tiered = self.index.retrieve_bm25(query, k=k)
+                self.index.tier_index = None
+                self.assertEqual(tiered, self.index.retrieve_bm25(query, k=k), query)
+        self.index.tier_index = tier_index
+        self.assertGreater(tier_index.tier1_queries, answered)
+
+    def test_stale_tier_is_not_loaded(self):
+        self.assertIsNotNone(reopen(self.index).tier_index)
+        work_dir = tempfile.mkdtemp(prefix="medbib-test-")
+        try:
+            _, rebuilt = build_index(work_dir, self.num_docs // 2, seed=1)
+            for suffix in (".index", ".dict", ".bounds"):
+                filename = self.index.index_name + "_tier1" + suffix
+                shutil.copy(os.path.join(self.index.output_dir, filename), os.path.join(rebuilt.output_dir, filename))
+            self.assertTrue(TierIndex.exists(rebuilt.output_dir, rebuilt.index_name))
+            rebuilt = reopen(rebuilt)
+            self.assertIsNone(rebuilt.tier_index)
+            # docID dari tier satu yang basi tidak ada di doc_id_map index yang baru
+            for query in self.corpus.queries(10):
+                rebuilt.retrieve_bm25(query, k=10)
+        finally:
+            evict_metadata(os.path.join(work_dir, "index"))
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class BuildTestCase(IndexTestCase):
+    """Build di output directory sementara per test, dari koleksi IndexTestCase"""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp(prefix="medbib-test-")
+        self.addCleanup(shutil.rmtree, self.output_dir, ignore_errors=True)
+        self.addCleanup(evict_metadata, self.output_dir)
+
+    def open_index(self, data_dir=None):
+        return IndexRegistry.open({"data_dir": data_dir or self.corpus.data_dir, "output_dir": self.output_dir})
+
+    def assertSameIndex(self, index):
+        index = reopen(index)
+        self.assertEqual(index.doc_id_map.id_to_str, self.index.doc_id_map.id_to_str)
+        self.assertEqual(index.term_id_map.id_to_str, self.index.term_id_map.id_to_str)
+        for query in self.corpus.queries(20):
+            self.assertEqual(index.retrieve_bm25(query, k=10), self.index.retrieve_bm25(query, k=10), query)
+
+
+class IndexBuilderTests(BuildTestCase):
+    def test_resume_after_killed_block(self):
+        index = self.open_index()
+        index_block, indexed = index.index_block, []
+
+        def killed_at_third_block(block):
+            if len(indexed) == 2:
+                raise KeyboardInterrupt
+            indexed.append(block)
+            return index_block(block)
+
+        with mock.patch.object(index, "index_block", side_effect=killed_at_third_block):
+            with self.assertRaises(KeyboardInterrupt):
+                IndexBuilder(index).run()
+        index = self.open_index()
+        report = IndexBuilder(index).run()
+        self.assertEqual((report["index"]["resumed_blocks"], report["index"]["blocks"]), (2, 2))
+        self.assertSameIndex(index)
+
+    def test_resume_after_checksum_mismatch(self):
+        index = self.open_index()
+        builder = IndexBuilder(index)
+        builder.run()
+        blocks = index.blocks()
+        index_id = builder.load_manifest()["blocks"][blocks[1]]["index_id"]
+        with open(os.path.join(self.output_dir, index_id + ".index"), "ab") as f:
+            f.write(b"\0")
+        index = self.open_index()
+        report = IndexBuilder(index).run()
+        self.assertEqual((report["index"]["resumed_blocks"], report["index"]["blocks"]), (1, len(blocks) - 1))
+        self.assertEqual(report["merge"]["merges"], 1)
+        self.assertSameIndex(index)
+
+    def test_finished_build_is_not_redone(self):
+        index = self.open_index()
+        IndexBuilder(index).run()
+        report = IndexBuilder(self.open_index()).run()
+        self.assertEqual((report["index"]["blocks"], report["merge"]["merges"], report["finalize"]["skipped"]),
+                         (0, 0, True))
+
+    def test_derived_indexes_are_rebuilt(self):
+        data_dir = os.path.join(self.output_dir, "collection")
+        shutil.copytree(self.corpus.data_dir, data_dir)
+        index = self.open_index(data_dir)
+        IndexBuilder(index).run()
+        index.build_tier_index(min_postings=4)
+        index.build_similar_docs(k=5)
+        index.build_reranker(num_topics=5)
+        ShardedIndex(index, num_shards=2).build()
+
+        shutil.rmtree(os.path.join(data_dir, index.blocks()[-1]))
+        index = self.open_index(data_dir)
+        report = IndexBuilder(index).run()
+        self.assertEqual(sorted(report["finalize"]["derived"]), ["lsi", "shards", "similar", "tier"])
+        for phase in ("index", "merge", "finalize"):
+            self.assertGreater(report[phase]["peak_rss"], 0)
+
+        index = reopen(index)
+        N = len(index.doc_id_map)
+        self.assertLess(N, self.num_docs)
+        self.assertIsNotNone(index.tier_index)
+        self.assertEqual(index.tier_index.build_params()["min_postings"], 4)
+        self.assertEqual(SimilarDocuments(self.output_dir).load().neighbours_matrix.shape, (N, 5))
+        self.assertEqual(LsiReranker(self.output_dir).load().docs.shape, (N, 5))
+        self.assertEqual(load_shard_stats(self.output_dir, index.index_name)["N"], N)
+        manifest = IndexBuilder(index).load_manifest()
+        self.assertEqual(manifest["derived"]["shards"]["params"], {"num_shards": 2})
+        self.assertTrue(all(IndexBuilder(index).verify(entry) for entry in manifest["derived"].values()))
+        for query in self.corpus.queries(10):
+            index.retrieve_bm25(query, k=10)
+
+    def test_build_index_creates_tier_index(self):
+        def build_index(*args):
+            out = io.StringIO()
+            call_command("build_index", "--data-dir", self.corpus.data_dir, "--output-dir", self.output_dir, "--json",
+                         *args, stdout=out)
+            return json.loads(out.getvalue())
+
+        report = build_index("--tier-min-postings", "4")
+        self.assertEqual(report["finalize"]["derived"], ["tier"])
+        index = self.open_index()
+        self.assertIsNotNone(index.tier_index)
+        self.assertEqual(IndexBuilder(index).load_manifest()["derived"]["tier"]["params"], {"min_postings": 4})
+
+        # parameter baru untuk build yang sudah selesai hanya menjalankan ulang finalize
+        report = build_index("--tier-fraction", "0.2")
+        self.assertEqual((report["index"]["blocks"], report["merge"]["merges"], report["finalize"]["skipped"]),
+                         (0, 0, False))
+        self.assertEqual(self.open_index().tier_index.build_params()["fraction"], 0.2)
+        self.assertEqual(self.open_index().tier_index.build_params()["min_postings"], 4)
+        self.assertTrue(build_index("--tier-fraction", "0.2")["finalize"]["skipped"])
+
+        report = build_index("--similar-k", "3", "--lsi-topics", "4")
+        self.assertEqual(sorted(report["finalize"]["derived"]), ["lsi", "similar", "tier"])
+        index = self.open_index()
+        self.assertEqual(index.similar_docs.k, 3)
+        self.assertEqual(index.reranker.docs.shape[1], 4)
+
+    def test_build_suggest_command(self):
+        IndexBuilder(self.open_index()).run()
+        query_log = QueryLog(os.path.join(self.output_dir, "queries.log"))
+        for _ in range(3):
+            query_log.append("zebrafish embryo", index="default")
+        config = {"data_dir": self.corpus.data_dir, "output_dir": self.output_dir}
+        with override_settings(SEARCH_INDEXES={"default": config}, SEARCH_DEFAULT_INDEX="default"):
+            call_command("build_suggest", "--query-log", query_log.path, stdout=io.StringIO())
+        self.assertIn("zebrafish embryo", self.open_index().suggest_index.suggest("zebra"))
+
+
+class ReorderBuildTests(BuildTestCase):
+    def results(self, index, query):
+        return sorted(index.retrieve_bm25(query, k=self.num_docs))
+
+    def test_reorder_survives_rebuild(self):
+        index = self.open_index()
+        IndexBuilder(index).run()
+        index.build_tier_index(min_postings=4)
+        report = IndexBuilder(index, reorder="terms").run()
+        self.assertFalse(report["reorder"]["skipped"])
+        self.assertEqual(report["finalize"]["derived"], ["tier"])
+        self.assertLessEqual(report["reorder"]["log2_gap_after"], report["reorder"]["log2_gap_before"])
+        self.assertGreater(report["reorder"]["decode_seconds_after"], 0)
+        reordered = reopen(index)
+        self.assertEqual(reordered.tier_index.build_params()["min_postings"], 4)
+        self.assertNotEqual(reordered.doc_id_map.id_to_str, self.index.doc_id_map.id_to_str)
+        main_index = os.path.join(self.output_dir, index.index_name + ".index")
+        checksum = file_checksum(main_index)
+
+        report = IndexBuilder(self.open_index()).run()
+        self.assertEqual((report["merge"]["merges"], report["reorder"]["skipped"], report["finalize"]["skipped"]),
+                         (0, True, True))
+        self.assertEqual(file_checksum(main_index), checksum)
+        index = reopen(index)
+        self.assertEqual(index.doc_id_map.id_to_str, reordered.doc_id_map.id_to_str)
+        self.assertIsNotNone(index.tier_index)
+        for query in self.corpus.queries(20):
+            self.assertEqual(self.results(index, query), self.results(self.index, query), query)
+            self.assertEqual(index.retrieve_bm25(query, k=10), reordered.retrieve_bm25(query, k=10), query)
+
+    def test_reorder_none_restores_original_order(self):
+        index = self.open_index()
+        IndexBuilder(index, reorder="bisection").run()
+        report = IndexBuilder(self.open_index(), reorder="none").run()
+        self.assertEqual(report["merge"]["merges"], 1)
+        self.assertIsNone(IndexBuilder(index).load_manifest()["reorder"])
+        self.assertSameIndex(index)
+
+    def test_reorder_index_command(self):
+        IndexBuilder(self.open_index()).run()
+        config = {"data_dir": self.corpus.data_dir, "output_dir": self.output_dir}
+        with override_settings(SEARCH_INDEXES={"default": config}, SEARCH_DEFAULT_INDEX="default"):
+            stdout = io.StringIO()
+            call_command("reorder_index", "--method", "terms", stdout=stdout)
+        self.assertIn("reorder:  terms", stdout.getvalue())
+        self.assertIn("decode", stdout.getvalue())
+        self.assertEqual(IndexBuilder(self.open_index()).load_manifest()["reorder"]["method"], "terms")
+
+
+class HitCountTests(BuildTestCase):
+    def postings(self, index):
+        with InvertedIndexReader(index.index_name, index.postings_encoding, directory=index.output_dir) as reader:
+            return {index.term_id_map[term_id]: set(postings) for term_id, postings, _ in reader}
+
+    def frequent_query(self, index):
+        """
+        Term paling sering (bitmap, dengan sketch yang terpotong) dan term
+        non-bitmap paling sering: hanya term non-bitmap yang dihitung terhadap
+        exact_limit, karena union bitmap dikerjakan tanpa decode
+        """
+        with InvertedIndexReader(index.index_name, index.postings_encoding, directory=index.output_dir) as reader:
+            by_df = sorted(reader.postings_dict, key=lambda term_id: -reader.postings_dict[term_id][1])
+            dense = by_df[0]
+            sparse = next(term_id for term_id in by_df if not reader.is_bitmap(term_id))
+            self.assertGreater(reader.postings_dict[dense][1], index.hit_counter.k)
+        return f"{index.term_id_map[dense]} {index.term_id_map[sparse]}"
+
+    def test_sketches_are_built_for_small_collections(self):
+        hit_counter = self.index.hit_counter
+        self.assertEqual(hit_counter.min_df, hit_counter.default_min_df(self.num_docs))
+        self.assertLess(hit_counter.min_df, self.num_docs)
+        self.assertTrue(hit_counter.sketches)
+        self.assertTrue(all(len(sketch) == hit_counter.k for sketch in hit_counter.sketches.values()))
+
+    def test_exact_and_estimated_counts(self):
+        postings = self.postings(self.index)
+        by_df = sorted(postings, key=lambda term: -len(postings[term]))
+        for query in self.corpus.queries(10) + [" ".join(by_df[:3]), self.frequent_query(self.index)]:
+            terms = [term for term in query.split() if term in postings]
+            for conjunctive in (False, True):
+                combine = set.intersection if conjunctive else set.union
+                expected = len(combine(*[postings[term] for term in terms])) if terms else 0
+                self.assertEqual(self.index.count_matches(query, conjunctive), (expected, True), query)
+
+        query = self.frequent_query(self.index)
+        exact, _ = self.index.count_matches(query)
+        estimate, hits_exact = self.index.count_matches(query, exact_limit=0)
+        self.assertFalse(hits_exact)
+        self.assertLess(abs(estimate - exact) / exact, 0.25)
+
+    def test_api_reports_estimated_hits(self):
+        registry = IndexRegistry({"default": {"data_dir": self.index.data_dir, "output_dir": self.index.output_dir}},
+                                 default="default")
+        query = self.frequent_query(self.index)
+        with mock.patch.object(views, "index_registry", registry), \
+             mock.patch.object(views.query_log, "path", None), \
+             override_settings(SEARCH_HIT_COUNT_EXACT_LIMIT=0):
+            response = self.client.get("/api/search/", {"q": query}).json()
+        self.assertFalse(response["hits_exact"])
+        self.assertGreater(response["hits"], 0)
+
+    def test_reorder_rebuilds_sketches(self):
+        index = self.open_index()
+        IndexBuilder(index).run()
+        IndexBuilder(index, reorder="terms").run()
+        rebuilt = HitCounter(index.hit_counter.path).build(index)
+        loaded = HitCounter(index.hit_counter.path).load()
+        self.assertEqual(sorted(loaded.sketches), sorted(rebuilt.sketches))
+        for term_id, sketch in rebuilt.sketches.items():
+            self.assertTrue((loaded.sketches[term_id] == sketch).all())
+        query = self.frequent_query(index)
+        exact, _ = index.count_matches(query)
+        estimate, hits_exact = index.count_matches(query, exact_limit=0)
+        self.assertFalse(hits_exact)
+        self.assertLess(abs(estimate - exact) / exact, 0.25)
+
+
+class ViewTestCase(IndexTestCase):
+    """IndexTestCase dengan view yang memakai index sintetis sebagai index default"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.registry = IndexRegistry({"default": {"data_dir": cls.index.data_dir, "output_dir": cls.index.output_dir}},
+                                     default="default")
+        cls.patches = [mock.patch.object(views, "index_registry", cls.registry),
+                       mock.patch.object(views.query_log, "path", None),
+                       mock.patch.object(middleware.slow_query_log, "path", None)]
+        for patch in cls.patches:
+            patch.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for patch in cls.patches:
+            patch.stop()
+        super().tearDownClass()
+
+
+class IndexRegistryTests(IndexTestCase):
+    def touch(self):
+        """Meniru index yang dibangun ulang: mtime file-file index berubah"""
+        path = os.path.join(self.index.output_dir, "terms.dict")
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+    def test_rebuilt_index_is_reopened_once_stable(self):
+        registry = IndexRegistry({"default": {"data_dir": self.index.data_dir, "output_dir": self.index.output_dir}},
+                                 default="default", reload_interval=0.05)
+        opened = []
+        registry.load_listeners.append(lambda name, index: opened.append(index))
+        first = registry.get()
+        self.assertIs(registry.get(), first)
+        time.sleep(0.06)
+        self.touch()
+        self.assertIs(registry.get(), first)
+        time.sleep(0.06)
+        second = registry.get()
+        self.assertIsNot(second, first)
+        self.assertEqual(opened, [first, second])
+        query = self.corpus.queries(1)[0]
+        self.assertEqual(second.retrieve_bm25(query, k=5), first.retrieve_bm25(query, k=5))
+
+    def test_unfinished_build_is_not_reopened(self):
+        registry = IndexRegistry({"default": {"data_dir": self.index.data_dir, "output_dir": self.index.output_dir}},
+                                 default="default", reload_interval=0.05)
+        first = registry.get()
+        manifest_path = os.path.join(self.index.output_dir, "build_manifest.json")
+        with open(manifest_path) as f:
+            manifest = f.read()
+        try:
+            with open(manifest_path, "w") as f:
+                json.dump(dict(json.loads(manifest), done=False), f)
+            time.sleep(0.06)
+            self.touch()
+            registry.get()
+            time.sleep(0.06)
+            self.assertIs(registry.get(), first)
+        finally:
+            with open(manifest_path, "w") as f:
+                f.write(manifest)
+        self.assertIsNot(registry.get(), first)
+
+    def test_no_reload_without_interval(self):
+        registry = IndexRegistry({"default": {"data_dir": self.index.data_dir, "output_dir": self.index.output_dir}},
+                                 default="default")
+        first = registry.get()
+        self.touch()
+        self.assertIs(registry.get(), first)
+
+
+class MultiIndexCursorTests(ViewTestCase):
+    def test_cursor_rejected_for_multi_index_queries(self):
+        with mock.patch.dict(self.registry.configs, {"other": self.registry.configs["default"]}):
+            cursor = views.encode_cursor(1.0, 3)
+            response = self.client.get("/search/", {"q": "blood", "index": "default,other", "after": cursor})
+            self.assertEqual(response.status_code, 400)
+            with self.assertRaises(ValueError):
+                views.get_serp("blood", k=10, after=(1.0, 3), indexes=["default", "other"])
+
+
+class ApiSearchTests(ViewTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index.build_reranker(num_topics=5)
+
+    def test_rerank_runs_in_search_executor(self):
+        threads = []
+        rerank = LsiReranker.rerank
+
+        def recording_rerank(reranker, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return rerank(reranker, *args, **kwargs)
+
+        query = self.corpus.queries(1)[0]
+        with mock.patch.object(LsiReranker, "rerank", recording_rerank):
+            response = self.client.get("/api/search/", {"q": query, "k": 5, "rerank": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("search"), threads)
+
+    def test_did_you_mean(self):
+        query = self.corpus.queries(1)[0]
+        word = query.split()[0]
+        typo = word[:2] + word[3:]
+        threads = []
+        correct_query = self.registry.get().correct_query
+
+        def recording_correct_query(*args):
+            threads.append(threading.current_thread().name)
+            return correct_query(*args)
+
+        with mock.patch.object(self.registry.get(), "correct_query", recording_correct_query):
+            corrected = self.client.get("/api/search/", {"q": typo}).json()
+            uncorrected = self.client.get("/api/search/", {"q": query}).json()
+        self.assertNotIn(corrected["did_you_mean"], (None, typo))
+        self.assertTrue(self.registry.get().retrieve_bm25(corrected["did_you_mean"], k=1))
+        self.assertIsNone(uncorrected["did_you_mean"])
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(thread.startswith("search") for thread in threads), threads)
+
+
+class SearchBatchTests(ViewTestCase):
+    def batch(self, **body):
+        response = self.client.post("/search/batch/", json.dumps(body), content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_process_pool_is_reused(self):
+        queries = self.corpus.queries(8)
+        expected = self.batch(queries=queries)
+        executor = ProcessPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(views, "batch_executor", executor), override_settings(SEARCH_BATCH_WORKERS=2), \
+             mock.patch("main.engine.bsbi.ProcessPoolExecutor", side_effect=AssertionError("pool created per request")):
+            self.assertEqual(self.batch(queries=queries), expected)
+            self.assertEqual(self.batch(queries=queries), expected)
+
+    def test_tfidf_with_zero_idf(self):
+        reader = mock.Mock(doc_length={0: 3, 1: 4})
+        for df_mode in (0, 1):
+            scores = {}
+            BSBIIndex._score_tfidf(scores, reader, [0, 1], [1, 2], 1, df_mode)
+            self.assertEqual(scores, {0: 0, 1: 0})
+        self.assertTrue(self.batch(queries=self.corpus.queries(2), model="tfidf", df_mode=1))
+
+
+class SlowQueryLogTests(ViewTestCase):
+    def test_terms_are_collected_during_the_query(self):
+        path = os.path.join(self.work_dir, "slow_queries.log")
+        query = self.corpus.queries(1)[0]
+        index = self.registry.get()
+        expected = index.query_term_stats(query + " zzzz")
+        with mock.patch.object(middleware.slow_query_log, "path", path), \
+             mock.patch.object(type(index), "query_term_stats", side_effect=AssertionError("index reopened")), \
+             override_settings(SEARCH_SLOW_QUERY_MS=0):
+            self.assertEqual(self.client.get("/api/search/", {"q": query + " zzzz"}).status_code, 200)
+        entries = list(QueryLog(path))
+        self.assertEqual(len(entries), 1)
+        terms = entries[0]["terms"]
+        self.assertEqual([term["term"] for term in terms], process_text(query + " zzzz"))
+        self.assertEqual(terms[-1]["df"], 0)
+        self.assertTrue(all(term["df"] > 0 and term["bytes"] > 0 for term in terms[:-1]))
+        self.assertEqual(terms, expected)
+
+
+class ReadyTests(ViewTestCase):
+    def setUp(self):
+        self.registry = IndexRegistry({"default": {"data_dir": self.index.data_dir, "output_dir": self.index.output_dir}},
+                                      default="default", reload_interval=0.05)
+        self.warmed = []
+        for patch in (mock.patch.object(views, "index_registry", self.registry),
+                      mock.patch.object(views, "warmup_started", False),
+                      mock.patch.object(views, "warmup_ready", threading.Event()),
+                      mock.patch.object(views, "warmup_threads", {}),
+                      mock.patch.object(views, "warmup_reports", {}),
+                      mock.patch.object(views, "run_warmup", self.run_warmup)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_warmup(self, name, BSBI_instance, run_warmup=views.run_warmup):
+        self.warmed.append(BSBI_instance)
+        run_warmup(name, BSBI_instance)
+
+    def wait_ready(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            response = self.client.get("/ready/")
+            if response.status_code == 200 or time.monotonic() > deadline:
+                return response
+            time.sleep(0.02)
+
+    def test_ready_after_first_warmup(self):
+        response = self.wait_ready()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["loaded"], ["default"])
+        self.assertIn("default", response.json()["warmup"])
+        self.assertEqual(len(self.warmed), 1)
+
+    def test_ready_when_index_was_opened_first(self):
+        index = self.registry.get()
+        self.assertEqual(self.wait_ready().status_code, 200)
+        self.assertEqual(self.warmed, [index])
+
+    def test_reopened_index_is_warmed_again(self):
+        self.assertEqual(self.wait_ready().status_code, 200)
+        path = os.path.join(self.index.output_dir, "terms.dict")
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+        deadline = time.monotonic() + 5.0
+        while len(self.warmed) < 2 and time.monotonic() < deadline:
+            self.registry.get()
+            time.sleep(0.02)
+        self.assertEqual(len(self.warmed), 2)
+        self.assertIsNot(self.warmed[1], self.warmed[0])
+        self.assertEqual(self.client.get("/ready/").status_code, 200)
+
+
+class HttpCacheTests(SimpleTestCase):
+    """Validator HTTP dan varian terkompresi, dengan index dan koleksi bawaan repo"""
+
+    def setUp(self):
+        for patch in (mock.patch.object(views.query_log, "path", None),
+                      mock.patch.object(middleware.slow_query_log, "path", None)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        views.page_cache.clear()
+
+    def test_search_not_modified(self):
+        response = self.client.get("/search/", {"q": "blood pressure"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"max-age={settings.SEARCH_RESULTS_MAX_AGE}", response["Cache-Control"])
+        with mock.patch.object(views, "get_serp", side_effect=AssertionError("engine used")):
+            cached = self.client.get("/search/", {"q": "blood pressure"}, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached["ETag"], response["ETag"])
+            cached = self.client.get("/search/", {"q": "blood pressure"},
+                                     HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+            self.assertEqual(cached.status_code, 304)
+
+    def test_valid_searches_are_logged_once(self):
+        with mock.patch.object(views.query_log, "append") as append:
+            response = self.client.get("/search/", {"q": "blood pressure"})
+            self.client.get("/search/", {"q": "blood pressure"}, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(self.client.get("/search/", {"q": "blood", "after": "bogus"}).status_code, 400)
+            self.assertEqual(self.client.get("/search/", {"q": "blood", "index": "missing"}).status_code, 404)
+        self.assertEqual(append.call_args_list, [mock.call("blood pressure", index=views.index_registry.default)] * 2)
+
+    def test_etag_follows_index_version_and_query(self):
+        etag = self.client.get("/search/", {"q": "blood pressure"})["ETag"]
+        self.assertNotEqual(self.client.get("/search/", {"q": "blood"})["ETag"], etag)
+        version = views.index_registry.version()
+        with mock.patch.object(views.index_registry, "version", return_value=("rebuilt", version[1] + 1)):
+            response = self.client.get("/search/", {"q": "blood pressure"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_document_variants(self):
+        identity = self.client.get("/doc/1/", HTTP_ACCEPT_ENCODING="identity")
+        self.assertFalse(identity.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", identity["Vary"])
+        with mock.patch.object(views, "render_doc", side_effect=AssertionError("page rendered again")):
+            compressed = self.client.get("/doc/1/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+            self.assertEqual(compressed["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(compressed.content), identity.content)
+            self.assertLess(len(compressed.content), len(identity.content))
+            refused = self.client.get("/doc/1/", HTTP_ACCEPT_ENCODING="gzip;q=0, *;q=0")
+            self.assertFalse(refused.has_header("Content-Encoding"))
+            not_modified = self.client.get("/doc/1/", HTTP_IF_NONE_MATCH=identity["ETag"])
+            self.assertEqual(not_modified.status_code, 304)
+        self.assertNotEqual(self.client.get("/doc/2/")["ETag"], identity["ETag"])
+
+    def test_preferred_encoding(self):
+        request = mock.Mock(headers={"Accept-Encoding": "gzip;q=0.5, br"})
+        self.assertEqual(views.preferred_encoding(request, {"identity", "gzip", "br"}), "br")
+        self.assertEqual(views.preferred_encoding(request, {"identity", "gzip"}), "gzip")
+        request = mock.Mock(headers={"Accept-Encoding": "br;q=0, *"})
+        self.assertEqual(views.preferred_encoding(request, {"identity", "gzip", "br"}), "gzip")
+        request = mock.Mock(headers={})
+        self.assertEqual(views.preferred_encoding(request, {"identity", "gzip", "br"}), "identity")
@@ -5,5 +5,10 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),
     path("search/", views.search, name="search"),
+    path("search/batch/", views.search_batch, name="search-batch"),
+    path("api/search/", views.api_search, name="api-search"),
+    path("suggest/", views.suggest, name="suggest"),
     path("doc/<int:pk>/", views.view_doc, name="view-doc"),
+    path("metrics/", views.metrics, name="metrics"),
+    path("ready/", views.ready, name="ready"),
 ]
@@ -1,39 +1,402 @@
 import os
+import io
 import re
+import hmac
+import gzip
+import json
+import uuid
+import base64
+import pickle
+import hashlib
 import time
+import pstats
+import asyncio
+import cProfile
+import functools
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.http import HttpResponseNotFound, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 
 from main.engine.util import process_text
-from main.engine.bsbi import BSBIIndex
-from main.engine.compression import VBEPostings
+from main.engine.index import postings_cache, metadata_cache
+from main.engine.metrics import stage, bind, metrics_registry
+from main.engine.querylog import QueryLog, normalize_query
+from main.engine.registry import IndexRegistry
+from main.engine.snippet import get_title_content
+from main.engine.shard import ShardedIndex
+from main.engine.shard_server import ShardAggregator
+from main.engine.warmup import WarmUp, popular_queries
+
+try:
+    import brotli
+except ImportError:     # brotli opsional; tanpa brotli hanya varian gzip yang dibuat
+    brotli = None
+
+SEARCH_API_FIELDS = {"id", "path", "title", "snippet", "score", "content"}
+SEARCH_API_DEFAULT_FIELDS = "id,path,title,snippet,score"
+
+search_executor = ThreadPoolExecutor(max_workers=settings.SEARCH_API_WORKERS, thread_name_prefix="search")
+search_slots = threading.BoundedSemaphore(settings.SEARCH_API_MAX_IN_FLIGHT)
+# process pool search/batch/, satu per process web server (bukan satu per request)
+batch_executor = ProcessPoolExecutor(max_workers=settings.SEARCH_BATCH_WORKERS) if settings.SEARCH_BATCH_WORKERS else None
+index_registry = IndexRegistry(settings.SEARCH_INDEXES, default=settings.SEARCH_DEFAULT_INDEX, \
+                               memory_budget=settings.SEARCH_INDEX_MEMORY_BUDGET, \
+                               reload_interval=settings.SEARCH_INDEX_RELOAD_INTERVAL)
+shard_aggregator = None
+shard_aggregator_lock = threading.Lock()
+query_log = QueryLog(settings.SEARCH_QUERY_LOG or None, settings.SEARCH_QUERY_LOG_MAX_BYTES)
+page_cache = caches["pages"]
+results_cache = caches["results"]
+warmup_lock = threading.Lock()
+warmup_threads = {}     # nama index -> thread warm-up yang sedang berjalan
+warmup_reports = {}     # nama index -> laporan warm-up terakhir
+warmup_ready = threading.Event()
+warmup_started = False
 
 
 def index(request):
     return render(request, "index.html")
 
 
-def search(request):
-    print(request.GET)
+def http_cache(max_age_setting):
+    """
+    Menambahkan Cache-Control public dengan max-age dari setting max_age_setting
+    ke response 200 dan 304, kecuali view sudah mengisi Cache-Control sendiri
+    (misal no-store untuk hasil yang tidak lengkap).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def inner(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304) and not response.has_header("Cache-Control"):
+                patch_cache_control(response, public=True, max_age=getattr(settings, max_age_setting))
+            return response
+        return inner
+    return decorator
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def search_validators(request):
+    """
+    (ETag, Last-Modified) halaman hasil search, dari versi index yang dipakai
+    dan parameter query; (None, None) jika halaman tidak boleh di-cache. Dihitung
+    tanpa membuka index (lihat IndexRegistry.version), sehingga conditional GET
+    dijawab 304 tanpa menyentuh engine.
+    """
+    if not hasattr(request, "search_validators"):
+        request.search_validators = (None, None)
+        names = [name for name in request.GET.get("index", "").split(",") if name] or [index_registry.default]
+        cacheable = "q" in request.GET and "profile" not in request.GET and not settings.SEARCH_SHARDS
+        if cacheable and all(name in index_registry for name in names):
+            versions = [index_registry.version(name) for name in names]
+            params = sorted((key, value) for key, values in request.GET.lists() for value in values)
+            request.search_validators = (
+                make_etag(settings.SEARCH_HTTP_CACHE_SALT, [tag for tag, _ in versions], params),
+                datetime.fromtimestamp(max(mtime for _, mtime in versions), timezone.utc),
+            )
+    return request.search_validators
+
+
+def doc_version(pk):
+    """(ETag, Last-Modified) halaman dokumen, dari versi index dan dokumennya"""
+    if not 1 <= pk <= 1033 or not os.path.exists(doc_file_path(pk)):
+        return None, None
+    tag, latest = index_registry.version()
+    latest = max(latest, os.path.getmtime(doc_file_path(pk)))
+    return make_etag(settings.SEARCH_HTTP_CACHE_SALT, tag, pk), datetime.fromtimestamp(latest, timezone.utc)
+
+
+def doc_validators(request, pk):
+    if not hasattr(request, "doc_validators"):
+        request.doc_validators = doc_version(int(pk))
+    return request.doc_validators
+
+
+def search_error(request):
+    """Response error untuk parameter search yang tidak valid, atau None jika valid"""
     if "q" not in request.GET:
         return HttpResponseBadRequest("Search query required")
+    indexes = [name for name in request.GET.get("index", "").split(",") if name]
+    if not all(name in index_registry for name in indexes):
+        return HttpResponseNotFound("Index not found")
+    if request.GET.get("after"):
+        # cursor hanya berisi (skor, doc_id) dari satu index
+        if len(indexes) > 1:
+            return HttpResponseBadRequest("Cursors are not supported for multi-index queries")
+        try:
+            decode_cursor(request.GET["after"])
+        except ValueError:
+            return HttpResponseBadRequest("Invalid cursor")
+    return None
 
-    start_time = time.time()
+
+def logged_search(view):
+    """
+    Memvalidasi request search lalu mencatatnya ke query_log sebelum
+    conditional GET dijawab, sehingga setiap search yang valid tercatat tepat
+    sekali, termasuk yang dijawab 304 dari cache browser.
+    """
+    @functools.wraps(view)
+    def inner(request, *args, **kwargs):
+        error = search_error(request)
+        if error is not None:
+            return error
+        indexes = [name for name in request.GET.get("index", "").split(",") if name]
+        query_log.append(request.GET["q"], index=",".join(indexes) or index_registry.default)
+        return view(request, *args, **kwargs)
+    return inner
+
+
+@http_cache("SEARCH_RESULTS_MAX_AGE")
+@logged_search
+@condition(etag_func=lambda request: search_validators(request)[0],
+           last_modified_func=lambda request: search_validators(request)[1])
+def search(request):
+    start_time = time.perf_counter()
 
     query = request.GET["q"]
-    docs = get_serp(query)
+    indexes = [name for name in request.GET.get("index", "").split(",") if name]
+    rerank = request.GET.get("rerank") == "1"
+    profiler = cProfile.Profile() if profiling_requested(request) else None
+    serp = functools.partial(profiler.runcall, get_serp) if profiler else get_serp
+    if request.GET.get("after"):
+        page = serp(query, k=10, after=decode_cursor(request.GET["after"]), indexes=indexes)
+        next_cursor = page[-1]["cursor"] if len(page) == 10 else None
+    else:
+        docs = serp(query, indexes=indexes, rerank=rerank)
+        page_number = request.GET.get("page")
+        page = paginate(docs, page_number)
+        next_cursor = docs[-1]["cursor"] if not page.has_next() and len(docs) == 100 and not rerank \
+                                            and len(indexes) <= 1 else None
+    if profiler:
+        return profile_response(profiler)
+    hits, hits_exact = count_hits(query, indexes)
 
-    page_number = request.GET.get("page")
-    page = paginate(docs, page_number)
+    did_you_mean = correct_query(get_engine(indexes[0] if indexes else None), query)
 
     context = {
         "query": query,
-        "exe_time": round(time.time() - start_time, 2),
+        "exe_time": round(time.perf_counter() - start_time, 2),
         "page": page,
+        "next_cursor": next_cursor,
+        "hits": hits,
+        "hits_exact": hits_exact,
+        "extra_params": (f"&index={','.join(indexes)}" if indexes else "") + ("&rerank=1" if rerank else ""),
+        "partial": bool(get_aggregator() and get_aggregator().last_missing),
+        "did_you_mean": did_you_mean,
+    }
+    with stage("render"):
+        response = render(request, "results.html", context=context)
+    if context["partial"]:
+        response["Cache-Control"] = "no-store"
+    return response
+
+
+@csrf_exempt
+@require_POST
+def search_batch(request):
+    try:
+        body = json.loads(request.body)
+        queries = body["queries"]
+        k = int(body.get("k", 10))
+        model = body.get("model", "bm25")
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest("JSON body with a list of queries required")
+
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return HttpResponseBadRequest("queries must be a list of strings")
+    if len(queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        return HttpResponseBadRequest(f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per request")
+    if not 0 < k <= 1000:
+        return HttpResponseBadRequest("k must be between 1 and 1000")
+
+    if body.get("index", index_registry.default) not in index_registry:
+        return HttpResponseNotFound("Index not found")
+    BSBI_instance = get_engine(body.get("index"))
+    workers = settings.SEARCH_BATCH_WORKERS
+    try:
+        if model == "bm25":
+            results = BSBI_instance.retrieve_bm25_batch(queries, k=k, \
+                k1=float(body.get("k1", 1.6)), b=float(body.get("b", 0.75)), workers=workers, executor=batch_executor)
+        elif model == "tfidf":
+            results = BSBI_instance.retrieve_tfidf_batch(queries, k=k, \
+                tf_mode=int(body.get("tf_mode", 1)), df_mode=int(body.get("df_mode", 0)), workers=workers, \
+                executor=batch_executor)
+        else:
+            return HttpResponseBadRequest("model must be bm25 or tfidf")
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest("Invalid scoring parameters")
+
+    return JsonResponse({
+        "results": [
+            [{"score": score, "id": doc_path.split('/')[-1][:-4], "path": doc_path} for (score, doc_path) in result]
+            for result in results
+        ]
+    })
+
+
+async def api_search(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    if "q" not in request.GET:
+        return JsonResponse({"error": "Search query required"}, status=400)
+    try:
+        k = int(request.GET.get("k", 10))
+        offset = int(request.GET.get("offset", 0))
+    except ValueError:
+        return JsonResponse({"error": "k and offset must be integers"}, status=400)
+    if not 0 < k <= settings.SEARCH_API_MAX_K or offset < 0:
+        return JsonResponse({"error": f"k must be between 1 and {settings.SEARCH_API_MAX_K}, offset must be positive"}, status=400)
+    try:
+        after = decode_cursor(request.GET["after"]) if request.GET.get("after") else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    index_name = request.GET.get("index") or index_registry.default
+    if index_name not in index_registry:
+        return JsonResponse({"error": "Index not found"}, status=404)
+    rerank = request.GET.get("rerank") == "1"
+    fields = set(request.GET.get("fields", SEARCH_API_DEFAULT_FIELDS).split(","))
+    if not fields <= SEARCH_API_FIELDS:
+        return JsonResponse({"error": f"Unknown fields: {', '.join(sorted(fields - SEARCH_API_FIELDS))}"}, status=400)
+
+    # Backpressure: query yang melebihi batas in-flight langsung ditolak
+    if not search_slots.acquire(blocking=False):
+        response = JsonResponse({"error": "Too many in-flight queries"}, status=503)
+        response["Retry-After"] = "1"
+        return response
+
+    try:
+        start_time = time.perf_counter()
+        query = request.GET["q"]
+        query_log.append(query, index=index_name)
+        loop = asyncio.get_running_loop()
+
+        # bind: agar tahap-tahap di thread pool tercatat di timer request ini
+        BSBI_instance = await loop.run_in_executor(search_executor, bind(get_engine), index_name)
+        if after is not None:
+            results, next_cursor = await loop.run_in_executor(search_executor, bind(BSBI_instance.retrieve_bm25_after), \
+                                                              query, k, after)
+        elif rerank:
+            # kandidat yang di-rerank selalu sama untuk setiap offset, agar halaman konsisten
+            results = await loop.run_in_executor(search_executor, bind(BSBI_instance.retrieve_bm25), query, \
+                                                 max(offset + k, settings.SEARCH_RERANK_DEPTH))
+            results = await loop.run_in_executor(search_executor, bind(BSBI_instance.rerank), query, results, \
+                                                 settings.SEARCH_RERANK_BUDGET)
+            results = results[offset:offset + k]
+            next_cursor = None
+        else:
+            results = await loop.run_in_executor(search_executor, bind(BSBI_instance.retrieve_bm25), query, offset + k)
+            results = results[offset:]
+            next_cursor = None
+            if len(results) == k:
+                _, last_path = results[-1]
+                next_cursor = (results[-1][0], BSBI_instance.doc_id_map.str_to_id[last_path])
+        clean_query = process_text(query)
+        docs = await asyncio.gather(*[
+            loop.run_in_executor(search_executor, bind(get_result), BSBI_instance, score, doc_path, clean_query, fields)
+            for (score, doc_path) in results
+        ])
+        hits, hits_exact = await loop.run_in_executor(search_executor, bind(BSBI_instance.count_matches), query, \
+                                                      False, settings.SEARCH_HIT_COUNT_EXACT_LIMIT)
+        did_you_mean = await loop.run_in_executor(search_executor, bind(correct_query), BSBI_instance, query)
+    finally:
+        search_slots.release()
+
+    return JsonResponse({
+        "query": query,
+        "index": index_name,
+        "k": k,
+        "offset": offset,
+        "exe_time": round(time.perf_counter() - start_time, 4),
+        "next": encode_cursor(*next_cursor) if next_cursor else None,
+        "hits": hits,
+        "hits_exact": hits_exact,
+        "did_you_mean": did_you_mean,
+        "results": docs,
+    })
+
+
+def suggest(request):
+    try:
+        n = int(request.GET.get("n", 10))
+    except ValueError:
+        return JsonResponse({"error": "n must be an integer"}, status=400)
+    if not 0 < n <= settings.SEARCH_SUGGEST_MAX_N:
+        return JsonResponse({"error": f"n must be between 1 and {settings.SEARCH_SUGGEST_MAX_N}"}, status=400)
+    index_name = request.GET.get("index") or index_registry.default
+    if index_name not in index_registry:
+        return JsonResponse({"error": "Index not found"}, status=404)
+
+    prefix = request.GET.get("q", "")
+    return JsonResponse({
+        "query": prefix,
+        "suggestions": get_engine(index_name).suggest_index.suggest(prefix, n),
+    })
+
+
+def profiling_requested(request):
+    """
+    True jika request meminta profiling (?profile=1) dengan X-Profile-Token
+    yang benar. Tanpa SEARCH_PROFILE_TOKEN, profiling selalu ditolak.
+    """
+    if request.GET.get("profile") != "1":
+        return False
+    token = settings.SEARCH_PROFILE_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get("X-Profile-Token", ""), token):
+        raise PermissionDenied("Profiling is not allowed")
+    return True
+
+
+def profile_response(profiler, limit=50):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+    response = HttpResponse(stream.getvalue(), content_type="text/plain; charset=utf-8")
+    response["Cache-Control"] = "no-store"
+    if settings.SEARCH_PROFILE_DIR:
+        os.makedirs(settings.SEARCH_PROFILE_DIR, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+        profiler.dump_stats(os.path.join(settings.SEARCH_PROFILE_DIR, filename))
+        response["X-Profile-File"] = filename
+    return response
+
+
+def correct_query(BSBI_instance, query):
+    """Koreksi ejaan query (did you mean), atau None jika tidak ada koreksi"""
+    with stage("spell"):
+        return BSBI_instance.correct_query(query)
+
+
+def get_result(BSBI_instance, score, doc_path, clean_query, fields):
+    with stage("document"):
+        document = BSBI_instance.get_document(BSBI_instance.doc_id_map.str_to_id[doc_path])
+    result = {
+        "id": doc_path.split('/')[-1][:-4],
+        "path": doc_path,
+        "score": score,
     }
-    return render(request, "results.html", context=context)
+    if "title" in fields:
+        result["title"] = document.title.title()
+    if "snippet" in fields:
+        with stage("snippet"):
+            result["snippet"] = document.snippet(clean_query)
+    if "content" in fields:
+        result["content"] = document.content
+    return {field: value for field, value in result.items() if field in fields}
 
 
 def paginate(docs, page_number, doc_per_page=10):
@@ -48,24 +411,95 @@ def paginate(docs, page_number, doc_per_page=10):
     return page
 
 
-def get_serp(query):
-    try:
-        BSBI_instance = BSBIIndex(data_dir = os.path.join("main/engine", "collection"), \
-                                postings_encoding = VBEPostings, \
-                                output_dir = os.path.join("main/engine", "index"))
-    except:
-        BSBI_instance = BSBIIndex.get_instance()
+def get_engine(name=None):
+    return index_registry.get(name)
+
+
+def get_aggregator():
+    global shard_aggregator
+    if not settings.SEARCH_SHARDS:
+        return None
+    with shard_aggregator_lock:
+        if shard_aggregator is None:
+            BSBI_instance = get_engine()
+            sharded_index = ShardedIndex(BSBI_instance, num_shards=len(settings.SEARCH_SHARDS)).load()
+            shard_aggregator = ShardAggregator(sharded_index, settings.SEARCH_SHARDS, \
+                timeout=settings.SEARCH_SHARD_TIMEOUT, hedge_delay=settings.SEARCH_SHARD_HEDGE_DELAY)
+    return shard_aggregator
+
+
+def count_hits(query, indexes=None):
+    """
+    Banyaknya dokumen yang memuat minimal satu term query di semua index yang
+    di-query, dan apakah jumlah tersebut exact (lihat BSBIIndex.count_matches)
+    """
+    total, exact = 0, True
+    for name in indexes or [index_registry.default]:
+        hits, hits_exact = get_engine(name).count_matches(query, exact_limit=settings.SEARCH_HIT_COUNT_EXACT_LIMIT)
+        total += hits
+        exact = exact and hits_exact
+    return total, exact
+
+
+def serp_cache_key(query, k, names):
+    versions = [index_registry.version(name)[0] for name in names]
+    key = json.dumps([versions, names, normalize_query(query), k])
+    return "serp:" + hashlib.sha1(key.encode()).hexdigest()
+
+
+def get_serp(query, k=100, after=None, indexes=None, rerank=False):
+    names = indexes or [index_registry.default]
+
+    # hasil (beserta snippet) di-cache per versi index, sehingga cache lama tidak
+    # terpakai lagi setelah index dibangun ulang. Hasil dari shard (bisa tidak
+    # lengkap), halaman cursor, dan hasil rerank (dibatasi waktu) tidak di-cache.
+    key = None
+    if after is None and not rerank and not (names == [index_registry.default] and get_aggregator()):
+        key = serp_cache_key(query, k, names)
+        docs = results_cache.get(key)
+        if docs is not None:
+            return docs
+
+    sharded = None
+    if after is not None:
+        if len(names) > 1:
+            raise ValueError("Cursors are not supported for multi-index queries")
+        results, _ = get_engine(names[0]).retrieve_bm25_after(query, k=k, after=after)
+        results = [(score, names[0], doc_path) for (score, doc_path) in results]
+    elif names == [index_registry.default] and get_aggregator():
+        results = [(score, names[0], doc_path) for (score, doc_path) in get_aggregator().retrieve_bm25(query, k=k)]
+        # judul dan snippet dari shard server, bukan dari snippet index lokal
+        doc_id_map = get_engine(names[0]).doc_id_map
+        with stage("snippet"):
+            sharded = get_aggregator().documents([doc_id_map.str_to_id[doc_path] for (_, _, doc_path) in results], \
+                                                 process_text(query))
+    else:
+        results = index_registry.retrieve_bm25(query, names, k=k)
+
+    # rerank hanya untuk satu index, karena skor antar index tidak sebanding
+    if rerank and after is None and len(names) == 1:
+        results = get_engine(names[0]).rerank(query, [(score, doc_path) for (score, _, doc_path) in results], \
+                                              budget=settings.SEARCH_RERANK_BUDGET)
+        results = [(score, names[0], doc_path) for (score, doc_path) in results]
 
     docs = []
-    for (_, doc_path) in BSBI_instance.retrieve_bm25(query, k=100):
+    clean_query = process_text(query)
+    for (score, index_name, doc_path) in results:
+        BSBI_instance = get_engine(index_name)
         doc_id = doc_path.split('/')[-1][:-4]
-        f = open(doc_path)
-        clean_query = process_text(query)
-
         col_id, doc_id_disp = doc_path[12:].split('/')[1:]
-        title, content = get_title_content(f, col_id, doc_id)
-        title = trim_title(title)
-        content = trim_content(content, clean_query)
+
+        engine_doc_id = BSBI_instance.doc_id_map.str_to_id[doc_path]
+        if sharded is not None:
+            # dokumen dari shard yang tidak menjawab tampil tanpa snippet
+            title, content = sharded.get(engine_doc_id, (f'Document {doc_id_disp[:-4]} - Collection {col_id}', ""))
+            title = trim_title(title)
+        else:
+            with stage("document"):
+                document = BSBI_instance.get_document(engine_doc_id)
+            title = trim_title(document.title)
+            with stage("snippet"):
+                content = document.snippet(clean_query)
 
         docs.append(
             {
@@ -73,30 +507,25 @@ def get_serp(query):
                 "id": doc_id,
                 "title": title.title(),
                 "content": content,
+                "index": index_name,
+                "cursor": encode_cursor(score, engine_doc_id),
             })
-        f.close()
 
+    if key is not None:
+        results_cache.set(key, docs)
     return docs
 
-def get_title_content(file, col_id, doc_id):
-    title_ends = False
-    title, content = '', ''
 
-    for line in file:
-        if line[:2] == '  ':
-            title_ends = True
-        if title_ends:
-            content += line.strip()
-        else:
-            title += line.strip()
-    
-    if content == '':
-        content = title
-        title = f'Document {doc_id[:-4]} - Collection {col_id}'
-    content = content.capitalize()
-    if title[-1] == '.':
-        title = title[:-1]
-    return title, content
+def encode_cursor(score, doc_id):
+    return base64.urlsafe_b64encode(f"{score!r}:{doc_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(score), int(doc_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
 
 def trim_title(title):
     title = re.sub(r"\d+. ", "", title)
@@ -106,47 +535,242 @@ def trim_title(title):
     return title
 
 
-def trim_content(raw_content, clean_query):
-    content = []
+def doc_file_path(pk):
+    block = pk // 100 + 1
+    return os.path.join("main/engine", "collection", str(block), f"{pk}.txt")
 
-    sentences = re.findall(r"([^.]*\.)", raw_content)
-    for sentence in sentences:
-        if all(word in sentence for word in clean_query):
-            content.append(sentence)
 
-    if not content:
-        for q in clean_query:
+def preferred_encoding(request, encodings):
+    """Content-Encoding terbaik (br, lalu gzip) di antara encodings yang diterima client"""
+    accepted = {}
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
             try:
-                match = re.findall(r"([^.]*?" + q + "[^.]*\.)", raw_content)[0]
-                content.append(match)
-            except IndexError:
-                continue
-
-    if content:
-        content = " ... ".join(content)
-        for q in clean_query:
-            content = content.replace(q, "<b>" + q + "</b>")
-        content = "<p>" + content + "</p>"
-    else:
-        content = ""
-    return content
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    for coding in ("br", "gzip"):
+        if coding in encodings and accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return "identity"
+
 
+def compress_variants(body):
+    """Varian body untuk setiap Content-Encoding, dikompresi sekali saat masuk page_cache"""
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+    return variants
+
+
+@http_cache("SEARCH_DOC_MAX_AGE")
+@condition(etag_func=lambda request, pk: doc_validators(request, pk)[0],
+           last_modified_func=lambda request, pk: doc_validators(request, pk)[1])
 def view_doc(request, pk):
     pk = int(pk)
     if pk < 1 or pk > 1033:
         return HttpResponseNotFound("Document not found")
 
-    block = pk // 100 + 1
-    path = os.path.join("main/engine", "collection", str(block), f"{pk}.txt")
+    etag, _ = doc_validators(request, pk)
+    variants = doc_page_variants(request, pk, etag)
+    encoding = preferred_encoding(request, variants)
+    response = HttpResponse(variants[encoding], content_type="text/html; charset=utf-8")
+    if encoding != "identity":
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def doc_page_variants(request, pk, etag):
+    """
+    Halaman dokumen tidak berubah selama index sama, sehingga hasil render
+    (beserta varian terkompresinya) disimpan di page_cache per ETag.
+    """
+    key = f"doc:{etag}"
+    variants = page_cache.get(key) if etag else None
+    if variants is None:
+        variants = compress_variants(render_doc(request, pk).content)
+        if etag:
+            page_cache.set(key, variants)
+    return variants
+
+
+def render_doc(request, pk):
+    path = doc_file_path(pk)
     col_id, doc_id = path[12:].split('/')[1:]
 
-    f = open(path)
-    title, content = get_title_content(f, col_id, doc_id)
+    with stage("document"), open(path) as f:
+        title, content = get_title_content(f, col_id, doc_id)
+    with stage("related"):
+        related = get_related(path)
 
     context = {
         "pk": pk,
         "title": title.title(),
         "path": f'Document {doc_id[:-4]} - Collection {col_id}',
         "content": content,
+        "related": related,
     }
-    return render(request, "doc.html", context=context)
+    with stage("render"):
+        return render(request, "doc.html", context=context)
+
+
+def get_related(doc_path, k=5):
+    BSBI_instance = get_engine()
+    engine_doc_id = BSBI_instance.doc_id_map.str_to_id.get(doc_path)
+    if engine_doc_id is None:
+        return []
+
+    related = []
+    for (neighbour, score) in BSBI_instance.get_similar_documents(engine_doc_id, k):
+        neighbour_path = BSBI_instance.doc_id_map[neighbour]
+        document = BSBI_instance.get_document(neighbour)
+        related.append(
+            {
+                "id": neighbour_path.split('/')[-1][:-4],
+                "title": trim_title(document.title).title(),
+            })
+    return related
+
+
+def start_warmup():
+    """
+    Membuka index default dan menjalankan warm-up di background, sekali per
+    worker (dipanggil dari wsgi.py/asgi.py, atau oleh /ready/). Setelah itu
+    warm-up juga dijalankan setiap kali sebuah index dibuka ulang.
+    """
+    global warmup_started
+    with warmup_lock:
+        if warmup_started:
+            return
+        warmup_started = True
+    index_registry.load_listeners.append(warm_index)
+    if index_registry.default in index_registry.loaded():
+        # index default sudah dibuka (misal oleh request pertama) sebelum listener terpasang
+        warm_index(index_registry.default, get_engine())
+    else:
+        threading.Thread(target=get_engine, name="warmup", daemon=True).start()
+
+
+def warm_index(name, BSBI_instance):
+    """load listener IndexRegistry: warm-up index yang baru dibuka di background thread"""
+    thread = threading.Thread(target=run_warmup, args=(name, BSBI_instance), name=f"warmup-{name}", daemon=True)
+    with warmup_lock:
+        if name in warmup_threads:
+            return
+        warmup_threads[name] = thread
+    thread.start()
+
+
+def run_warmup(name, BSBI_instance):
+    """
+    Warm-up dari query populer di query log: postings, hasil search (results_cache)
+    dan, untuk index default, halaman dokumen (page_cache). Gagal warm-up tidak
+    menahan worker; worker tetap ready dengan cache yang dingin.
+    """
+    try:
+        if settings.SEARCH_WARMUP_SECONDS > 0:
+            entries = (entry for entry in query_log \
+                       if name in str(entry.get("index") or index_registry.default).split(","))
+            queries = popular_queries(entries, settings.SEARCH_WARMUP_QUERIES, settings.SEARCH_WARMUP_WINDOW)
+
+            def warm_query(query):
+                docs = get_serp(query, indexes=[name])
+                # halaman dokumen hanya ada untuk index default
+                clicked = [doc["id"] for doc in docs[:10]] if name == index_registry.default else []
+                return len(pickle.dumps(docs)), clicked
+
+            def warm_document(doc_id):
+                pk = int(doc_id)
+                variants = doc_page_variants(None, pk, doc_version(pk)[0])
+                return sum(len(body) for body in variants.values())
+
+            warmup = WarmUp(BSBI_instance, queries, time_budget=settings.SEARCH_WARMUP_SECONDS, \
+                            memory_budget=settings.SEARCH_WARMUP_MEMORY)
+            warmup_reports[name] = warmup.run(warm_query, warm_document)
+    except Exception as e:
+        warmup_reports[name] = {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        with warmup_lock:
+            warmup_threads.pop(name, None)
+        if name == index_registry.default:
+            warmup_ready.set()
+
+
+@never_cache
+def ready(request):
+    """
+    Readiness probe: 503 sampai index default terbuka dan warm-up pertamanya
+    selesai. Warm-up setelah index dibuka ulang berjalan tanpa membuat worker
+    tidak ready, agar tidak semua worker keluar dari load balancer bersamaan.
+    """
+    start_warmup()
+    is_ready = warmup_ready.is_set()
+    with warmup_lock:
+        warming = sorted(warmup_threads)
+    return JsonResponse({
+        "ready": is_ready,
+        "loaded": index_registry.loaded(),
+        "warming": warming,
+        "warmup": warmup_reports,
+    }, status=200 if is_ready else 503)
+
+
+def metrics(request):
+    return HttpResponse(metrics_registry.render(metric_samples()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def metric_samples():
+    """Gauge dan counter yang dibaca saat scrape: cache, ukuran index, tier, dan reranker"""
+    cache = postings_cache.stats()
+    samples = [
+        ("medbib_postings_cache_hits_total", "counter", "Postings cache hits", {}, cache["hits"]),
+        ("medbib_postings_cache_misses_total", "counter", "Postings cache misses", {}, cache["misses"]),
+        ("medbib_postings_cache_evictions_total", "counter", "Postings cache evictions", {}, cache["evictions"]),
+        ("medbib_postings_cache_entries", "gauge", "Decoded postings lists in the cache", {}, cache["entries"]),
+        ("medbib_postings_cache_bytes", "gauge", "Size of the decoded postings in the cache", {}, cache["bytes"]),
+        ("medbib_postings_cache_max_bytes", "gauge", "Postings cache budget", {}, cache["max_bytes"]),
+        ("medbib_metadata_cache_entries", "gauge", "Index metadata files held in memory", {}, len(metadata_cache)),
+        ("medbib_index_memory_estimate_bytes", "gauge", "Estimated memory of the open indexes", {}, \
+            index_registry.memory_usage()),
+    ]
+    for name in index_registry.loaded():
+        BSBI_instance = get_engine(name)
+        labels = {"index": name}
+        samples.append(("medbib_index_documents", "gauge", "Documents in the index", labels, len(BSBI_instance.doc_id_map)))
+        samples.append(("medbib_index_terms", "gauge", "Terms in the index", labels, len(BSBI_instance.term_id_map)))
+        samples.append(("medbib_term_weights_cache_entries", "gauge", "Terms in the BM25 weights cache", labels, \
+                        len(BSBI_instance.term_weights_cache)))
+        samples.append(("medbib_term_weights_cache_bytes", "gauge", "Size of the BM25 weights cache", labels, \
+                        BSBI_instance.term_weights_cache.current_bytes))
+        for filename in ("terms.dict", "docs.dict", "snippets.dict", "snippets.data", BSBI_instance.index_name + ".dict", \
+                         BSBI_instance.index_name + ".index"):
+            file_path = os.path.join(BSBI_instance.output_dir, filename)
+            if os.path.exists(file_path):
+                samples.append(("medbib_index_file_bytes", "gauge", "Size of the index files", \
+                                {**labels, "file": filename}, os.path.getsize(file_path)))
+        if BSBI_instance.tier_index is not None:
+            report = BSBI_instance.tier_index.report()
+            for tier in ("tier1", "fallback"):
+                samples.append(("medbib_tier_queries_total", "counter", "Queries answered by tier one or the full index", \
+                                {**labels, "tier": tier}, report[tier]))
+        if BSBI_instance.reranker is not None:
+            for result in ("reranked", "skipped"):
+                samples.append(("medbib_rerank_total", "counter", "Rerank requests by outcome", \
+                                {**labels, "result": result}, getattr(BSBI_instance.reranker, result)))
+    for name, report in list(warmup_reports.items()):
+        if "error" in report:
+            continue
+        labels = {"index": name}
+        samples.append(("medbib_warmup_seconds", "gauge", "Duration of the last warm-up", labels, report["seconds"]))
+        samples.append(("medbib_warmup_bytes", "gauge", "Estimated memory filled by the last warm-up", labels, \
+                        report["bytes"]))
+        for item in ("terms", "queries", "documents"):
+            samples.append(("medbib_warmup_items", "gauge", "Terms, queries and documents warmed by the last warm-up", \
+                            {**labels, "item": item}, report[item]))
+    return samples
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medbib.settings')
 
 application = get_asgi_application()
+
+# Warm the caches from the query log before the worker reports ready (see /ready/)
+from main.views import start_warmup
+
+start_warmup()
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'main.middleware.server_timing_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -130,7 +131,116 @@ STATICFILES_DIRS = [
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
+# 'pages' holds rendered document pages, with their gzip/brotli variants, keyed by
+# ETag (see main.views.view_doc); 'results' holds search results with snippets, keyed
+# by index version and query (see main.views.get_serp). Keys change when the index
+# is rebuilt, so entries never expire.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'medbib-pages',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('SEARCH_PAGE_CACHE_ENTRIES', 2000))},
+    },
+    'results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'medbib-results',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('SEARCH_RESULT_CACHE_ENTRIES', 1000))},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Search engine
+
+# Bulk JSON search endpoint (search/batch/). With SEARCH_BATCH_WORKERS, batches are split
+# over a process pool that each web process creates once and keeps.
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get('SEARCH_BATCH_MAX_QUERIES', 10000))
+SEARCH_BATCH_WORKERS = int(os.environ.get('SEARCH_BATCH_WORKERS', 0)) or None
+
+# Async JSON search endpoint (api/search/), intended to be served through medbib.asgi
+SEARCH_API_WORKERS = int(os.environ.get('SEARCH_API_WORKERS', 8))
+SEARCH_API_MAX_IN_FLIGHT = int(os.environ.get('SEARCH_API_MAX_IN_FLIGHT', 32))
+SEARCH_API_MAX_K = int(os.environ.get('SEARCH_API_MAX_K', 100))
+
+# Remote shard servers (python -m main.engine.shard_server). One entry per shard in
+# shard id order, replicas separated by "|", e.g.
+# SEARCH_SHARDS="10.0.0.1:7100|10.0.0.2:7100,10.0.0.1:7101|10.0.0.2:7101"
+SEARCH_SHARDS = [shard.split('|') for shard in os.environ.get('SEARCH_SHARDS', '').split(',') if shard]
+SEARCH_SHARD_TIMEOUT = float(os.environ.get('SEARCH_SHARD_TIMEOUT', 1.0))
+SEARCH_SHARD_HEDGE_DELAY = float(os.environ.get('SEARCH_SHARD_HEDGE_DELAY', 0.05))
+
+# Indexes served by this process (see main.engine.registry.IndexRegistry). Queries pick
+# one with ?index=<name>, or fan out with ?index=<a>,<b>.
+SEARCH_INDEXES = {
+    'default': {
+        'data_dir': os.path.join('main', 'engine', 'collection'),
+        'output_dir': os.path.join('main', 'engine', 'index'),
+        'postings_encoding': 'VBEPostings',
+    },
+}
+SEARCH_DEFAULT_INDEX = 'default'
+SEARCH_INDEX_MEMORY_BUDGET = int(os.environ.get('SEARCH_INDEX_MEMORY_BUDGET', 0)) or None
+# Seconds between checks for a rebuilt index on disk; a rebuilt index is reopened once
+# its files have stopped changing for this long (0 = never reopen automatically).
+SEARCH_INDEX_RELOAD_INTERVAL = float(os.environ.get('SEARCH_INDEX_RELOAD_INTERVAL', 5)) or None
+
+# Second-stage LSI reranker (?rerank=1, see main.engine.rerank): number of BM25
+# candidates reranked, and the latency budget of the rerank stage in seconds
+SEARCH_RERANK_DEPTH = int(os.environ.get('SEARCH_RERANK_DEPTH', 100))
+SEARCH_RERANK_BUDGET = float(os.environ.get('SEARCH_RERANK_BUDGET', 0.005))
+
+# Result counts are exact while the query terms have at most this many postings in
+# total, and estimated from the index's KMV sketches above it (see main.engine.hitcount)
+SEARCH_HIT_COUNT_EXACT_LIMIT = int(os.environ.get('SEARCH_HIT_COUNT_EXACT_LIMIT', 16384))
+
+# Query log, one JSON object per search (see main.engine.querylog). Feeds popular
+# phrases into autocomplete and warm-up; disabled unless SEARCH_QUERY_LOG is set
+# (e.g. SEARCH_QUERY_LOG=queries.log). Above SEARCH_QUERY_LOG_MAX_BYTES the log is
+# rotated to <path>.1, so readers never load more than about twice that.
+SEARCH_QUERY_LOG = os.environ.get('SEARCH_QUERY_LOG', '')
+SEARCH_QUERY_LOG_MAX_BYTES = int(os.environ.get('SEARCH_QUERY_LOG_MAX_BYTES', 16 * 1024 * 1024)) or None
+
+# Autocomplete endpoint (suggest/)
+SEARCH_SUGGEST_MAX_N = int(os.environ.get('SEARCH_SUGGEST_MAX_N', 20))
+
+# Per-stage request timings (see main.engine.metrics) are always aggregated for
+# metrics/; this controls whether they are also sent in a Server-Timing header.
+SEARCH_SERVER_TIMING = os.environ.get('SEARCH_SERVER_TIMING', '1') == '1'
+
+# Slow-query log: searches slower than SEARCH_SLOW_QUERY_MS are appended, with their
+# analyzed terms, dfs, work counters and stage timings, to SEARCH_SLOW_QUERY_LOG
+# (disabled while unset), rotated to <path>.1 above SEARCH_SLOW_QUERY_LOG_MAX_BYTES.
+SEARCH_SLOW_QUERY_LOG = os.environ.get('SEARCH_SLOW_QUERY_LOG', '')
+SEARCH_SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SEARCH_SLOW_QUERY_LOG_MAX_BYTES', 16 * 1024 * 1024)) or None
+SEARCH_SLOW_QUERY_MS = float(os.environ.get('SEARCH_SLOW_QUERY_MS', 200))
+
+# On-demand profiling: /search/?q=...&profile=1 with an X-Profile-Token header equal
+# to SEARCH_PROFILE_TOKEN returns a cProfile report instead of the results page
+# (profiling is disabled while the token is unset). If SEARCH_PROFILE_DIR is set,
+# the raw profile is also stored there as a .prof file.
+SEARCH_PROFILE_TOKEN = os.environ.get('SEARCH_PROFILE_TOKEN', '')
+SEARCH_PROFILE_DIR = os.environ.get('SEARCH_PROFILE_DIR', '')
+
+# HTTP caching: ETag/Last-Modified come from the index files, so responses are
+# revalidated after a rebuild. Bump SEARCH_HTTP_CACHE_SALT when templates change.
+SEARCH_RESULTS_MAX_AGE = int(os.environ.get('SEARCH_RESULTS_MAX_AGE', 60))
+SEARCH_DOC_MAX_AGE = int(os.environ.get('SEARCH_DOC_MAX_AGE', 3600))
+SEARCH_HTTP_CACHE_SALT = os.environ.get('SEARCH_HTTP_CACHE_SALT', '1')
+
+# Warm-up: when a worker starts (and whenever an index is reopened), the most frequent
+# queries of the last SEARCH_WARMUP_WINDOW seconds of the query log (0 = whole log)
+# preload postings, search results and document pages, within a time and memory
+# budget. /ready/ answers 503 until the first warm-up is done; SEARCH_WARMUP_SECONDS=0
+# disables warm-up.
+SEARCH_WARMUP_QUERIES = int(os.environ.get('SEARCH_WARMUP_QUERIES', 500))
+SEARCH_WARMUP_WINDOW = int(os.environ.get('SEARCH_WARMUP_WINDOW', 7 * 24 * 3600))
+SEARCH_WARMUP_SECONDS = float(os.environ.get('SEARCH_WARMUP_SECONDS', 20))
+SEARCH_WARMUP_MEMORY = int(os.environ.get('SEARCH_WARMUP_MEMORY', 32 * 1024 * 1024))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medbib.settings')
 
 application = get_wsgi_application()
+
+# Warm the caches from the query log before the worker reports ready (see /ready/)
+from main.views import start_warmup
+
+start_warmup()